@@ -0,0 +1,161 @@
+"""Per-job semantic cache for /ask answers.
+
+Each job keeps its recent questions with their normalised embeddings, answers
+and sources. A new question first goes through an exact-text lookup, which
+costs nothing. If that misses, it is embedded. If the cosine similarity to a
+cached question reaches the threshold, the stored answer is returned without
+a vector query or a chat completion. On a miss, the embedding is passed on
+so the vector query can reuse it.
+
+When documents join a job, ``invalidate`` drops the job's entries, because a
+cached answer may no longer reflect the job's context.
+SARA_ANSWER_CACHE_THRESHOLD sets the cosine cut-off (default 0.95).
+SARA_ANSWER_CACHE_SIZE sets the number of entries kept per job (default 256).
+Jobs themselves are kept in LRU order, and the least recently used job's
+entries are dropped once more than SARA_ANSWER_CACHE_JOBS jobs are cached
+(default 64).
+"""
+import os
+import math
+import operator
+import threading
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional
+
+from pipeline_metrics import ANSWER_CACHE_REQUESTS
+
+DEFAULT_THRESHOLD = 0.95
+DEFAULT_SIZE = 256
+DEFAULT_JOBS = 64
+
+
+class CachedAnswer(NamedTuple):
+    question: str
+    vector: List[float]  # Unit length, so similarity is a plain dot product
+    answer: str
+    sources: List[str]
+
+
+class Lookup(NamedTuple):
+    hit: Optional[CachedAnswer]
+    vector: Optional[List[float]]  # Question embedding, None after an exact-text hit
+    similarity: float
+
+
+def threshold():
+    try:
+        return float(os.getenv("SARA_ANSWER_CACHE_THRESHOLD", DEFAULT_THRESHOLD))
+    except ValueError:
+        return DEFAULT_THRESHOLD
+
+
+def cache_size():
+    try:
+        return max(1, int(os.getenv("SARA_ANSWER_CACHE_SIZE", DEFAULT_SIZE)))
+    except ValueError:
+        return DEFAULT_SIZE
+
+
+def max_jobs():
+    try:
+        return max(1, int(os.getenv("SARA_ANSWER_CACHE_JOBS", DEFAULT_JOBS)))
+    except ValueError:
+        return DEFAULT_JOBS
+
+
+def normalize_question(question):
+    return " ".join(question.lower().split()).rstrip("?.! ")
+
+
+def _unit(vector):
+    norm = math.sqrt(sum(value * value for value in vector))
+    return [value / norm for value in vector] if norm else list(vector)
+
+
+def _dot(a, b):
+    return sum(map(operator.mul, a, b))
+
+
+class AnswerCache:
+    """Semantic answer cache keyed by job."""
+
+    def __init__(self, similarity_threshold=None, size=None, jobs=None):
+        self.threshold = threshold() if similarity_threshold is None else similarity_threshold
+        self.size = size or cache_size()
+        self.max_jobs = jobs or max_jobs()
+        self._jobs = OrderedDict()  # Least recently used job first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _record(self, result):
+        ANSWER_CACHE_REQUESTS.labels(result).inc()
+        if result == "miss":
+            self.misses += 1
+        else:
+            self.hits += 1
+
+    def _entries(self, job_id):
+        """The job's entries, marked most recently used; call with the lock held"""
+        entries = self._jobs.get(job_id)
+        if entries is not None:
+            self._jobs.move_to_end(job_id)
+        return entries
+
+    def exact(self, job_id, question):
+        """Cached entry for the same question text, or None; costs no embedding"""
+        key = normalize_question(question)
+        with self._lock:
+            entries = self._entries(job_id)
+            if entries and key in entries:
+                entries.move_to_end(key)
+                self._record("exact")
+                return entries[key]
+        return None
+
+    def nearest(self, job_id, vector):
+        """Lookup for an already embedded question"""
+        vector = _unit(vector)
+        best, best_score = None, -1.0
+        with self._lock:
+            entries = self._entries(job_id) or {}
+            for entry in entries.values():
+                score = _dot(vector, entry.vector)
+                if score > best_score:
+                    best, best_score = entry, score
+            if best is not None and best_score >= self.threshold:
+                entries.move_to_end(normalize_question(best.question))
+                self._record("semantic")
+                return Lookup(best, vector, best_score)
+            self._record("miss")
+        return Lookup(None, vector, best_score)
+
+    def lookup(self, job_id, question, embed):
+        """Lookup for a question; ``embed(text)`` is called only when the exact-text lookup misses"""
+        entry = self.exact(job_id, question)
+        if entry is not None:
+            return Lookup(entry, None, 1.0)
+        return self.nearest(job_id, embed(question))
+
+    def store(self, job_id, question, vector, answer, sources):
+        entry = CachedAnswer(question, _unit(vector), answer, list(sources))
+        with self._lock:
+            entries = self._entries(job_id)
+            if entries is None:
+                entries = self._jobs[job_id] = OrderedDict()
+            entries[normalize_question(question)] = entry
+            entries.move_to_end(normalize_question(question))
+            while len(entries) > self.size:
+                entries.popitem(last=False)
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+
+    def invalidate(self, job_id):
+        """Forget a job's answers, e.g. because new documents joined it"""
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                "jobs": len(self._jobs)}
@@ -0,0 +1,291 @@
+"""Shared OpenAI client settings, rate budgets and retries.
+
+Every OpenAI request should go through ``openai_call``. The app's chat and
+embedding calls and the Chroma embedding function in auto.py call it
+directly. Agents make many requests per run, so retrying a whole run would
+repeat all of them. AutoGen's OpenAI client is therefore given
+``budgeted_http_client``, which budgets and retries each HTTP request. The
+CrewAI kickoff is charged once with ``attempts=1`` and corrected from the
+crew's reported token usage.
+
+- Configuration: the key comes from OPENAI_API_KEY (a .env file is read if
+  python-dotenv is installed). Nothing is hardcoded.
+- Connection reuse: ``get_session`` is one keep-alive ``requests.Session``
+  with a pool sized by SARA_HTTP_POOL. ``configure_openai`` installs it for
+  the openai client.
+- Budgets: ``RateBudget`` holds a requests-per-minute and a tokens-per-minute
+  token bucket (SARA_OPENAI_RPM, SARA_OPENAI_TPM). A call waits until both
+  buckets cover it. The token estimate is corrected against the reported
+  usage afterwards. When SARA_RATE_DB names a SQLite file, every process
+  using that file draws from the same buckets.
+- Lanes: "interactive" calls may drain the buckets. "bulk" calls stop at
+  SARA_BULK_RESERVE (default 20%) of capacity, so /ask traffic still gets
+  through while a research job embeds.
+- Retries: rate-limit, timeout, connection and 5xx errors are retried with
+  full-jitter exponential backoff, honouring Retry-After when it is sent.
+"""
+import os
+import json
+import time
+import random
+import sqlite3
+import logging
+import threading
+from types import SimpleNamespace
+from functools import lru_cache
+
+LANES = ("interactive", "bulk")
+DEFAULT_RPM = 3000
+DEFAULT_TPM = 250000
+MAX_ATTEMPTS = 5
+COMPLETION_TOKENS_ESTIMATE = 500  # Charged up front for a chat request without max_tokens
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+RETRYABLE_ERRORS = {"RateLimitError", "APIError", "Timeout", "APITimeoutError", "APIConnectionError",
+                    "ServiceUnavailableError", "InternalServerError", "TryAgain", "ConnectionError"}
+
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def openai_api_key():
+    """OPENAI_API_KEY from the environment (or .env); raises if it is not set"""
+    key = os.getenv("OPENAI_API_KEY")
+    if not key:
+        try:
+            from dotenv import load_dotenv
+            load_dotenv()
+            key = os.getenv("OPENAI_API_KEY")
+        except ImportError:
+            pass
+    if not key:
+        raise RuntimeError("OPENAI_API_KEY is not set; add it to the environment or a .env file")
+    return key
+
+
+@lru_cache(maxsize=None)
+def get_session():
+    """Keep-alive HTTP session shared by the API clients"""
+    import requests
+    from requests.adapters import HTTPAdapter
+    pool = int(_env_float("SARA_HTTP_POOL", 32))
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def configure_openai(openai):
+    """Apply the key and the pooled session to the (pre-1.0) openai module"""
+    openai.api_key = openai_api_key()
+    openai.requestssession = get_session()
+    return openai
+
+
+def estimate_tokens(payload):
+    """Rough token count (4 characters per token) of a string, list of strings or chat messages"""
+    if isinstance(payload, str):
+        return max(1, len(payload) // 4)
+    if isinstance(payload, dict):
+        return estimate_tokens(str(payload.get("content", "")))
+    return sum(estimate_tokens(item) for item in payload or [])
+
+
+class RateBudget:
+    """Requests- and tokens-per-minute token buckets, in-process or shared through SQLite."""
+
+    def __init__(self, name="openai", rpm=None, tpm=None, path=None, bulk_reserve=None):
+        self.name = name
+        self.rpm = rpm or _env_float("SARA_OPENAI_RPM", DEFAULT_RPM)
+        self.tpm = tpm or _env_float("SARA_OPENAI_TPM", DEFAULT_TPM)
+        self.bulk_reserve = bulk_reserve if bulk_reserve is not None else _env_float("SARA_BULK_RESERVE", 0.2)
+        self.path = path if path is not None else os.getenv("SARA_RATE_DB")
+        self._lock = threading.Lock()
+        self._state = (self.rpm, self.tpm, time.time())
+        self._conn = None
+        if self.path:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS budgets (
+                name TEXT PRIMARY KEY, requests REAL, tokens REAL, updated REAL)""")
+
+    def _refill(self, state, now):
+        requests, tokens, updated = state
+        elapsed = max(0.0, now - updated)
+        return (min(self.rpm, requests + elapsed * self.rpm / 60),
+                min(self.tpm, tokens + elapsed * self.tpm / 60), now)
+
+    def _step(self, state, tokens, lane, now):
+        """(new state, seconds to wait); a wait of 0 means the budget was taken"""
+        requests, available, _ = self._refill(state, now)
+        reserve = self.bulk_reserve if lane == "bulk" else 0.0
+        tokens = min(tokens, self.tpm * (1 - reserve))
+        short_requests = reserve * self.rpm + 1 - requests
+        short_tokens = reserve * self.tpm + tokens - available
+        if short_requests <= 0 and short_tokens <= 0:
+            return (requests - 1, available - tokens, now), 0.0
+        wait = max(short_requests * 60 / self.rpm, short_tokens * 60 / self.tpm)
+        return (requests, available, now), max(wait, 0.01)
+
+    def _transact(self, update):
+        """Apply update(state, now) -> (state, result) atomically; returns result"""
+        now = time.time()
+        with self._lock:
+            if self._conn is None:
+                self._state, result = update(self._state, now)
+                return result
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT requests, tokens, updated FROM budgets WHERE name = ?",
+                                         (self.name,)).fetchone()
+                state, result = update(tuple(row) if row else (self.rpm, self.tpm, now), now)
+                self._conn.execute("INSERT OR REPLACE INTO budgets (name, requests, tokens, updated) "
+                                   "VALUES (?, ?, ?, ?)", (self.name, *state))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return result
+
+    def acquire(self, tokens=1, lane="interactive"):
+        """Block until one request and ``tokens`` tokens fit the budget; returns seconds waited"""
+        waited = 0.0
+        while True:
+            wait = self._transact(lambda state, now: self._step(state, tokens, lane, now))
+            if not wait:
+                return waited
+            wait = min(wait, 5.0) * random.uniform(1.0, 1.2)
+            time.sleep(wait)
+            waited += wait
+
+    def adjust(self, tokens):
+        """Charge (or refund, if negative) tokens after the real usage is known"""
+        def charge(state, now):
+            requests, available, updated = self._refill(state, now)
+            return (requests, available - tokens, updated), None
+
+        if tokens:
+            self._transact(charge)
+
+
+@lru_cache(maxsize=None)
+def get_budget(name="openai"):
+    return RateBudget(name)
+
+
+def _retry_after(error):
+    headers = getattr(error, "headers", None) or getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after") or headers.get("Retry-After"))
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def _is_retryable(error):
+    status = getattr(error, "http_status", None) or getattr(error, "status_code", None)
+    return type(error).__name__ in RETRYABLE_ERRORS or (isinstance(status, int) and (status == 429 or status >= 500))
+
+
+def _usage_tokens(response):
+    try:
+        return int(response["usage"]["total_tokens"])
+    except (KeyError, TypeError, ValueError):
+        # openai objects have .usage; CrewAI's CrewOutput has .token_usage
+        usage = getattr(response, "usage", None) or getattr(response, "token_usage", None)
+        return getattr(usage, "total_tokens", None)
+
+
+def openai_call(func, tokens=1, lane="interactive", budget=None, attempts=MAX_ATTEMPTS, label="openai"):
+    """Run ``func()`` under the shared budget, retrying transient failures with jittered backoff"""
+    if lane not in LANES:
+        raise ValueError(f"Unknown lane {lane!r}; expected one of {', '.join(LANES)}")
+    budget = budget or get_budget()
+    for attempt in range(attempts):
+        waited = budget.acquire(tokens, lane)
+        if waited > 1:
+            logging.info(f"[{label}] waited {waited:.1f}s for {lane} rate budget")
+        try:
+            response = func()
+        except Exception as e:
+            if attempt + 1 >= attempts or not _is_retryable(e):
+                raise
+            delay = _retry_after(e) or random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+            logging.warning(f"[{label}] {type(e).__name__}: {e}; retry {attempt + 1} in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+        used = _usage_tokens(response)
+        if used is not None:
+            budget.adjust(used - tokens)
+        return response
+
+
+class BudgetedEmbeddingFunction:
+    """Wraps an embedding function (e.g. Chroma's OpenAI one) so each call goes through openai_call"""
+
+    def __init__(self, inner, lane="bulk"):
+        self.inner = inner
+        self.lane = lane
+
+    def __call__(self, input):
+        return openai_call(lambda: self.inner(input), tokens=estimate_tokens(input), lane=self.lane,
+                           label="embeddings")
+
+
+def _request_tokens(body):
+    """Token estimate for an OpenAI request body: prompt plus the completion allowance"""
+    try:
+        payload = json.loads(body or b"{}")
+    except (TypeError, ValueError):
+        return 1
+    if "messages" in payload:
+        return estimate_tokens(payload["messages"]) + int(payload.get("max_tokens") or COMPLETION_TOKENS_ESTIMATE)
+    return estimate_tokens(payload.get("input", ""))
+
+
+class _RetryableResponse(Exception):
+    """A 429/5xx response, raised so openai_call retries it"""
+
+    def __init__(self, response):
+        super().__init__(f"HTTP {response.status_code}")
+        self.response = response
+        self.http_status = response.status_code
+        self.headers = response.headers
+
+
+class _Sent:
+    """A successful response plus the usage it reported, for openai_call's adjustment"""
+
+    def __init__(self, response):
+        self.response = response
+        self.usage = None
+        if "json" in response.headers.get("content-type", ""):
+            response.read()
+            try:
+                self.usage = SimpleNamespace(total_tokens=int(response.json()["usage"]["total_tokens"]))
+            except (KeyError, TypeError, ValueError):
+                pass
+
+
+def budgeted_http_client(lane="bulk", label="openai-http"):
+    """httpx client for openai>=1 clients (e.g. AutoGen's) that budgets and retries each request"""
+    import httpx
+
+    class BudgetedTransport(httpx.HTTPTransport):
+        def handle_request(self, request):
+            def send():
+                response = super(BudgetedTransport, self).handle_request(request)
+                if response.status_code == 429 or response.status_code >= 500:
+                    response.read()
+                    raise _RetryableResponse(response)
+                return _Sent(response)
+
+            try:
+                return openai_call(send, tokens=_request_tokens(request.read()), lane=lane, label=label).response
+            except _RetryableResponse as e:
+                return e.response  # Out of attempts: let the client raise its own error
+
+    return httpx.Client(transport=BudgetedTransport())
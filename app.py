@@ -1,20 +1,28 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Header, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
-import uvicorn
 import os
-import aiofiles
-from scholarly import scholarly
-import requests
-import PyPDF2
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.document_loaders import PyPDFLoader
-import pinecone
+import asyncio
+from functools import lru_cache
 from dotenv import load_dotenv
-import openai
 from datetime import datetime
+from itertools import islice
 import json
+import logging
+import threading
+import time
+import uuid
+from latency_tracker import host_of
+from pipeline_metrics import observe_stage, record_stage, metrics_response, DOWNLOAD_BYTES, JOBS_IN_FLIGHT, QUEUE_DEPTH
+from profiling import profile_job
+from research_pipeline import make_stage, run_pipeline
+from chunk_index import MAX_JOB_IDS, chunk_id, get_chunk_index
+from near_duplicates import get_duplicate_index
+from answer_cache import AnswerCache, normalize_question
+from job_scheduler import JobScheduler, Saturated
+from api_clients import configure_openai, estimate_tokens, openai_call
+import ingestion_pool
 
 # Load environment variables
 load_dotenv()
@@ -31,113 +39,551 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize Pinecone
-pinecone.init(
-    api_key=os.getenv("PINECONE_API_KEY"),
-    environment=os.getenv("PINECONE_ENVIRONMENT")
-)
-index = pinecone.Index(os.getenv("PINECONE_INDEX_NAME"))
+# Heavy clients (pinecone, openai, langchain, scholarly) are imported and
+# created on first use, so importing this module stays fast and works
+# without credentials. Set SARA_WARMUP=1 to build them at startup instead.
+@lru_cache(maxsize=None)
+def get_index():
+    """Pinecone index, initialised on first use"""
+    import pinecone
+    pinecone.init(
+        api_key=os.getenv("PINECONE_API_KEY"),
+        environment=os.getenv("PINECONE_ENVIRONMENT")
+    )
+    # Worker threads let metadata updates be sent concurrently (async_req=True)
+    return pinecone.Index(os.getenv("PINECONE_INDEX_NAME"), pool_threads=int(os.getenv("SARA_PINECONE_THREADS", "8")))
+
+@lru_cache(maxsize=None)
+def get_openai():
+    """openai module with the API key and pooled session applied, imported on first use"""
+    import openai
+    return configure_openai(openai)
+
+@lru_cache(maxsize=None)
+def get_answer_cache():
+    return AnswerCache()
+
+@lru_cache(maxsize=None)
+def get_scheduler():
+    return JobScheduler()
 
-# Initialize OpenAI
-openai.api_key = os.getenv("OPENAI_API_KEY")
+def warm_up():
+    """Import the ingestion stack and create every client ahead of the first request"""
+    get_index()
+    get_openai()
+    import requests
+    from scholarly import scholarly
+    ingestion_pool.get_pool()
+
+@app.on_event("startup")
+async def warm_up_on_startup():
+    if os.getenv("SARA_WARMUP", "") not in ("", "0", "false"):
+        await asyncio.to_thread(warm_up)
+
+@app.on_event("shutdown")
+async def stop_ingestion_pool():
+    ingestion_pool.shutdown()
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+CHAT_MODEL = "gpt-3.5-turbo"
+UPSERT_BATCH_SIZE = 100
+DOWNLOAD_CONNECT_TIMEOUT = 10.0
+DOWNLOAD_READ_TIMEOUT = 60.0  # Seconds without a byte from the host before the download is abandoned
+REFRESH_BATCH_SIZE = 100  # Metadata updates in flight at once
+FETCH_BATCH_SIZE = 100  # Vectors per Pinecone fetch
+CLAIM_POLL_SECONDS = 1.0
+INTERACTIVE_MAX_RESULTS = 5
+BULK_MIN_RESULTS = 20
+MAX_PAPERS = 25  # Papers one job may fetch; SARA_MAX_PAPERS overrides
+ASK_TOP_K = 5
+DUPLICATE_NAMESPACE = "research"  # Payloads hold chunk_ids and url
+ANSWER_TOKENS_ESTIMATE = 500  # Completion allowance charged up front, corrected from usage
+MAX_BATCH_QUESTIONS = 50
 
 # Pydantic models
 class ResearchRequest(BaseModel):
     keyword: str
     num_results: Optional[int] = 10
+    priority: Optional[str] = None  # interactive, standard or bulk; honoured only for SARA_PRIORITY_TENANTS
+    deadline_seconds: Optional[float] = None  # From submission; defaults to SARA_JOB_DEADLINE, unset means none
 
 class Question(BaseModel):
     question: str
 
+class QuestionBatch(BaseModel):
+    questions: List[str]
+
 class ResearchResponse(BaseModel):
     status: str
     job_id: str
+    queue_position: Optional[int] = None
 
 # In-memory storage for job status and results
 research_jobs = {}
 
-async def process_and_store_pdf(file_path: str, job_id: str):
-    """Process PDF and store chunks in Pinecone"""
+def embed_texts(texts: List[str], lane: str = "interactive") -> List[List[float]]:
+    """Embed a batch of texts with one API call"""
+    with observe_stage("embed"):
+        response = openai_call(lambda: get_openai().Embedding.create(model=EMBEDDING_MODEL, input=texts),
+                               tokens=estimate_tokens(texts), lane=lane, label="embed")
+    return [item['embedding'] for item in response['data']]
+
+def query_chunks(vectors: List[List[float]], job_id: str) -> List[List[dict]]:
+    """Top matches from the job's chunks for each vector, in one Pinecone query"""
+    with observe_stage("query"):
+        if len(vectors) == 1:
+            response = get_index().query(vector=vectors[0], top_k=ASK_TOP_K, include_metadata=True,
+                                         filter={'job_ids': {'$in': [job_id]}})
+            results = [response['matches']]
+        else:
+            response = get_index().query(queries=vectors, top_k=ASK_TOP_K, include_metadata=True,
+                                         filter={'job_ids': {'$in': [job_id]}})
+            results = [result['matches'] for result in response['results']]
+        # Chunks shared by more than MAX_JOB_IDS jobs no longer list this job in their metadata
+        extra = fetch_unmirrored(job_id)
+    if not extra:
+        return results
+    merged = []
+    for vector, matches in zip(vectors, results):
+        known = {match['id'] for match in matches}
+        scored = list(matches) + [{'id': cid, 'score': cosine(vector, values), 'metadata': metadata}
+                                  for cid, (values, metadata) in extra.items() if cid not in known]
+        scored.sort(key=lambda match: match['score'], reverse=True)
+        merged.append(scored[:ASK_TOP_K])
+    return merged
+
+def fetch_unmirrored(job_id: str) -> dict:
+    """{chunk_id: (values, metadata)} for the job's chunks missing from their job_ids metadata"""
+    ids = get_chunk_index().unmirrored(job_id)
+    vectors = {}
+    for start in range(0, len(ids), FETCH_BATCH_SIZE):
+        response = get_index().fetch(ids=ids[start:start + FETCH_BATCH_SIZE])
+        for cid, vector in response['vectors'].items():
+            vectors[cid] = (vector['values'], vector['metadata'])
+    return vectors
+
+def cosine(a: List[float], b: List[float]) -> float:
+    norm = (sum(x * x for x in a) * sum(y * y for y in b)) ** 0.5
+    return sum(x * y for x, y in zip(a, b)) / norm if norm else 0.0
+
+def complete_answer(question: str, context: str) -> str:
+    """ChatGPT answer to a question from retrieved context"""
+    messages = [
+        {"role": "system", "content": "You are a research assistant. Answer the question based on the provided context."},
+        {"role": "user", "content": f"Context: {context}\n\nQuestion: {question}"}
+    ]
+    with observe_stage("llm"):
+        response = openai_call(lambda: get_openai().ChatCompletion.create(model=CHAT_MODEL, messages=messages),
+                               tokens=estimate_tokens(messages) + ANSWER_TOKENS_ESTIMATE, label="llm")
+    return response.choices[0].message['content']
+
+def ask_concurrency() -> int:
+    """Chat completions a batch request may run at once (SARA_ASK_CONCURRENCY)"""
     try:
-        # Load PDF
-        loader = PyPDFLoader(file_path)
-        pages = loader.load()
-        
-        # Split text into chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200
-        )
-        chunks = text_splitter.split_documents(pages)
-        
-        # Store in Pinecone
-        for i, chunk in enumerate(chunks):
-            index.upsert(
-                vectors=[{
-                    'id': f"{job_id}-chunk-{i}",
-                    'values': chunk.page_content,  # You'll need to convert this to embeddings
-                    'metadata': {
-                        'page': chunk.metadata.get('page', 0),
-                        'source': file_path
-                    }
-                }]
-            )
-    except Exception as e:
-        print(f"Error processing PDF {file_path}: {str(e)}")
+        return max(1, int(os.getenv("SARA_ASK_CONCURRENCY", "4")))
+    except ValueError:
+        return 4
 
-async def download_pdfs(keyword: str, job_id: str):
-    """Download PDFs from Google Scholar"""
+def claim_wait() -> float:
+    """Seconds a job waits for chunks another job is storing before taking them over (SARA_CLAIM_WAIT)"""
     try:
-        # Search Google Scholar
-        search_query = scholarly.search_pubs(keyword)
-        results = []
-        
-        for i, result in enumerate(search_query):
-            if i >= 5:  # Limit to 5 papers for demonstration
+        return max(0.0, float(os.getenv("SARA_CLAIM_WAIT", "120")))
+    except ValueError:
+        return 120.0
+
+def refresh_membership(chunk_ids: List[str]):
+    """Copy the job membership (most recent MAX_JOB_IDS jobs) of stored chunks into their vector metadata"""
+    members = get_chunk_index().members(chunk_ids, MAX_JOB_IDS)
+    with observe_stage("upsert"):
+        for start in range(0, len(chunk_ids), REFRESH_BATCH_SIZE):
+            pending = [get_index().update(id=cid, set_metadata={'job_ids': members[cid]}, async_req=True)
+                       for cid in chunk_ids[start:start + REFRESH_BATCH_SIZE]]
+            for result in pending:
+                result.get()
+
+def route_duplicate(signature, job_id: str, filename: str) -> Optional[dict]:
+    """Canonical document's payload when this PDF near-duplicates one whose chunks are all stored, else None.
+
+    The job joins the canonical document's chunks, so nothing of the copy is embedded.
+    """
+    match = get_duplicate_index(DUPLICATE_NAMESPACE).match(signature, exclude=filename)
+    chunk_ids = (match.payload or {}).get('chunk_ids') if match is not None else None
+    if not isinstance(chunk_ids, list) or not get_chunk_index().all_stored(chunk_ids):
+        return None
+    get_chunk_index().register(job_id, chunk_ids)
+    refresh_membership(chunk_ids)
+    get_duplicate_index(DUPLICATE_NAMESPACE).add(filename, signature, canonical_id=match.doc_id)
+    return dict(match.payload, doc_id=match.doc_id, similarity=match.similarity)
+
+def dedup_batch(batch: dict, job_id: str, seen: set, waiting: dict) -> dict:
+    """Record the job's membership for a batch and keep only chunks no job has stored yet.
+
+    Chunks that are already stored get their job_ids metadata refreshed instead
+    of being embedded again. Chunks another job is storing go into ``waiting``
+    (id -> (filename, text, page)) for settle_waiting. Returns the batch
+    trimmed to the claimed chunks.
+    """
+    ids = [chunk_id(text) for text in batch['texts']]
+    fresh = [i for i, cid in enumerate(ids) if cid not in seen]
+    seen.update(ids)
+    claimed, stored, others = get_chunk_index().register(job_id, [ids[i] for i in fresh])
+    if stored:
+        refresh_membership(stored)
+    others = set(others)
+    for i in fresh:
+        if ids[i] in others:
+            waiting[ids[i]] = (batch['filename'], batch['texts'][i], batch['pages'][i])
+    claimed = set(claimed)
+    keep = [i for i in fresh if ids[i] in claimed]
+    return {
+        'filename': batch['filename'],
+        'ids': [ids[i] for i in keep],
+        'texts': [batch['texts'][i] for i in keep],
+        'pages': [batch['pages'][i] for i in keep],
+        'reused': len(fresh) - len(keep),
+    }
+
+def upsert_batch(batch: dict, job_id: str):
+    """Store one embedded chunk batch in Pinecone under content-hash IDs"""
+    members = get_chunk_index().members(batch['ids'], MAX_JOB_IDS)
+    vectors = [{
+        'id': cid,
+        'values': embedding,
+        'metadata': {
+            'page': page,
+            'source': batch['filename'],
+            'text': text,
+            'job_ids': members[cid] or [job_id]
+        }
+    } for cid, text, page, embedding in zip(batch['ids'], batch['texts'], batch['pages'], batch['embeddings'])]
+    with observe_stage("upsert"):
+        get_index().upsert(vectors=vectors)
+    get_chunk_index().mark_stored(batch['ids'])
+    # Jobs that registered after members() was read saw the chunks pending; their IDs go in now
+    written = {vector['id']: vector['metadata']['job_ids'] for vector in vectors}
+    current = get_chunk_index().members(batch['ids'], MAX_JOB_IDS)
+    changed = [cid for cid in batch['ids'] if current[cid] != written[cid]]
+    if changed:
+        refresh_membership(changed)
+
+def store_claimed(chunks: dict, job_id: str, stop: threading.Event) -> int:
+    """Embed and upsert claimed chunks given as id -> (filename, text, page); returns how many were stored.
+
+    Once ``stop`` is set the remaining claims are released instead.
+    """
+    by_file = {}
+    for cid, (filename, text, page) in chunks.items():
+        by_file.setdefault(filename, []).append((cid, text, page))
+    stored = 0
+    for filename, rows in by_file.items():
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            part = rows[start:start + UPSERT_BATCH_SIZE]
+            batch = {'filename': filename, 'ids': [cid for cid, _, _ in part],
+                     'texts': [text for _, text, _ in part], 'pages': [page for _, _, page in part]}
+            if stop.is_set():
+                get_chunk_index().release(job_id, batch['ids'])
+                continue
+            try:
+                batch['embeddings'] = embed_texts(batch['texts'], "bulk")
+                upsert_batch(batch, job_id)
+            except Exception:
+                get_chunk_index().release(job_id, batch['ids'])
+                raise
+            stored += len(part)
+    return stored
+
+def settle_waiting(waiting: dict, job_id: str, stop: threading.Event, deadline: Optional[float] = None) -> int:
+    """Make sure chunks another job was storing when this job saw them end up stored.
+
+    Chunks that job stored get this job's membership refreshed. Chunks it
+    released (it failed or was cancelled) are claimed and stored here, and
+    any still pending after claim_wait() seconds are taken over. Returns as
+    soon as ``stop`` is set (the job was cancelled) or the deadline passes,
+    without claiming anything more. Returns how many chunks this job stored.
+    """
+    give_up = time.monotonic() + claim_wait()
+    pending, stored = list(waiting), 0
+    while pending:
+        if stop.is_set() or (deadline is not None and time.monotonic() >= deadline):
+            break
+        claimed, done, pending = get_chunk_index().register(job_id, pending)
+        if done:
+            refresh_membership(done)
+        if pending and time.monotonic() >= give_up:
+            logging.warning(f"[{job_id}] taking over {len(pending)} chunks another job left pending")
+            claimed += get_chunk_index().take_over(job_id, pending)
+            pending = []
+        if claimed:
+            if stop.is_set():
+                get_chunk_index().release(job_id, claimed)
                 break
-            
-            if 'url_pdf' in result:
-                pdf_url = result['url_pdf']
-                filename = f"downloads/{job_id}/{i}.pdf"
-                
-                # Create directory if it doesn't exist
-                os.makedirs(f"downloads/{job_id}", exist_ok=True)
-                
-                # Download PDF
-                response = requests.get(pdf_url)
-                if response.status_code == 200:
-                    async with aiofiles.open(filename, 'wb') as f:
-                        await f.write(response.content)
-                    
-                    # Process and store in Pinecone
-                    await process_and_store_pdf(filename, job_id)
-                    results.append({
-                        'title': result.get('title', ''),
-                        'url': pdf_url,
-                        'authors': result.get('author', [])
-                    })
-        
+            stored += store_claimed({cid: waiting[cid] for cid in claimed}, job_id, stop)
+        if pending:
+            stop.wait(CLAIM_POLL_SECONDS)
+    return stored
+
+def job_deadline(request: ResearchRequest) -> Optional[float]:
+    """Monotonic time by which the job must finish, or None"""
+    seconds = request.deadline_seconds
+    if seconds is None:
+        try:
+            seconds = float(os.getenv("SARA_JOB_DEADLINE", "0")) or None
+        except ValueError:
+            seconds = None
+    return None if seconds is None else time.monotonic() + seconds
+
+def job_answerable(job_id: str) -> bool:
+    """Completed jobs, and stopped jobs that kept partial results, can be asked about"""
+    job = research_jobs.get(job_id)
+    return job is not None and (job['status'] == 'completed' or bool(job.get('partial')))
+
+async def download_pdfs(keyword: str, job_id: str, papers: int, profile: bool = False,
+                        deadline: Optional[float] = None):
+    """Download PDFs from Google Scholar"""
+    QUEUE_DEPTH.labels("research").dec()
+    JOBS_IN_FLIGHT.inc()
+    research_jobs[job_id]['status'] = 'processing'
+    try:
+        with profile_job(job_id, requested=profile) as profile_dir:
+            await _download_pdfs(keyword, job_id, papers, deadline)
+    except asyncio.CancelledError:
+        if research_jobs[job_id]['status'] == 'processing':
+            research_jobs[job_id] = {'status': 'cancelled', 'reason': 'cancelled', 'partial': False}
+        raise
+    finally:
+        JOBS_IN_FLIGHT.dec()
+    if profile_dir:
+        research_jobs[job_id]['profile'] = profile_dir
+
+def download_timeout() -> tuple:
+    """(connect, read) seconds for a PDF download; SARA_DOWNLOAD_TIMEOUT sets the read timeout"""
+    try:
+        return DOWNLOAD_CONNECT_TIMEOUT, float(os.getenv("SARA_DOWNLOAD_TIMEOUT", DOWNLOAD_READ_TIMEOUT))
+    except ValueError:
+        return DOWNLOAD_CONNECT_TIMEOUT, DOWNLOAD_READ_TIMEOUT
+
+def download_pdf(pdf_url: str) -> Optional[bytes]:
+    """PDF body, or None when the host does not return 200"""
+    import requests
+    host = host_of(pdf_url)
+    with observe_stage("download", host):
+        response = requests.get(pdf_url, timeout=download_timeout())
+    if response.status_code != 200:
+        return None
+    DOWNLOAD_BYTES.labels(host).inc(len(response.content))
+    return response.content
+
+async def _download_pdfs(keyword: str, job_id: str, papers: int, deadline: Optional[float] = None):
+    """Search, fetch, ingest (parse + chunk in the worker pool), dedup, embed and upsert as overlapping stages"""
+    import aiofiles
+    from scholarly import scholarly
+    results = {}
+    progress = {'fetched': 0, 'ingested': 0, 'duplicates': 0, 'chunks': 0, 'reused_chunks': 0, 'upserted_chunks': 0}
+    paper_of = {}
+    seen_chunks = set()
+    waiting_chunks = {}
+    settle_stop = threading.Event()  # Set when the job stops, so settle_waiting's thread returns
+    research_jobs[job_id]['progress'] = progress
+
+    def search(keyword):
+        with observe_stage("search"):
+            return list(islice(scholarly.search_pubs(keyword), papers))
+
+    async def search_stage(keyword):
+        search_results = await asyncio.to_thread(search, keyword)
+        return [(i, result) for i, result in enumerate(search_results) if 'url_pdf' in result]
+
+    async def fetch_stage(item):
+        i, result = item
+        pdf_url = result['url_pdf']
+        content = await asyncio.to_thread(download_pdf, pdf_url)
+        if content is None:
+            return None
+        filename = f"downloads/{job_id}/{i}.pdf"
+        # Create directory if it doesn't exist
+        os.makedirs(f"downloads/{job_id}", exist_ok=True)
+        async with aiofiles.open(filename, 'wb') as f:
+            await f.write(content)
+        results[i] = {
+            'title': result.get('title', ''),
+            'url': pdf_url,
+            'authors': result.get('author', [])
+        }
+        paper_of[filename] = i
+        progress['fetched'] += 1
+        return [filename]
+
+    async def ingest_stage(filename):
+        ingested = await ingestion_pool.ingest(filename, job_id, UPSERT_BATCH_SIZE)
+        for stage, seconds in ingested.timings.items():
+            record_stage(stage, seconds)
+        progress['ingested'] += 1
+        # A near-duplicate of an ingested paper (preprint, repository copy) reuses that paper's chunks
+        canonical = await asyncio.to_thread(route_duplicate, ingested.signature, job_id, filename)
+        if canonical is not None:
+            progress['duplicates'] += 1
+            results[paper_of[filename]]['duplicate_of'] = canonical.get('url', canonical['doc_id'])
+            get_answer_cache().invalidate(job_id)
+            return None
+        chunk_ids = [chunk_id(text) for batch in ingested.batches for text in batch['texts']]
+        await asyncio.to_thread(get_duplicate_index(DUPLICATE_NAMESPACE).add, filename, ingested.signature,
+                                payload={'chunk_ids': chunk_ids, 'url': results[paper_of[filename]]['url']})
+        progress['chunks'] += sum(len(batch['texts']) for batch in ingested.batches)
+        return ingested.batches
+
+    async def dedup_stage(batch):
+        batch = await asyncio.to_thread(dedup_batch, batch, job_id, seen_chunks, waiting_chunks)
+        progress['reused_chunks'] += batch['reused']
+        if batch['reused']:
+            get_answer_cache().invalidate(job_id)
+        return [batch] if batch['ids'] else None
+
+    async def embed_stage(batch):
+        try:
+            batch['embeddings'] = await asyncio.to_thread(embed_texts, batch['texts'], "bulk")
+        except Exception:
+            get_chunk_index().release(job_id, batch['ids'])
+            raise
+        return [batch]
+
+    async def upsert_stage(batch):
+        try:
+            await asyncio.to_thread(upsert_batch, batch, job_id)
+        except Exception:
+            get_chunk_index().release(job_id, batch['ids'])
+            raise
+        progress['upserted_chunks'] += len(batch['texts'])
+        get_answer_cache().invalidate(job_id)
+
+    stages = [
+        make_stage("search", search_stage),
+        make_stage("fetch", fetch_stage),
+        make_stage("ingest", ingest_stage),
+        make_stage("dedup", dedup_stage),
+        make_stage("embed", embed_stage),
+        make_stage("upsert", upsert_stage),
+    ]
+    try:
+        # A cancel or the deadline cancels the pipeline tasks: queued items are
+        # dropped and calls already in a thread or worker finish unobserved.
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        async def run():
+            stats = await run_pipeline(stages, [keyword], label=job_id)
+            if waiting_chunks:
+                # Chunks other jobs were storing must not be left without vectors if those jobs stopped
+                stored = await asyncio.to_thread(settle_waiting, waiting_chunks, job_id, settle_stop, deadline)
+                progress['upserted_chunks'] += stored
+                get_answer_cache().invalidate(job_id)
+            return stats
+
+        stats = await asyncio.wait_for(run(), timeout)
+        if "search" in stats.errors:
+            raise RuntimeError(stats.errors["search"])
         research_jobs[job_id] = {
             'status': 'completed',
-            'results': results
+            'results': [results[i] for i in sorted(results)],
+            'progress': progress
+        }
+        if stats.errors:
+            research_jobs[job_id]['stage_errors'] = stats.errors
+    except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+        cancelled = isinstance(e, asyncio.CancelledError)
+        settle_stop.set()
+        get_chunk_index().release_job(job_id)
+        # Chunks already upserted stay searchable; the job is marked partial
+        research_jobs[job_id] = {
+            'status': 'cancelled',
+            'reason': 'cancelled' if cancelled else 'deadline exceeded',
+            'partial': progress['upserted_chunks'] + progress['reused_chunks'] > 0,
+            'results': [results[i] for i in sorted(results)],
+            'progress': progress
         }
+        if cancelled:
+            raise
     except Exception as e:
         research_jobs[job_id] = {
             'status': 'failed',
-            'error': str(e)
+            'error': str(e),
+            'progress': progress
         }
 
+def job_papers(request: ResearchRequest) -> int:
+    """Papers the job will fetch: num_results, capped at SARA_MAX_PAPERS"""
+    try:
+        cap = max(1, int(os.getenv("SARA_MAX_PAPERS", MAX_PAPERS)))
+    except ValueError:
+        cap = MAX_PAPERS
+    return max(1, min(request.num_results or 1, cap))
+
+def _env_set(name: str) -> dict:
+    """{key: value} from "a=1,b=2" (bare entries map to themselves)"""
+    entries = {}
+    for entry in os.getenv(name, "").split(","):
+        key, _, value = entry.partition("=")
+        if key.strip():
+            entries[key.strip()] = value.strip() or key.strip()
+    return entries
+
+def request_tenant(http_request: Request, api_key: Optional[str], tenant_header: Optional[str]) -> str:
+    """Tenant a job is charged to.
+
+    With SARA_TENANT_KEYS ("tenant=key,...") set, the X-API-Key header names
+    the tenant and an unknown key is refused. Otherwise X-Tenant-ID is used
+    only when SARA_TRUST_TENANT_HEADER says a gateway sets it; callers are
+    told apart by address.
+    """
+    keys = {key: tenant for tenant, key in _env_set("SARA_TENANT_KEYS").items()}
+    if keys:
+        if api_key not in keys:
+            raise HTTPException(status_code=401, detail="Missing or unknown X-API-Key")
+        return keys[api_key]
+    if tenant_header and os.getenv("SARA_TRUST_TENANT_HEADER", "") not in ("", "0", "false"):
+        return tenant_header
+    return http_request.client.host if http_request.client else "anonymous"
+
+def job_priority(request: ResearchRequest, tenant: str) -> str:
+    """Priority from the job's size; only tenants in SARA_PRIORITY_TENANTS may choose their own"""
+    if request.priority and tenant in _env_set("SARA_PRIORITY_TENANTS"):
+        return request.priority
+    papers = job_papers(request)
+    if papers <= INTERACTIVE_MAX_RESULTS:
+        return "interactive"
+    return "bulk" if papers >= BULK_MIN_RESULTS else "standard"
+
 @app.post("/research/", response_model=ResearchResponse)
-async def start_research(request: ResearchRequest, background_tasks: BackgroundTasks):
-    """Start research process with keyword"""
-    job_id = f"job-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
-    research_jobs[job_id] = {'status': 'processing'}
-    
-    background_tasks.add_task(download_pdfs, request.keyword, job_id)
+async def start_research(request: ResearchRequest, http_request: Request, profile: bool = False,
+                         x_api_key: Optional[str] = Header(default=None),
+                         x_tenant_id: Optional[str] = Header(default=None)):
+    """Queue a research job with keyword; ?profile=true writes a CPU profile for the job.
+
+    Jobs are admitted by the scheduler per tenant (see request_tenant) and
+    priority, and cost as many papers as they fetch. A full queue answers 429
+    with the position the job would have had.
+    """
+    job_id = f"job-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    tenant = request_tenant(http_request, x_api_key, x_tenant_id)
+    priority = job_priority(request, tenant)
+    papers = job_papers(request)
+    research_jobs[job_id] = {'status': 'queued', 'tenant': tenant, 'priority': priority}
+    try:
+        deadline = job_deadline(request)
+        position = get_scheduler().submit(job_id, lambda: download_pdfs(request.keyword, job_id, papers, profile, deadline),
+                                          tenant=tenant, priority=priority, cost=papers)
+    except Saturated as e:
+        del research_jobs[job_id]
+        raise HTTPException(status_code=429, headers={"Retry-After": str(e.retry_after)}, detail={
+            'error': e.reason, 'queue_position': e.position, 'queued': e.queued, 'retry_after': e.retry_after})
+    except ValueError as e:
+        del research_jobs[job_id]
+        raise HTTPException(status_code=400, detail=str(e))
+    QUEUE_DEPTH.labels("research").inc()
+    if not position:
+        research_jobs[job_id]['status'] = 'processing'
     
     return ResearchResponse(
-        status="processing",
-        job_id=job_id
+        status="queued" if position else "processing",
+        job_id=job_id,
+        queue_position=position or None
     )
 
 @app.get("/research/{job_id}/status")
@@ -145,40 +591,124 @@ async def get_research_status(job_id: str):
     """Get status of research job"""
     if job_id not in research_jobs:
         raise HTTPException(status_code=404, detail="Job not found")
+    if research_jobs[job_id]['status'] == 'queued':
+        return dict(research_jobs[job_id], queue_position=get_scheduler().position(job_id))
     return research_jobs[job_id]
 
+@app.post("/research/{job_id}/cancel")
+async def cancel_research(job_id: str):
+    """Stop a queued or running job; chunks it already stored are kept as partial results"""
+    if job_id not in research_jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    stopped = get_scheduler().cancel(job_id)
+    if stopped is None:
+        raise HTTPException(status_code=409, detail=f"Job is already {research_jobs[job_id]['status']}")
+    if stopped == "queued":
+        QUEUE_DEPTH.labels("research").dec()
+        research_jobs[job_id] = {'status': 'cancelled', 'reason': 'cancelled', 'partial': False}
+        return {"job_id": job_id, "status": "cancelled"}
+    return {"job_id": job_id, "status": "cancelling"}
+
+def answer_question(job_id: str, question: str) -> dict:
+    """Cached or freshly generated answer with its sources; blocks on the API budget, so run it in a thread"""
+    # Near-identical questions reuse the cached answer; a miss reuses the embedding
+    cached = get_answer_cache().lookup(job_id, question, lambda text: embed_texts([text])[0])
+    if cached.hit:
+        return {"answer": cached.hit.answer, "sources": cached.hit.sources, "cached": True}
+
+    # Query Pinecone for relevant chunks, limited to the job's documents
+    matches = query_chunks([cached.vector], job_id)[0]
+    
+    # Prepare context for ChatGPT
+    context = "\n\n".join([match['metadata']['text'] for match in matches])
+    answer = complete_answer(question, context)
+    sources = [match['metadata']['source'] for match in matches]
+    get_answer_cache().store(job_id, question, cached.vector, answer, sources)
+    return {
+        "answer": answer,
+        "sources": sources,
+        "cached": False
+    }
+
 @app.post("/ask/{job_id}")
 async def ask_question(job_id: str, question: Question):
     """Ask question about the research"""
-    if job_id not in research_jobs or research_jobs[job_id]['status'] != 'completed':
+    if not job_answerable(job_id):
         raise HTTPException(status_code=400, detail="Research not completed")
     
     try:
-        # Query Pinecone for relevant chunks
-        query_results = index.query(
-            vector=question.question,  # You'll need to convert this to embeddings
-            top_k=5,
-            include_metadata=True
-        )
-        
-        # Prepare context for ChatGPT
-        context = "\n\n".join([match['metadata']['text'] for match in query_results['matches']])
-        
-        # Query ChatGPT
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a research assistant. Answer the question based on the provided context."},
-                {"role": "user", "content": f"Context: {context}\n\nQuestion: {question.question}"}
-            ]
-        )
-        
-        return {
-            "answer": response.choices[0].message['content'],
-            "sources": [match['metadata']['source'] for match in query_results['matches']]
-        }
+        return await asyncio.to_thread(answer_question, job_id, question.question)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/ask/{job_id}/batch")
+async def ask_questions(job_id: str, batch: QuestionBatch):
+    """Answer a list of questions with one embedding call, one vector query and capped concurrent completions.
+
+    Answers come back in question order. A question that fails gets an "error"
+    entry instead of failing the whole batch.
+    """
+    if not job_answerable(job_id):
+        raise HTTPException(status_code=400, detail="Research not completed")
+    if not batch.questions or len(batch.questions) > MAX_BATCH_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"Send between 1 and {MAX_BATCH_QUESTIONS} questions")
+
+    cache = get_answer_cache()
+    answers = {}
+    # Repeated questions in one batch are answered once
+    groups = {}
+    for i, text in enumerate(batch.questions):
+        groups.setdefault(normalize_question(text), []).append(i)
+    pending = []
+    for key, indices in groups.items():
+        entry = cache.exact(job_id, batch.questions[indices[0]])
+        if entry is not None:
+            answers[key] = {"answer": entry.answer, "sources": entry.sources, "cached": True}
+        else:
+            pending.append(key)
+
+    try:
+        if pending:
+            vectors = await asyncio.to_thread(embed_texts, [batch.questions[groups[key][0]] for key in pending])
+            to_query = []
+            for key, vector in zip(pending, vectors):
+                lookup = cache.nearest(job_id, vector)
+                if lookup.hit:
+                    answers[key] = {"answer": lookup.hit.answer, "sources": lookup.hit.sources, "cached": True}
+                else:
+                    to_query.append((key, lookup.vector))
+            if to_query:
+                results = await asyncio.to_thread(query_chunks, [vector for _, vector in to_query], job_id)
+                # Chunks retrieved for several questions are kept once
+                chunks = {match['id']: match['metadata'] for matches in results for match in matches}
+                slots = asyncio.Semaphore(ask_concurrency())
+
+                async def answer(key, vector, matches):
+                    ids = [match['id'] for match in matches]
+                    context = "\n\n".join(chunks[chunk]['text'] for chunk in ids)
+                    text = batch.questions[groups[key][0]]
+                    async with slots:
+                        reply = await asyncio.to_thread(complete_answer, text, context)
+                    sources = [chunks[chunk]['source'] for chunk in ids]
+                    cache.store(job_id, text, vector, reply, sources)
+                    return {"answer": reply, "sources": sources, "cached": False}
+
+                replies = await asyncio.gather(*(answer(key, vector, matches)
+                                                 for (key, vector), matches in zip(to_query, results)),
+                                               return_exceptions=True)
+                for (key, _), reply in zip(to_query, replies):
+                    answers[key] = {"error": str(reply)} if isinstance(reply, Exception) else reply
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {"answers": [dict(answers[normalize_question(text)], question=text) for text in batch.questions]}
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics for the research pipeline"""
+    body, content_type = metrics_response()
+    return Response(content=body, media_type=content_type)
+
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -1,26 +1,35 @@
 import os
 import json
+import bisect
+import hashlib
 import logging
+from functools import lru_cache
 from typing import List
-from autogen import AssistantAgent, UserProxyAgent
-import PyPDF2
-import chromadb
-from chromadb.utils import embedding_functions
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from memory_profiling import memory_report, stage_memory
+from chunker import chunk_text, split_spans
+from research_questions import QUESTIONS as questions
+from local_extraction import extract_local, unresolved, merge_answers
+from extraction_schema import schema_prompt, parse_answers
+from api_clients import openai_api_key, budgeted_http_client, BudgetedEmbeddingFunction
+from vector_snapshot import LiveSnapshot, SnapshotError, write_snapshot
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
-# Set API key
-api_key = "Set API key"
-os.environ['OPENAI_API_KEY'] = api_key
-
-# Initialize ChromaDB client
-chroma_client = chromadb.Client()
-openai_ef = embedding_functions.OpenAIEmbeddingFunction(
-    api_key=api_key,
-    model_name="text-embedding-ada-002"
-)
+EMBED_BATCH_SIZE = 100
+EMBEDDING_MODEL = "text-embedding-ada-002"
+SNAPSHOT_DIR = os.getenv("SARA_SNAPSHOT_DIR", "snapshots")
+
+# Chroma's embedding function, AutoGen and PyPDF2 are imported and created on
+# first use; call warm_up() to pay that cost ahead of time.
+@lru_cache(maxsize=None)
+def get_embedding_function():
+    from chromadb.utils import embedding_functions
+    # Calls share the process-wide OpenAI rate budget, in the bulk lane
+    return BudgetedEmbeddingFunction(embedding_functions.OpenAIEmbeddingFunction(
+        api_key=openai_api_key(),
+        model_name=EMBEDDING_MODEL
+    ))
 
 # Function to get PDF file paths from a folder
 def get_pdf_filepaths(folder_name: str) -> List[str]:
@@ -32,117 +41,156 @@ def get_pdf_filepaths(folder_name: str) -> List[str]:
         logging.error(f"Error in getting PDF file paths: {e}")
         return []
 
-# Function to extract text from PDF
-def extract_text_from_pdf(pdf_path: str) -> str:
+# Function to extract the text of each page from PDF
+def extract_pages_from_pdf(pdf_path: str) -> List[str]:
+    import PyPDF2
     try:
         with open(pdf_path, 'rb') as file:
             reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-        return text
+            return [page.extract_text() for page in reader.pages]
     except Exception as e:
         logging.error(f"Error extracting text from PDF: {e}")
-        return ""
+        return []
+
+# Function to extract text from PDF
+def extract_text_from_pdf(pdf_path: str) -> str:
+    return "".join(page + "\n" for page in extract_pages_from_pdf(pdf_path))
 
 # Function to split text into chunks
 def split_text(text: str) -> List[str]:
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        length_function=len,
+    return chunk_text(text, chunk_size=1000, chunk_overlap=200)
+
+# Chunks are stored as memory-mapped vector snapshots (vector_snapshot.py), one
+# file per collection, so a restart reuses them instead of embedding again
+def snapshot_path(collection_name: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, f"{collection_name}.snap")
+
+@lru_cache(maxsize=None)
+def get_snapshot(collection_name: str) -> LiveSnapshot:
+    return LiveSnapshot(snapshot_path(collection_name))
+
+def content_fingerprint(chunks: List[str]) -> str:
+    digest = hashlib.sha256(EMBEDDING_MODEL.encode("utf-8"))
+    for chunk in chunks:
+        digest.update(b"\0" + chunk.encode("utf-8"))
+    return digest.hexdigest()
+
+def current_snapshot(collection_name: str):
+    try:
+        return get_snapshot(collection_name).current()
+    except SnapshotError as e:
+        logging.warning(f"Ignoring unreadable snapshot for {collection_name}: {e}")
+        return None
+
+def store_chunks(pages: List[str], collection_name: str, source: str):
+    """Chunk the PDF text and embed it into the collection's snapshot, unless an identical one exists"""
+    text = "".join(page + "\n" for page in pages)
+    spans = split_spans(text, chunk_size=1000, chunk_overlap=200)
+    chunks = [text[start:end] for start, end in spans]
+    fingerprint = content_fingerprint(chunks)
+    snapshot = current_snapshot(collection_name)
+    if snapshot is not None and snapshot.meta.get("fingerprint") == fingerprint:
+        logging.info(f"Reusing snapshot of {len(snapshot)} chunks for {collection_name}")
+        return snapshot
+
+    vectors = []
+    for start in range(0, len(chunks), EMBED_BATCH_SIZE):
+        vectors.extend(get_embedding_function()(chunks[start:start + EMBED_BATCH_SIZE]))
+    # Chunk offsets are kept against the joined text, with the page each chunk starts on
+    page_starts, position = [], 0
+    for page in pages:
+        page_starts.append(position)
+        position += len(page) + 1
+    write_snapshot(
+        snapshot_path(collection_name),
+        ids=[f"id{i}" for i in range(len(chunks))],
+        vectors=vectors,
+        texts=chunks,
+        spans=[(0, bisect.bisect_right(page_starts, start) - 1, start, end) for start, end in spans],
+        sources=[source],
+        meta={"fingerprint": fingerprint, "model": EMBEDDING_MODEL},
+    )
+    return current_snapshot(collection_name)
+
+# Function to query a stored collection
+def query_snapshot(query: str, collection_name: str, n_results: int = 5) -> str:
+    snapshot = current_snapshot(collection_name)
+    if snapshot is None:
+        raise FileNotFoundError(f"No snapshot for collection {collection_name}")
+    query_vector = get_embedding_function()([query])[0]
+    return " ".join(snapshot.text(index) for index, _ in snapshot.search(query_vector, n_results))
+
+# Configure the AI model; the key is read when the agents are built
+CHAT_MODEL = "gpt-4"
+
+def get_config_list():
+    return [
+        {
+            "model": CHAT_MODEL,
+            "api_key": openai_api_key(),
+            # Each request of the chat is budgeted and retried on its own, not the whole chat
+            "http_client": budgeted_http_client("bulk", label="autogen"),
+            "max_retries": 0
+        }
+    ]
+
+@lru_cache(maxsize=None)
+def get_agents():
+    """(assistant, user_proxy) AutoGen agents, created on first use"""
+    from autogen import AssistantAgent, UserProxyAgent
+
+    # Create the assistant agent
+    assistant = AssistantAgent(
+        name="pdf_researcher",
+        llm_config={
+            "config_list": get_config_list(),
+        },
+        system_message="""You are an expert in extracting and analyzing data from PDF documents, 
+        focusing on historical and environmental research. Your task is to extract specific 
+        information from the given PDF content and provide answers in JSON format."""
     )
-    return text_splitter.split_text(text)
-
-# Function to store text chunks in ChromaDB
-def store_in_chromadb(chunks: List[str], collection_name: str):
-    collection = chroma_client.create_collection(name=collection_name, embedding_function=openai_ef)
-    for i, chunk in enumerate(chunks):
-        collection.add(
-            documents=[chunk],
-            metadatas=[{"source": "pdf"}],
-            ids=[f"id{i}"]
-        )
-
-# Function to query ChromaDB
-def query_chromadb(query: str, collection_name: str, n_results: int = 5) -> str:
-    collection = chroma_client.get_collection(name=collection_name, embedding_function=openai_ef)
-    results = collection.query(
-        query_texts=[query],
-        n_results=n_results
+
+    # Create the user proxy agent
+    user_proxy = UserProxyAgent(
+        name="user_proxy",
+        human_input_mode="NEVER",
+        max_consecutive_auto_reply=1,
+        is_termination_msg=lambda x: isinstance(x, dict),
     )
-    return " ".join(results['documents'][0])
-
-# Define the questions
-questions = [
-    "Who are the authors?",
-    "What is the title of the page?",
-    "What is the link to the page?",
-    "How many mentions are relevant to keyword?",
-    "What is the name of the pollutant shipwreck(s)?",
-    "What are the coordinates of the sites?",
-    "What is the type of pollution (oil, chemicals, UXO, corrosion)?",
-    "Which World War period does it belong to (WWI, WWII, Unknown)?",
-    "What is the date of publishing of the article?",
-    "Are there mentions of sinking dates?",
-    "Are coordinate locations mentioned (Yes or No)?"
-]
-
-# Configure the AI model
-config_list = [
-    {
-        "model": "gpt-4",
-        "api_key": api_key
-    }
-]
-
-# Create the assistant agent
-assistant = AssistantAgent(
-    name="pdf_researcher",
-    llm_config={
-        "config_list": config_list,
-    },
-    system_message="""You are an expert in extracting and analyzing data from PDF documents, 
-    focusing on historical and environmental research. Your task is to extract specific 
-    information from the given PDF content and provide answers in JSON format."""
-)
-
-# Create the user proxy agent
-user_proxy = UserProxyAgent(
-    name="user_proxy",
-    human_input_mode="NEVER",
-    max_consecutive_auto_reply=1,
-    is_termination_msg=lambda x: isinstance(x, dict),
-)
-
-def analyze_pdf_content(collection_name: str) -> str:
+    return assistant, user_proxy
+
+def warm_up():
+    """Create the embedding function and agents ahead of the first PDF"""
+    get_embedding_function()
+    get_agents()
+    import PyPDF2
+
+def analyze_pdf_content(collection_name: str, pending: List[str] = questions) -> str:
     # Construct the task message
-    task_msg = f"""Given the following PDF content from ChromaDB collection '{collection_name}', 
+    task_msg = f"""Given the following PDF content from collection '{collection_name}', 
     extract answers to the following questions:
-    {chr(10).join(questions)}
-    Your final answer MUST be in JSON format with the questions as keys."""
+    {chr(10).join(pending)}
+    Your final answer MUST be in JSON format with the questions as keys.
+    {schema_prompt(pending)}"""
 
-    # Query ChromaDB for relevant content
-    relevant_content = query_chromadb(task_msg, collection_name)
+    # Query the collection's snapshot for relevant content
+    relevant_content = query_snapshot(task_msg, collection_name)
 
     # Start the conversation
-    chat_result = user_proxy.initiate_chat(
-        assistant,
-        message=f"{task_msg}\n\nRelevant content:\n{relevant_content}"
-    )
+    assistant, user_proxy = get_agents()
+    message = f"{task_msg}\n\nRelevant content:\n{relevant_content}"
+    chat_result = user_proxy.initiate_chat(assistant, message=message)
 
     # Extract the summary from the ChatResult object
     summary = chat_result.summary
-    if isinstance(summary, str):
-        try:
-            json_response = json.loads(summary)
-            return json.dumps(json_response, indent=2)
-        except json.JSONDecodeError:
-            logging.error(f"Failed to parse JSON from the summary: {summary}")
-    else:
+    if not isinstance(summary, (str, dict)):
         logging.error(f"Unexpected summary type: {type(summary)}")
-    
-    return None
+        return None
+    answers = parse_answers(summary, pending)
+    if answers is None:
+        logging.error(f"Failed to parse JSON from the summary: {summary}")
+        return None
+    return json.dumps(answers, indent=2)
 
 def get_answers(pdf_file: str, keywords: str) -> str:
     try:
@@ -154,23 +202,33 @@ def get_answers(pdf_file: str, keywords: str) -> str:
             logging.error(f'PDF file not found. Searched in: {pdf_folder_path}')
             return None
         
-        pdf_content = extract_text_from_pdf(final_pdf)
-        if not pdf_content:
-            logging.error("Failed to extract content from PDF.")
-            return None
-
-        # Split content into chunks and store in ChromaDB
-        chunks = split_text(pdf_content)
-        collection_name = f"pdf_{pdf_file.replace('.pdf', '')}"
-        store_in_chromadb(chunks, collection_name)
-
-        result = analyze_pdf_content(collection_name)
+        with memory_report(os.path.basename(final_pdf)):
+            with stage_memory("extract_text"):
+                pages = extract_pages_from_pdf(final_pdf)
+                pdf_content = "".join(page + "\n" for page in pages)
+            if not pdf_content:
+                logging.error("Failed to extract content from PDF.")
+                return None
+
+            # Answer what regular expressions can settle; only the rest goes to the LLM
+            local = extract_local(pages, keywords)
+            pending = unresolved(local)
+            logging.info(f"Resolved {len(local)} of {len(questions)} questions locally for {pdf_file}")
+            if not pending:
+                return json.dumps(merge_answers({}, local), indent=2)
+
+            # Chunk and embed into the collection's snapshot; unchanged content reuses the last one
+            collection_name = f"pdf_{pdf_file.replace('.pdf', '')}"
+            with stage_memory("store"):
+                store_chunks(pages, collection_name, final_pdf)
+
+        result = analyze_pdf_content(collection_name, pending)
         
         if not result:
             logging.error("No result was returned or an error occurred during the process.")
             return None
         
-        return result
+        return json.dumps(merge_answers(json.loads(result), local), indent=2)
     
     except Exception as e:
         logging.error(f"Error in get_answers function: {e}", exc_info=True)
@@ -5,9 +5,9 @@ import re
 import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from latency_tracker import timed_get, timed_wait
 
 # Logging setup
 logging.basicConfig(filename='pdf_url_scraper.log', level=logging.INFO,
@@ -48,9 +48,9 @@ def get_keywords():
     """Prompts user for search keywords."""
     return input("Enter Key Word: ")
 
-def search_google_scholar(driver, keywords):
+def search_google_scholar(driver, keywords, max_pages=2):
     """Searches Google Scholar for articles based on the given keywords."""
-    driver.get("https://scholar.google.com/")
+    timed_get(driver, "https://scholar.google.com/")
     random_delay(10, 20)
 
     search_bar = driver.find_element(By.NAME, 'q')
@@ -58,14 +58,13 @@ def search_google_scholar(driver, keywords):
     search_bar.send_keys(Keys.RETURN)
     random_delay(10, 20)
 
-    max_pages = 2
     for page in range(max_pages):
         logging.info(f"Processing page {page + 1}...")
         print(f"Processing page {page + 1}...")
 
         start = page * 10
         search_url = f"https://scholar.google.com/scholar?q={keywords.replace(' ', '+')}&start={start}"
-        driver.get(search_url)
+        timed_get(driver, search_url)
         random_delay(10, 20)
 
         if "captcha" in driver.current_url.lower():
@@ -73,11 +72,11 @@ def search_google_scholar(driver, keywords):
             print("CAPTCHA detected. Stopping script.")
             return
 
-        wait = WebDriverWait(driver, 20)
         article_links = []
 
         try:
-            articles = wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, "h3.gs_rt a")))
+            articles = timed_wait(driver, search_url, "element_wait", 20,
+                                  EC.presence_of_all_elements_located((By.CSS_SELECTOR, "h3.gs_rt a")))
             for article in articles:
                 article_links.append(article.get_attribute('href'))
 
@@ -91,7 +90,7 @@ def process_article_links(driver, article_links):
     """Processes each article link, looking for PDF URLs."""
     for index, article_link in enumerate(article_links):
         print(f"Processing article {index + 1}/{len(article_links)}")
-        driver.get(article_link)
+        timed_get(driver, article_link)
         random_delay(10, 20)
 
         pdf_link = find_pdf_link(driver)
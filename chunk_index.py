@@ -0,0 +1,151 @@
+"""Content-addressed chunk IDs and per-job membership for the vector index.
+
+A vector's ID is a hash of its chunk text, so a paper downloaded by many
+jobs is embedded and upserted once. Which jobs contain which chunks lives
+in a SQLite mapping table, the source of truth. It is mirrored into each
+vector's ``job_ids`` metadata so queries can filter on it.
+
+Before embedding, a job records its membership and then claims the chunk
+IDs nobody has stored yet. Only claimed chunks are embedded and upserted.
+Chunks another job already stored just get their ``job_ids`` metadata
+refreshed. Chunks another job is still working on are returned as waiting:
+the job checks them again when its own work is done, and stores the ones
+that were released or whose claim it had to take over. If a claim is not
+marked stored within CLAIM_TTL, for example because its job died, another
+job can claim it again.
+
+The metadata mirror keeps the MAX_JOB_IDS most recent jobs per chunk; the
+mapping table keeps them all. ``unmirrored`` lists a job's chunks that fell
+out of the mirror, so queries can fetch those by ID instead.
+"""
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from functools import lru_cache
+
+CHUNK_DB = "chunk_index.db"
+CLAIM_TTL = 600  # Seconds before an unfinished claim can be taken over
+MAX_JOB_IDS = 100  # Jobs mirrored into one vector's metadata
+PENDING, STORED = "pending", "stored"
+
+
+def chunk_id(text):
+    """Stable vector ID for a chunk: hash of its whitespace-normalised text"""
+    normalized = " ".join(text.split())
+    return "c-" + hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32]
+
+
+class ChunkIndex:
+    """SQLite-backed chunk store state and job membership."""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("SARA_CHUNK_DB", CHUNK_DB)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS chunks (
+            chunk_id TEXT PRIMARY KEY, state TEXT, claimed_by TEXT, updated REAL)""")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS job_chunks (
+            job_id TEXT, chunk_id TEXT, PRIMARY KEY (job_id, chunk_id))""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS job_chunks_by_chunk ON job_chunks (chunk_id)")
+        self._conn.commit()
+
+    def register(self, job_id, chunk_ids):
+        """Record membership, then claim unstored chunks; returns (claimed, stored, waiting) ID lists"""
+        now = time.time()
+        claimed, stored, waiting = [], [], []
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO job_chunks (job_id, chunk_id) VALUES (?, ?)",
+                                   [(job_id, cid) for cid in chunk_ids])
+            for cid in chunk_ids:
+                row = self._conn.execute("SELECT state, claimed_by, updated FROM chunks WHERE chunk_id = ?",
+                                         (cid,)).fetchone()
+                if row is None or (row[0] == PENDING and row[1] != job_id and now - row[2] > CLAIM_TTL):
+                    self._conn.execute("INSERT OR REPLACE INTO chunks (chunk_id, state, claimed_by, updated) "
+                                       "VALUES (?, ?, ?, ?)", (cid, PENDING, job_id, now))
+                    claimed.append(cid)
+                elif row[0] == STORED:
+                    stored.append(cid)
+                elif row[1] == job_id:
+                    claimed.append(cid)
+                else:
+                    waiting.append(cid)
+        return claimed, stored, waiting
+
+    def take_over(self, job_id, chunk_ids):
+        """Claim chunks another job still has pending; returns the IDs taken"""
+        taken = []
+        with self._lock, self._conn:
+            for cid in chunk_ids:
+                cursor = self._conn.execute("UPDATE chunks SET claimed_by = ?, updated = ? "
+                                            "WHERE chunk_id = ? AND state = ?", (job_id, time.time(), cid, PENDING))
+                if cursor.rowcount:
+                    taken.append(cid)
+        return taken
+
+    def mark_stored(self, chunk_ids):
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE chunks SET state = ?, updated = ? WHERE chunk_id = ?",
+                                   [(STORED, time.time(), cid) for cid in chunk_ids])
+
+    def all_stored(self, chunk_ids):
+        """True when every chunk has a vector in the index"""
+        with self._lock:
+            for start in range(0, len(chunk_ids), 500):
+                part = chunk_ids[start:start + 500]
+                (stored,) = self._conn.execute(
+                    f"SELECT COUNT(*) FROM chunks WHERE state = ? AND chunk_id IN ({','.join('?' * len(part))})",
+                    [STORED, *part]).fetchone()
+                if stored < len(set(part)):
+                    return False
+        return True
+
+    def release(self, job_id, chunk_ids):
+        """Drop this job's unfinished claims so another job can store the chunks"""
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM chunks WHERE chunk_id = ? AND state = ? AND claimed_by = ?",
+                                   [(cid, PENDING, job_id) for cid in chunk_ids])
+
+    def release_job(self, job_id):
+        """Drop every unfinished claim a stopped job still holds"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chunks WHERE state = ? AND claimed_by = ?", (PENDING, job_id))
+
+    def members(self, chunk_ids, limit=None):
+        """{chunk_id: [job_id, ...]} for the given chunks, oldest first; limit keeps the most recent"""
+        result = {cid: [] for cid in chunk_ids}
+        with self._lock:
+            for start in range(0, len(chunk_ids), 500):
+                part = chunk_ids[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT chunk_id, job_id FROM job_chunks WHERE chunk_id IN ({','.join('?' * len(part))}) "
+                    "ORDER BY rowid", part).fetchall()
+                for cid, job_id in rows:
+                    result[cid].append(job_id)
+        if limit:
+            result = {cid: jobs[-limit:] for cid, jobs in result.items()}
+        return result
+
+    def unmirrored(self, job_id, limit=MAX_JOB_IDS):
+        """The job's chunks whose metadata mirror no longer lists it (limit later jobs joined them)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_id FROM job_chunks AS mine WHERE job_id = ? AND "
+                "(SELECT COUNT(*) FROM job_chunks AS later "
+                "WHERE later.chunk_id = mine.chunk_id AND later.rowid > mine.rowid) >= ? ORDER BY rowid",
+                (job_id, limit)).fetchall()
+        return [cid for (cid,) in rows]
+
+    def job_size(self, job_id):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM job_chunks WHERE job_id = ?", (job_id,)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+@lru_cache(maxsize=None)
+def get_chunk_index():
+    return ChunkIndex()
@@ -0,0 +1,258 @@
+"""Page-aware text chunker that works on offsets instead of copied strings.
+
+``chunk_pages`` returns ``ChunkSpan(page, start, end)`` records pointing into
+the page texts, and the text is only sliced out when it is asked for
+(``ChunkSpan.text`` / ``materialize``). Two modes:
+
+* ``compat`` (default) gives exactly the boundaries of langchain's
+  ``RecursiveCharacterTextSplitter(chunk_size, chunk_overlap)`` with its
+  default separators, applied page by page like ``split_documents``. It runs
+  the same algorithm but on (start, end) offsets, so no substring is copied
+  until it is materialized.
+* ``fast`` makes a single greedy pass: each chunk ends at the last paragraph,
+  line or word break that fits, and the next one starts ``chunk_overlap``
+  characters back at a break.
+
+SARA_CHUNKER=fast switches the pipelines to the greedy mode.
+
+    python3 chunker.py bench --pages 2000 [--pdf big.pdf]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from collections import deque
+from typing import NamedTuple, List
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+SEPARATORS = ("\n\n", "\n", " ", "")
+MODES = ("compat", "fast")
+
+
+class ChunkSpan(NamedTuple):
+    page: int
+    start: int
+    end: int
+
+    def text(self, pages):
+        return pages[self.page][self.start:self.end]
+
+
+def default_mode():
+    mode = os.getenv("SARA_CHUNKER", "compat")
+    return mode if mode in MODES else "compat"
+
+
+def _strip(text, start, end):
+    """Offsets of text[start:end].strip()"""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _pieces(text, start, end, separator):
+    """Offsets of the non-empty pieces of text[start:end] split on separator, each piece keeping its leading separator."""
+    if not separator:
+        return [(i, i + 1) for i in range(start, end)]
+    pieces = []
+    piece_start = start
+    found = text.find(separator, start, end)
+    while found != -1:
+        if found > piece_start:
+            pieces.append((piece_start, found))
+        piece_start = found
+        found = text.find(separator, found + len(separator), end)
+    if end > piece_start:
+        pieces.append((piece_start, end))
+    return pieces
+
+
+def _merge(text, pieces, chunk_size, chunk_overlap, out):
+    """Greedily join adjacent pieces up to chunk_size, carrying up to chunk_overlap into the next chunk."""
+    current = deque()
+    total = 0
+    for piece in pieces:
+        length = piece[1] - piece[0]
+        if total + length > chunk_size and current:
+            start, end = _strip(text, current[0][0], current[-1][1])
+            if end > start:
+                out.append((start, end))
+            while total > chunk_overlap or (total + length > chunk_size and total > 0):
+                first = current.popleft()
+                total -= first[1] - first[0]
+        current.append(piece)
+        total += length
+    if current:
+        start, end = _strip(text, current[0][0], current[-1][1])
+        if end > start:
+            out.append((start, end))
+
+
+def _split_compat(text, start, end, separators, chunk_size, chunk_overlap, out):
+    separator, remaining = separators[-1], ()
+    for i, candidate in enumerate(separators):
+        if candidate == "":
+            separator = candidate
+            break
+        if text.find(candidate, start, end) != -1:
+            separator, remaining = candidate, separators[i + 1:]
+            break
+
+    good = []
+    for piece in _pieces(text, start, end, separator):
+        if piece[1] - piece[0] < chunk_size:
+            good.append(piece)
+            continue
+        if good:
+            _merge(text, good, chunk_size, chunk_overlap, out)
+            good = []
+        if remaining:
+            _split_compat(text, piece[0], piece[1], remaining, chunk_size, chunk_overlap, out)
+        else:
+            out.append(piece)
+    if good:
+        _merge(text, good, chunk_size, chunk_overlap, out)
+
+
+def _split_fast(text, chunk_size, chunk_overlap, separators, out):
+    breaks = [s for s in separators if s]
+    position, length = 0, len(text)
+    while position < length:
+        start, _ = _strip(text, position, length)
+        if start >= length:
+            break
+        limit = min(start + chunk_size, length)
+        end = _strip(text, start, limit)[1]
+        if limit == length:
+            out.append((start, end))
+            break
+        if not text[end].isspace():
+            # Back off to the last break in the second half of the window
+            floor = start + max(1, (end - start) // 2)
+            for separator in breaks:
+                cut = text.rfind(separator, floor, end)
+                if cut != -1:
+                    end = _strip(text, start, cut)[1]
+                    break
+        out.append((start, end))
+        # Start the next chunk at a break inside the overlap window
+        position = end
+        if chunk_overlap:
+            window = max(start + 1, end - chunk_overlap)
+            for separator in breaks:
+                cut = text.find(separator, window, end)
+                if cut != -1:
+                    position = cut + len(separator)
+                    break
+
+
+def split_spans(text, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, mode=None, separators=SEPARATORS):
+    """(start, end) offsets of the chunks of one text"""
+    if chunk_overlap >= chunk_size:
+        raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_size ({chunk_size})")
+    out = []
+    if (mode or default_mode()) == "fast":
+        _split_fast(text, chunk_size, chunk_overlap, tuple(separators), out)
+    else:
+        _split_compat(text, 0, len(text), tuple(separators), chunk_size, chunk_overlap, out)
+    return out
+
+
+def chunk_pages(pages, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, mode=None) -> List[ChunkSpan]:
+    """Chunk each page separately; spans never cross a page boundary"""
+    return [ChunkSpan(page, start, end)
+            for page, text in enumerate(pages)
+            for start, end in split_spans(text, chunk_size, chunk_overlap, mode)]
+
+
+def materialize(pages, spans):
+    """Lazily yield the text of each span"""
+    for span in spans:
+        yield span.text(pages)
+
+
+def chunk_text(text, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, mode=None) -> List[str]:
+    """Drop-in for ``RecursiveCharacterTextSplitter.split_text``"""
+    return [text[start:end] for start, end in split_spans(text, chunk_size, chunk_overlap, mode)]
+
+
+def synthetic_pages(count, seed=0):
+    """Page texts shaped like PyPDF2 output: wrapped lines, few blank-line paragraph breaks"""
+    rng = random.Random(seed)
+    words = ("wreck", "oil", "hull", "sinking", "coordinates", "survey", "pollution", "1942", "vessel",
+             "cargo", "leak", "seabed", "munitions", "corrosion", "tanker", "convoy", "N", "54.3", "W")
+    pages = []
+    for _ in range(count):
+        paragraphs = []
+        for _ in range(rng.randint(3, 8)):
+            lines = [" ".join(rng.choice(words) for _ in range(rng.randint(6, 14)))
+                     for _ in range(rng.randint(2, 12))]
+            paragraphs.append("\n".join(lines))
+        pages.append("".join(paragraph + ("\n\n" if rng.random() < 0.25 else "\n") for paragraph in paragraphs))
+    return pages
+
+
+def _time(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench(pages, repeat=3, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """Time both modes (and langchain, when installed) and check compat boundaries match"""
+    megabytes = sum(len(p) for p in pages) / 1e6
+    print(f"{len(pages)} pages, {megabytes:.1f} MB of text, chunk_size={chunk_size}, overlap={chunk_overlap}")
+    results = {}
+    for mode in MODES:
+        seconds, spans = _time(lambda: chunk_pages(pages, chunk_size, chunk_overlap, mode), repeat)
+        results[mode] = seconds
+        print(f"{mode:>10}: {seconds:.3f}s  {megabytes / seconds:7.1f} MB/s  {len(spans)} chunks")
+    compat_texts = list(materialize(pages, chunk_pages(pages, chunk_size, chunk_overlap, "compat")))
+    try:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+    except ImportError:
+        try:
+            from langchain.text_splitter import RecursiveCharacterTextSplitter
+        except ImportError:
+            print(" langchain: not installed, skipping comparison")
+            return 0
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    seconds, expected = _time(lambda: [c for p in pages for c in splitter.split_text(p)], repeat)
+    print(f" langchain: {seconds:.3f}s  {megabytes / seconds:7.1f} MB/s  {len(expected)} chunks")
+    print(f"   speedup: {seconds / results['compat']:.1f}x compat, {seconds / results['fast']:.1f}x fast")
+    if compat_texts != expected:
+        mismatch = next(i for i, (a, b) in enumerate(zip(compat_texts + [None], expected + [None])) if a != b)
+        print(f"FAIL compat boundaries differ from langchain at chunk {mismatch}")
+        return 1
+    print("OK   compat boundaries identical to langchain")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chunker throughput benchmark.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench_parser = sub.add_parser("bench", help="compare chunker modes against langchain")
+    bench_parser.add_argument("--pages", type=int, default=2000, help="synthetic pages to chunk")
+    bench_parser.add_argument("--pdf", action="append", default=[], help="chunk the pages of these PDFs instead")
+    bench_parser.add_argument("--repeat", type=int, default=3)
+    bench_parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    bench_parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP)
+    args = parser.parse_args()
+
+    if args.pdf:
+        import PyPDF2
+        pages = []
+        for pdf in args.pdf:
+            with open(pdf, 'rb') as file:
+                pages.extend(page.extract_text() or "" for page in PyPDF2.PdfReader(file).pages)
+    else:
+        pages = synthetic_pages(args.pages)
+    sys.exit(bench(pages, args.repeat, args.chunk_size, args.chunk_overlap))
@@ -0,0 +1,292 @@
+"""Offline benchmark for the search -> resolve -> download flow.
+
+Runs the real ``checking.search_google_scholar``, ``checking.find_pdf_link``
+and ``pdf_searcher_And_downloader.download_pdf`` against the local stand-in in
+``fixture_server.py``. A small requests-backed driver stands in for Chrome and
+sends scholar.google.com requests to the stand-in. The search collects the
+result links, which workers then resolve and download. The politeness
+``random_delay`` sleeps are disabled so the numbers measure the crawler
+itself. Reports papers/minute (downloaded papers over wall-clock time), p95
+per-paper latency and bytes/second for each publisher strategy. The seen-set
+and latency history live in a temporary directory, removed afterwards, and
+the process's environment and module state are restored.
+
+    python3 crawl_benchmark.py --papers 100 --latency 0.05 --error-rate 0.05 --workers 4
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import atexit
+import tempfile
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse
+
+import requests
+from selenium.common.exceptions import NoSuchElementException
+
+import latency_tracker
+import url_frontier
+from fixture_server import FixtureConfig, FixtureServer, RESULTS_PER_PAGE
+from latency_tracker import percentile
+
+SCHOLAR_URL = "https://scholar.google.com"
+
+SIMPLE_SELECTOR = re.compile(r"^(?P<tag>[a-zA-Z0-9]*)(?P<classes>(\.[\w-]+)*)"
+                             r"(\[(?P<attr>[\w-]+)(?:(?P<op>[$^*]?=)['\"]?(?P<value>[^'\"\]]*)['\"]?)?\])?$")
+
+
+class _Element:
+    def __init__(self, tag, attrs, parent):
+        self.tag = tag
+        self.attrs = dict(attrs)
+        self.parent = parent
+
+    def get_attribute(self, name):
+        return self.attrs.get(name)
+
+    def send_keys(self, *keys):
+        pass  # The search then loads the results URL itself
+
+    def matches(self, simple):
+        match = SIMPLE_SELECTOR.match(simple)
+        if not match:
+            raise ValueError(f"Unsupported selector: {simple}")
+        if match.group('tag') and match.group('tag') != self.tag:
+            return False
+        classes = (self.attrs.get('class') or '').split()
+        if any(c not in classes for c in match.group('classes').split('.')[1:]):
+            return False
+        attr = match.group('attr')
+        if attr:
+            actual = self.attrs.get(attr)
+            if actual is None:
+                return False
+            op, value = match.group('op'), match.group('value')
+            if op == '=' and actual != value:
+                return False
+            if op == '$=' and not actual.endswith(value):
+                return False
+            if op == '^=' and not actual.startswith(value):
+                return False
+            if op == '*=' and value not in actual:
+                return False
+        return True
+
+
+class _PageParser(HTMLParser):
+    VOID = {'br', 'img', 'meta', 'link', 'input', 'hr'}
+
+    def __init__(self):
+        super().__init__()
+        self.elements = []
+        self._stack = []
+
+    def handle_starttag(self, tag, attrs):
+        element = _Element(tag, attrs, self._stack[-1] if self._stack else None)
+        self.elements.append(element)
+        if tag not in self.VOID:
+            self._stack.append(element)
+
+    def handle_endtag(self, tag):
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i].tag == tag:
+                del self._stack[i:]
+                break
+
+
+class HttpDriver:
+    """The subset of the Selenium WebDriver API the crawler uses, over plain HTTP.
+
+    ``rewrite`` maps URL prefixes (e.g. the real Scholar) to the stand-in server.
+    """
+
+    def __init__(self, rewrite=None):
+        self.session = requests.Session()
+        self.rewrite = rewrite or {}
+        self.current_url = None
+        self.page_source = ""
+        self._elements = []
+
+    def get(self, url):
+        for prefix, target in self.rewrite.items():
+            if url.startswith(prefix):
+                url = target + url[len(prefix):]
+        response = self.session.get(url, timeout=30)
+        response.raise_for_status()
+        self.current_url = response.url
+        self.page_source = response.text
+        parser = _PageParser()
+        parser.feed(self.page_source)
+        self._elements = parser.elements
+        for element in self._elements:
+            if 'href' in element.attrs:
+                element.attrs['href'] = urljoin(self.current_url, element.attrs['href'])
+
+    def set_page_load_timeout(self, seconds):
+        pass
+
+    def find_elements(self, by, selector):
+        if by == "name":
+            selector = f"[name={selector}]"
+        parts = selector.split()
+        found = []
+        for element in self._elements:
+            if not element.matches(parts[-1]):
+                continue
+            ancestor, remaining = element.parent, parts[:-1]
+            while remaining and ancestor is not None:
+                if ancestor.matches(remaining[-1]):
+                    remaining = remaining[:-1]
+                ancestor = ancestor.parent
+            if not remaining:
+                found.append(element)
+        return found
+
+    def find_element(self, by, selector):
+        found = self.find_elements(by, selector)
+        if not found:
+            raise NoSuchElementException(f"No element matches {selector}")
+        return found[0]
+
+    def quit(self):
+        self.session.close()
+
+
+def crawl_paper(article_url, output_dir, find_pdf_link, download_pdf, driver):
+    """Resolve and download one paper; returns (strategy, ok, seconds, bytes, download_seconds)."""
+    strategy = urlparse(article_url).path.strip('/').split('/')[0]
+    start = time.monotonic()
+    try:
+        driver.get(article_url)
+        pdf_link = find_pdf_link(driver)
+        if not pdf_link:
+            return strategy, False, time.monotonic() - start, 0, 0.0
+        download_start = time.monotonic()
+        path = download_pdf(pdf_link, output_dir)
+        download_seconds = time.monotonic() - download_start
+        size = os.path.getsize(path) if path and os.path.exists(path) else 0
+        return strategy, bool(path), time.monotonic() - start, size, download_seconds
+    except Exception:
+        return strategy, False, time.monotonic() - start, 0, 0.0
+
+
+@contextmanager
+def isolated_crawler(workdir):
+    """checking and the searcher with state in workdir and no politeness sleeps; all undone on exit"""
+    import checking
+    import pdf_searcher_And_downloader as searcher
+    saved_env = {name: os.environ.get(name) for name in ("SARA_SEEN_DB", "SARA_LATENCY_FILE")}
+    saved = (url_frontier._seen, latency_tracker._tracker, checking.random_delay, searcher.random_delay,
+             checking.process_article_links)
+    # Keep the benchmark's seen-set and latency history away from real crawl state
+    os.environ["SARA_SEEN_DB"] = os.path.join(workdir, "seen.db")
+    os.environ["SARA_LATENCY_FILE"] = os.path.join(workdir, "latency.json")
+    url_frontier._seen = latency_tracker._tracker = None
+    checking.random_delay = searcher.random_delay = lambda *args: None
+    try:
+        yield checking, searcher
+    finally:
+        if url_frontier._seen is not None:
+            atexit.unregister(url_frontier._seen.close)
+            url_frontier._seen.close()
+        if latency_tracker._tracker is not None:
+            atexit.unregister(latency_tracker._tracker.save)
+        (url_frontier._seen, latency_tracker._tracker, checking.random_delay, searcher.random_delay,
+         checking.process_article_links) = saved
+        for name, value in saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def run_benchmark(papers=50, workers=1, latency=0.0, jitter=0.0, error_rate=0.0, pdf_kb=100, seed=0):
+    config = FixtureConfig(latency=latency, jitter=jitter, error_rate=error_rate, pdf_kb=pdf_kb, seed=seed)
+    results = []
+    lock = threading.Lock()
+    local = threading.local()
+
+    def driver_for_thread():
+        if not hasattr(local, 'driver'):
+            local.driver = HttpDriver()
+        return local.driver
+
+    with tempfile.TemporaryDirectory(prefix="crawl_bench_") as workdir, \
+            isolated_crawler(workdir) as (checking, searcher), FixtureServer(config) as server:
+        wall_start = time.monotonic()
+        # The real search walks the result pages; its per-page links are collected instead of resolved inline
+        article_links = []
+        checking.process_article_links = lambda driver, links: article_links.extend(links)
+        search_driver = HttpDriver({SCHOLAR_URL: server.base_url})
+        try:
+            checking.search_google_scholar(search_driver, "shipwrecks",
+                                           max_pages=-(-papers // RESULTS_PER_PAGE))
+        except Exception as e:
+            print(f"Search failed: {e}", file=sys.stderr)
+        finally:
+            search_driver.quit()
+        search_seconds = time.monotonic() - wall_start
+        article_links = article_links[:papers]
+
+        def work(url):
+            result = crawl_paper(url, workdir, checking.find_pdf_link, searcher.download_pdf, driver_for_thread())
+            with lock:
+                results.append(result)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(work, article_links))
+        wall_seconds = time.monotonic() - wall_start
+
+    report = {"papers": len(article_links), "workers": workers, "search_seconds": round(search_seconds, 3),
+              "wall_seconds": round(wall_seconds, 3), "strategies": {}}
+    ok_total = sum(1 for r in results if r[1])
+    report["papers_per_minute"] = round(ok_total / wall_seconds * 60, 1) if wall_seconds else 0.0
+    for strategy in sorted({r[0] for r in results}):
+        rows = [r for r in results if r[0] == strategy]
+        ok_rows = [r for r in rows if r[1]]
+        download_seconds = sum(r[4] for r in ok_rows)
+        report["strategies"][strategy] = {
+            "papers": len(rows),
+            "downloaded": len(ok_rows),
+            "errors": len(rows) - len(ok_rows),
+            # Over the run's wall-clock time, so the strategies add up to the overall rate
+            "papers_per_minute": round(len(ok_rows) / wall_seconds * 60, 1) if wall_seconds else 0.0,
+            "p95_seconds": round(percentile([r[2] for r in rows], 95) or 0.0, 4),
+            "bytes_per_second": round(sum(r[3] for r in ok_rows) / download_seconds) if download_seconds else 0,
+        }
+    return report
+
+
+def print_report(report):
+    print(f"{report['papers']} papers, {report['workers']} worker(s), {report['wall_seconds']}s wall, "
+          f"{report['papers_per_minute']} papers/min overall")
+    print(f"{'strategy':28} {'papers':>6} {'errors':>6} {'papers/min':>11} {'p95 s':>8} {'bytes/s':>12}")
+    for strategy, row in report["strategies"].items():
+        print(f"{strategy:28} {row['papers']:6} {row['errors']:6} {row['papers_per_minute']:11} "
+              f"{row['p95_seconds']:8} {row['bytes_per_second']:12}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline crawl and download benchmark.")
+    parser.add_argument("--papers", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.0, help="injected seconds per request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of random latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--pdf-kb", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+    report = run_benchmark(args.papers, args.workers, args.latency, args.jitter,
+                           args.error_rate, args.pdf_kb, args.seed)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(report, file, indent=2)
+    sys.exit(0 if report["papers_per_minute"] > 0 else 1)
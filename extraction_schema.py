@@ -0,0 +1,184 @@
+"""Fixed answer schema for PDF extraction and a tolerant one-pass parser.
+
+``schema_prompt(questions)`` gives the LLM a JSON Schema whose keys are the
+questions, so every pipeline asks for the same shape. ``parse_answers(text,
+questions)`` turns whatever comes back into a dict with exactly those keys.
+
+The parser makes one attempt. It strips code fences, then decodes the first
+JSON value. If that value does not decode, it makes one round of targeted
+repairs: smart quotes, Python literals, single-quoted strings, trailing
+commas, missing commas between members, and truncated output with open
+strings or brackets. After that it decodes again. As a last resort it reads
+"key: value" lines. Keys are matched to questions exactly, case- and
+punctuation-insensitively, through ``research_questions.FIELDS`` aliases, or
+by close fuzzy match. Nothing sleeps and nothing re-runs the model.
+"""
+import re
+import json
+import difflib
+import logging
+
+from research_questions import QUESTIONS, FIELDS
+
+MISSING = ""
+FUZZY_CUTOFF = 0.8
+
+_FENCE_RE = re.compile(r"```(?:json)?", re.IGNORECASE)
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_MISSING_COMMA_RE = re.compile(r'("|\d|true|false|null|[}\]])(\s*\n\s*)(")')
+_PYTHON_LITERALS = {"None": "null", "True": "true", "False": "false"}
+_LINE_RE = re.compile(r'^\s*[-*]?\s*"?(?P<key>[^":\n]{3,200}?\??)"?\s*:\s*(?P<value>.+?)\s*,?\s*$', re.MULTILINE)
+
+
+def answer_schema(questions=QUESTIONS):
+    """JSON Schema for one answer object keyed by the questions"""
+    return {
+        "type": "object",
+        "properties": {question: {"type": ["string", "number", "array"]} for question in questions},
+        "required": list(questions),
+        "additionalProperties": False,
+    }
+
+
+def schema_prompt(questions=QUESTIONS):
+    """Instruction block asking for a single object that matches answer_schema"""
+    return ("Reply with exactly one JSON object and nothing else. It must match this JSON Schema; "
+            "use an empty string for anything the document does not say:\n"
+            + json.dumps(answer_schema(questions), indent=2))
+
+
+def _normalize_key(key):
+    return re.sub(r"[^a-z0-9]+", " ", str(key).lower()).strip()
+
+
+def _requote(fragment):
+    """Single-quoted JSON-ish text to double quotes, leaving apostrophes inside words alone"""
+    out, quote, i = [], None, 0
+    while i < len(fragment):
+        char = fragment[i]
+        if quote is None:
+            if char == "'" and not (i and fragment[i - 1].isalnum()):
+                quote, char = "'", '"'
+            elif char == '"':
+                quote = '"'
+        elif char == "\\" and i + 1 < len(fragment):
+            out.append(fragment[i:i + 2])
+            i += 2
+            continue
+        elif char == quote and not (quote == "'" and i + 1 < len(fragment) and fragment[i + 1].isalnum()):
+            quote, char = None, '"'
+        elif quote == "'" and char == '"':
+            char = '\\"'
+        out.append(char)
+        i += 1
+    return "".join(out)
+
+
+def _close_open(fragment):
+    """Close a string and any brackets left open by truncated output"""
+    stack, in_string, escaped = [], False, False
+    for char in fragment:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+    if in_string:
+        fragment += '"'
+    fragment = fragment.rstrip().rstrip(",")
+    if fragment.endswith(":"):
+        fragment += ' ""'
+    return fragment + "".join(reversed(stack))
+
+
+def _repair(fragment):
+    fragment = fragment.translate(_SMART_QUOTES)
+    fragment = re.sub(r"\b(None|True|False)\b", lambda m: _PYTHON_LITERALS[m.group(1)], fragment)
+    if "'" in fragment:
+        fragment = _requote(fragment)
+    fragment = _close_open(fragment)
+    fragment = _MISSING_COMMA_RE.sub(r"\1,\2\3", fragment)
+    return _TRAILING_COMMA_RE.sub(r"\1", fragment)
+
+
+def _decode(text):
+    """(value, repaired) for the first JSON object or array in text, or (None, False)"""
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        return None, False
+    fragment = text[min(starts):]
+    decoder = json.JSONDecoder()
+    try:
+        return decoder.raw_decode(fragment)[0], False
+    except json.JSONDecodeError:
+        pass
+    end = max(fragment.rfind("}"), fragment.rfind("]"))
+    candidate = fragment[:end + 1] if end != -1 else fragment
+    for attempt in (candidate, fragment):
+        try:
+            return decoder.raw_decode(_repair(attempt))[0], True
+        except json.JSONDecodeError:
+            continue
+    return None, False
+
+
+def _scan_lines(text):
+    return {match.group("key").strip(): match.group("value").strip().strip('"') for match in _LINE_RE.finditer(text)}
+
+
+def _flatten(value):
+    if isinstance(value, list):
+        return "; ".join(str(_flatten(item)) for item in value)
+    if isinstance(value, dict):
+        return json.dumps(value)
+    if value is None:
+        return MISSING
+    return value
+
+
+def _match_key(key, lookup, normalized_keys):
+    normalized = _normalize_key(key)
+    if normalized in lookup:
+        return lookup[normalized]
+    close = difflib.get_close_matches(normalized, normalized_keys, n=1, cutoff=FUZZY_CUTOFF)
+    return lookup[close[0]] if close else None
+
+
+def parse_answers(text, questions=QUESTIONS, extra_keys=()):
+    """Answer dict with exactly ``questions`` + ``extra_keys`` as keys, or None if nothing matched"""
+    if isinstance(text, dict):
+        value, repaired = text, False
+    else:
+        text = _FENCE_RE.sub("", text or "")
+        value, repaired = _decode(text)
+    if isinstance(value, list):
+        value = next((item for item in value if isinstance(item, dict)), None)
+    scanned = not isinstance(value, dict)
+    if scanned:
+        value = _scan_lines(text)
+
+    keys = list(questions) + list(extra_keys)
+    lookup = {_normalize_key(key): key for key in keys}
+    lookup.update({_normalize_key(FIELDS[key]): key for key in keys if key in FIELDS})
+    normalized_keys = list(lookup)
+    answers, matched = {key: MISSING for key in keys}, 0
+    for key, answer in value.items():
+        target = _match_key(key, lookup, normalized_keys)
+        if target is not None:
+            answers[target] = answer if target in extra_keys else _flatten(answer)
+            matched += 1
+    if not matched:
+        logging.error(f"No answers could be read from the response: {str(text)[:200]!r}")
+        return None
+    if repaired or scanned:
+        logging.info(f"Repaired a malformed answer ({'line scan' if scanned else 'JSON repair'}), {matched} keys matched")
+    return answers
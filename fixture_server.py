@@ -0,0 +1,175 @@
+"""Local stand-in for Google Scholar and publisher sites, used by the benchmarks.
+
+Publisher pages live under ``/<domain>/...`` so the substring checks in
+``checking.find_pdf_link`` (``"mdpi.com" in current_url`` and so on) dispatch
+to the same selectors they use against the real sites.
+"""
+import time
+import random
+import threading
+import zlib
+from html import escape
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Domain -> attributes of the anchor that checking.find_pdf_link looks for
+PUBLISHER_LINKS = {
+    "mdpi.com": 'class="UD_ArticlePDF"',
+    "onlinelibrary.wiley.com": 'class="pdf-download"',
+    "tandfonline.com": 'class="show-pdf"',
+    "link.springer.com": 'class="c-pdf-download__link"',
+    "brill.com": 'data-datatype="pdf"',
+    "ieee.org": 'class="stats-document-lh-action-downloadPdf"',
+    "researchgate.net": 'class="js-target-download-btn"',
+    "iopscience.iop.org": 'class="wd-jnl-art-pdf-button-main"',
+    "geoscienceworld.org": 'class="article-pdfLink"',
+    "repository.example.edu": '',  # Generic a[href$='.pdf'] fallback
+}
+
+RESULTS_PER_PAGE = 10
+
+
+def make_fixture_pdf(title, pages=3, size_kb=100):
+    """Build a small valid PDF with searchable text, padded to roughly size_kb."""
+    objects = []
+    page_ids = [4 + 2 * i for i in range(pages)]
+    objects.append("<< /Type /Catalog /Pages 2 0 R >>")
+    objects.append(f"<< /Type /Pages /Kids [{' '.join(f'{pid} 0 R' for pid in page_ids)}] /Count {pages} >>")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    padding = max(0, size_kb * 1024 // max(pages, 1) - 300)
+    for i in range(pages):
+        text = escape(f"{title} page {i + 1}. The wreck lies at 51.8969 N, 8.4863 W and sank in 1917.")
+        body = f"BT /F1 11 Tf 50 750 Td ({text}) Tj ET\n" + "% " + "x" * padding + "\n"
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_ids[i] + 1} 0 R >>")
+        objects.append(f"<< /Length {len(body)} >>\nstream\n{body}endstream")
+    out = "%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(out.encode('latin-1')))
+        out += f"{number} 0 obj\n{obj}\nendobj\n"
+    xref = len(out.encode('latin-1'))
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    return out.encode('latin-1')
+
+
+class FixtureConfig:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, pdf_kb=100, pdf_pages=3,
+                 publishers=None, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.pdf_kb = pdf_kb
+        self.pdf_pages = pdf_pages
+        self.publishers = list(publishers or PUBLISHER_LINKS)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self._pdf_cache = {}
+
+    def delay(self):
+        with self.lock:
+            extra = self.random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0
+            fail = self.random.random() < self.error_rate
+        time.sleep(max(0.0, self.latency + extra))
+        return fail
+
+    def pdf(self, paper_id):
+        if paper_id not in self._pdf_cache:
+            self._pdf_cache[paper_id] = make_fixture_pdf(f"Fixture paper {paper_id}", self.pdf_pages, self.pdf_kb)
+        return self._pdf_cache[paper_id]
+
+    def publisher_for(self, paper_id):
+        return self.publishers[zlib.crc32(str(paper_id).encode()) % len(self.publishers)]
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="text/html; charset=utf-8"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        config = self.server.config
+        if config.delay():
+            self._send(503, b"<html><body>Service unavailable</body></html>")
+            return
+        parsed = urlparse(self.path)
+        parts = [p for p in parsed.path.split('/') if p]
+        base = f"http://{self.server.server_address[0]}:{self.server.server_address[1]}"
+
+        if not parts:
+            # Search home page, with the box the crawler types into
+            self._send(200, b'<html><body><form action="/scholar"><input name="q"></form></body></html>')
+        elif parts[:1] == ['scholar'] or parts[:1] == ['search']:
+            query = parse_qs(parsed.query)
+            start = int(query.get('start', ['0'])[0])
+            self._send(200, self._results_page(base, query.get('q', [''])[0], start).encode())
+        elif len(parts) == 3 and parts[1] == 'article':
+            self._send(200, self._landing_page(base, parts[0], parts[2]).encode())
+        elif len(parts) == 3 and parts[1] == 'pdf' and parts[2].endswith('.pdf'):
+            self._send(200, config.pdf(parts[2][:-4]), "application/pdf")
+        else:
+            self._send(404, b"<html><body>Not found</body></html>")
+
+    def _results_page(self, base, query, start):
+        config = self.server.config
+        rows = []
+        for paper_id in range(start, start + RESULTS_PER_PAGE):
+            domain = config.publisher_for(paper_id)
+            rows.append(f'<div class="gs_r"><h3 class="gs_rt"><a href="{base}/{domain}/article/{paper_id}">'
+                        f'{escape(query)} result {paper_id}</a></h3></div>')
+        return f"<html><body>{''.join(rows)}</body></html>"
+
+    def _landing_page(self, base, domain, paper_id):
+        attrs = PUBLISHER_LINKS.get(domain, '')
+        return (f"<html><head><title>Article {paper_id}</title></head><body>"
+                f"<h1>Article {escape(paper_id)}</h1>"
+                f'<a {attrs} href="{base}/{domain}/pdf/{escape(paper_id)}.pdf">PDF</a>'
+                f"</body></html>")
+
+
+class FixtureServer:
+    """Threaded stand-in server, usable as a context manager."""
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.httpd = ThreadingHTTPServer((host, port), FixtureHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.config = config or FixtureConfig()
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    server = FixtureServer(FixtureConfig(), port=8765).start()
+    print(f"Fixture server running at {server.base_url}/scholar?q=shipwrecks")
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        server.stop()
@@ -1,13 +1,15 @@
 import os
 import json
-from crewai import Agent, Task, Crew, Process
-from crewai_tools import PDFSearchTool
 import logging
+from functools import lru_cache
+from research_questions import QUESTIONS as questions
+from local_extraction import extract_local, unresolved, merge_into_raw, read_pdf_pages
+from extraction_schema import schema_prompt
+from api_clients import openai_api_key, openai_call, estimate_tokens
 
-
-# Set API key
-api_key = "sk-proj-7NJnI5kRLgtjm8o0u01pT3BlbkFJxLa4VTeTJcUNxAh3b2ol"
-os.environ['OPENAI_API_KEY'] = api_key
+# Rough token use of one agent run, charged against the shared OpenAI budget up
+# front and corrected from the crew's reported usage afterwards
+CREW_TOKENS_ESTIMATE = 20000
 
 # Function to get PDF file paths from a folder
 def get_pdf_filepaths(folder_name):
@@ -21,68 +23,72 @@ def get_pdf_filepaths(folder_name):
         print(f"Error in getting PDF file paths: {e}")
         return []
 
-# Define the questions
-questions = [
-    "Who are the authors?",
-    "What is the title of the page?",
-    "What is the link to the page?",
-    "How many mentions are relevant to keyword?",
-    "What is the name of the pollutant shipwreck(s)?",
-    "What are the coordinates of the sites?",
-    "What is the type of pollution (oil, chemicals, UXO, corrosion)?",
-    "Which World War period does it belong to (WWI, WWII, Unknown)?",
-    "What is the date of publishing of the article?",
-    "Are there mentions of sinking dates?",
-    "Are coordinate locations mentioned (Yes or No)?"
-]
+# CrewAI and its PDF tool are imported and built on first use, so importing
+# this module (e.g. from selection_of_pdfs) stays fast.
+@lru_cache(maxsize=None)
+def get_crew():
+    """(crew, pdf_task) for PDF extraction, created on first use"""
+    # CrewAI reads the key from the environment; fail early if it is missing
+    os.environ['OPENAI_API_KEY'] = openai_api_key()
+    from crewai import Agent, Task, Crew, Process
+    from crewai_tools import PDFSearchTool
+
+    # Creating the PDF search tool
+    pdf_tool = PDFSearchTool()
 
-# Creating the PDF search tool
-pdf_tool = PDFSearchTool()
+    # Creating the agent
+    pdf_agent = Agent(
+        role='PDF Researcher',
+        goal='Extract specific information from given PDF files.',
+        memory=True,
+        max_iter=75,
+        backstory=(
+            "You are an expert in extracting and analyzing data from PDF documents, "
+            "focusing on historical and environmental research."
+        ),
+        tools=[pdf_tool]
+    )
 
-# Creating the agent
-pdf_agent = Agent(
-    role='PDF Researcher',
-    goal='Extract specific information from given PDF files.',
-    memory=True,
-    max_iter=75,
-    backstory=(
-        "You are an expert in extracting and analyzing data from PDF documents, "
-        "focusing on historical and environmental research."
-    ),
-    tools=[pdf_tool]
-)
+    # Creating the task; {questions} and {schema} are filled per PDF with the ones left after local extraction
+    pdf_task = Task(
+        description=(
+            "Given a PDF path: {pdf_path}, extract answers to the following questions:\n"
+            "{questions}"
+            "\nYour final answer MUST be in JSON format with the questions as keys.\n"
+            "{schema}"
+        ),
+        expected_output='A single JSON object matching the given schema, with the questions as keys.',
+        tools=[pdf_tool],
+        agent=pdf_agent
+    )
 
-# Creating the task
-pdf_task = Task(
-    description=(
-        "Given a PDF path: {pdf_path}, extract answers to the following questions:\n" 
-        "\n".join(questions) +
-        "\nYour final answer MUST be in JSON format with the questions as keys."
-    ),
-    expected_output='A json format object containing the answers to the specified questions.',
-    tools=[pdf_tool],
-    agent=pdf_agent
-)
+    # Forming the crew
+    crew = Crew(
+        agents=[pdf_agent],
+        tasks=[pdf_task],
+        process=Process.sequential
+    )
+    return crew, pdf_task
 
-# Forming the crew
-crew = Crew(
-    agents=[pdf_agent],
-    tasks=[pdf_task],
-    process=Process.sequential
-)
+def warm_up():
+    """Build the crew ahead of the first PDF"""
+    get_crew()
 
 # Function to kick off the crew
-def kickoff_crew(pdf_path):
+def kickoff_crew(pdf_path, pending=questions):
     try:
-        inputs = {'pdf_path': pdf_path}
-        result = crew.kickoff(inputs=inputs)
+        crew, pdf_task = get_crew()
+        inputs = {'pdf_path': pdf_path, 'questions': "\n".join(pending), 'schema': schema_prompt(pending)}
+        # One attempt: a retry would rerun every request of the agent, not just the one that failed
+        openai_call(lambda: crew.kickoff(inputs=inputs), tokens=CREW_TOKENS_ESTIMATE + estimate_tokens(inputs['questions']),
+                    lane="bulk", attempts=1, label="crewai")
         return pdf_task.output.raw
     except Exception as e:
         print(f"Error during kickoff: {e}")
         return None
 
 # Updated get_answers function to include folder-based organization
-def get_answers(pdf_file, keywords):
+def get_answers(pdf_file, keywords, pages=None):
     try:
         pdf_folder_path = f'pdf/{keywords.replace(" ", "_")}'
         all_pdfs = get_pdf_filepaths(pdf_folder_path)
@@ -97,8 +103,17 @@ def get_answers(pdf_file, keywords):
             print('PDF file not found. Please check the path and try again.')
             return None
         
+        # Answer what regular expressions can settle; only the rest goes to the agent
+        try:
+            local = extract_local(pages if pages is not None else read_pdf_pages(final_pdf), keywords)
+        except Exception as e:
+            logging.error(f"Local extraction failed for {final_pdf}: {e}")
+            local = {}
+        pending = unresolved(local)
+        print(f"Resolved {len(local)} of {len(questions)} questions locally for {os.path.basename(final_pdf)}")
+
         # Kick off the process
-        result = kickoff_crew(final_pdf)
+        result = kickoff_crew(final_pdf, pending) if pending else "{}"
         
         # Check if the result is an error message
         if result and "Agent stopped" in result:
@@ -110,7 +125,7 @@ def get_answers(pdf_file, keywords):
             logging.error("No result was returned or an error occurred during the process.")
             return None
         
-        return result
+        return merge_into_raw(result, local)
     
     except Exception as e:
         logging.error(f"Error in get_answers function: {e}")
@@ -1,7 +1,11 @@
+import os
 import csv
 import time
 import sys
 import undetected_chromedriver as uc
+from latency_tracker import get_tracker
+from url_frontier import get_seen_set
+from tracing import start_run, span
 
 def setup_driver(output_dir):
     options = uc.ChromeOptions()
@@ -21,8 +25,30 @@ def setup_driver(output_dir):
         print(f"Error setting up ChromeDriver: {e}")
         raise
 
-def open_pdf_urls(csv_file, output_dir):
-    driver = setup_driver(output_dir)
+def set_download_directory(driver, output_dir):
+    """Point browser downloads at output_dir without restarting the browser"""
+    driver.execute_cdp_cmd("Page.setDownloadBehavior",
+                           {"behavior": "allow", "downloadPath": os.path.abspath(output_dir)})
+
+def wait_for_new_pdf(output_dir, before, url, default_timeout=60):
+    """Path of a finished, non-empty PDF that appeared in output_dir since ``before`` was listed, or None"""
+    tracker = get_tracker()
+    timeout = tracker.timeout_for(url, "download", default_timeout, minimum=30, maximum=900)
+    with tracker.measure(url, "download", timeout) as measurement:
+        start_time = time.time()
+        while time.time() - start_time < timeout:
+            for name in sorted(set(os.listdir(output_dir)) - before):
+                path = os.path.join(output_dir, name)
+                # Chrome writes to <name>.crdownload and renames it when the download completes
+                if name.endswith('.pdf') and os.path.isfile(path) and os.path.getsize(path) > 0:
+                    return path
+            time.sleep(1)
+        measurement.timed_out = True
+    return None
+
+def open_pdf_urls(driver, csv_file, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    set_download_directory(driver, output_dir)
     try:
         with open(csv_file, 'r') as file:
             csv_reader = csv.reader(file)
@@ -32,19 +58,34 @@ def open_pdf_urls(csv_file, output_dir):
                     if not url.startswith('http'):
                         print(f"Skipping invalid URL at row {idx}: {url}")
                         continue
+                    if get_seen_set().state(url) == 'downloaded':
+                        print(f"Skipping already downloaded URL at row {idx}: {url}")
+                        continue
                     print(f"Opening URL at row {idx}: {url}")
-                    driver.get(url)
-                    time.sleep(8)
+                    before = set(os.listdir(output_dir))
+                    with span("heinonline.download", url=url):
+                        driver.get(url)
+                        pdf_path = wait_for_new_pdf(output_dir, before, url)
+                    if pdf_path:
+                        get_seen_set().add(url, 'downloaded', pdf_path)
+                    else:
+                        print(f"No PDF arrived for row {idx}: {url}")
     except Exception as e:
         print(f"An error occurred while processing URLs: {e}")
+
+def main(pairs):
+    """Open the URLs of every (output_dir, csv_file) pair with a single browser"""
+    driver = setup_driver(pairs[0][0])
+    try:
+        for output_dir, csv_file in pairs:
+            open_pdf_urls(driver, csv_file, output_dir)
     finally:
         driver.quit()
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python heinonline_downloader.py <output_directory> <path_to_csv_file>")
+    if len(sys.argv) < 3 or len(sys.argv) % 2 != 1:
+        print("Usage: python heinonline_downloader.py <output_directory> <path_to_csv_file> [<output_directory> <path_to_csv_file> ...]")
         sys.exit(1)
 
-    output_dir = sys.argv[1]
-    csv_file = sys.argv[2]
-    open_pdf_urls(csv_file, output_dir)
\ No newline at end of file
+    start_run()
+    main(list(zip(sys.argv[1::2], sys.argv[2::2])))
\ No newline at end of file
@@ -0,0 +1,76 @@
+"""Import-time benchmark for the API and analysis modules.
+
+Imports each module in a fresh interpreter with ``-X importtime``, subtracts
+bare interpreter startup and prints the slowest imports. Exits non-zero when
+any module takes longer than the budget, so a heavy top-level import shows up
+before it reaches worker start or test collection.
+
+    python3 import_benchmark.py --budget 1.0 app auto get_answers
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import subprocess
+
+MODULES = ("app", "auto", "get_answers", "selection_of_pdfs")
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def _run(code, runs):
+    """Best wall time of ``python -X importtime -c code`` over a few runs, plus its stderr."""
+    best, stderr = None, ""
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                                capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        elapsed = time.perf_counter() - start
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+        if best is None or elapsed < best:
+            best, stderr = elapsed, result.stderr
+    return best, stderr
+
+
+def top_imports(stderr, limit=10, exclude=()):
+    """(cumulative seconds, module) for the slowest top-level imports in importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match and len(match.group(3)) == 1 and match.group(4) not in exclude:
+            rows.append((int(match.group(2)) / 1e6, match.group(4)))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def measure(module, runs=3):
+    """Seconds spent importing ``module`` beyond bare interpreter startup, and its slowest imports."""
+    baseline, startup = _run("pass", runs)
+    startup_modules = {name for _, name in top_imports(startup, limit=None)}
+    elapsed, stderr = _run(f"import {module}", runs)
+    return max(0.0, elapsed - baseline), top_imports(stderr, exclude=startup_modules)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure cold import time of the SARA modules.")
+    parser.add_argument("modules", nargs="*", default=list(MODULES))
+    parser.add_argument("--budget", type=float, default=1.0, help="seconds allowed per module")
+    parser.add_argument("--runs", type=int, default=3, help="take the best of this many runs")
+    parser.add_argument("--top", type=int, default=5, help="slowest imports to list per module")
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        try:
+            seconds, top = measure(module, args.runs)
+        except RuntimeError as e:
+            failed = True
+            print(f"FAIL {module}: {e}")
+            continue
+        status = "OK  " if seconds <= args.budget else "FAIL"
+        failed = failed or seconds > args.budget
+        print(f"{status} {module}: {seconds:.3f}s (budget {args.budget:.1f}s)")
+        for cumulative, name in top[:args.top]:
+            print(f"       {cumulative:.3f}s  {name}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,113 @@
+"""Process pool for CPU-bound PDF ingestion (parse + chunk + MinHash).
+
+Parsing with PyPDFLoader and chunking hold the GIL, so running them in the
+API process stalls the event loop even from a thread. ``ingest`` sends each
+PDF to a pool of spawned worker processes and awaits the result without
+blocking the loop. The pool's own call queue is the local work queue.
+``MAX_PENDING`` bounds how many PDFs may wait in it, so the research
+pipeline's backpressure still applies.
+
+Workers send back plain chunk batches plus the time each step took. The
+parent records those timings in the stage metrics, because the Prometheus
+registry lives in the API process. SARA_INGEST_WORKERS sets the pool size
+(default: CPUs - 1, at least 1).
+"""
+import os
+import time
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import List, NamedTuple, Optional
+
+from chunker import chunk_pages
+from memory_profiling import memory_report, stage_memory
+from near_duplicates import minhash_signature
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+BATCH_SIZE = 100
+
+
+class IngestResult(NamedTuple):
+    batches: List[dict]
+    timings: dict  # Seconds per stage, e.g. {"parse": 1.2, "chunk": 0.03}
+    signature: Optional[List[int]] = None  # MinHash of the text, for near-duplicate routing
+
+
+def pool_size():
+    try:
+        return max(1, int(os.getenv("SARA_INGEST_WORKERS", "0")) or (os.cpu_count() or 2) - 1)
+    except ValueError:
+        return max(1, (os.cpu_count() or 2) - 1)
+
+
+MAX_PENDING = pool_size() * 2
+
+
+def make_batches(file_path, page_texts, page_numbers, batch_size=BATCH_SIZE):
+    """Chunk page texts into batches of {filename, start, texts, pages}"""
+    chunks = chunk_pages(page_texts, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    batches = []
+    for offset in range(0, len(chunks), batch_size):
+        batch = chunks[offset:offset + batch_size]
+        batches.append({
+            'filename': file_path,
+            'start': offset,
+            'texts': [chunk.text(page_texts) for chunk in batch],
+            'pages': [page_numbers[chunk.page] for chunk in batch],
+        })
+    return batches
+
+
+def parse_and_chunk(file_path, job_id, batch_size=BATCH_SIZE):
+    """Worker entry point: PDF pages chunked into batches of {filename, start, texts, pages}"""
+    from langchain.document_loaders import PyPDFLoader
+    timings = {}
+    with memory_report(f"{job_id}-{os.path.basename(file_path)}"):
+        start = time.perf_counter()
+        with stage_memory("parse"):
+            pages = PyPDFLoader(file_path).load()
+        timings["parse"] = time.perf_counter() - start
+
+        # Spans are offsets into the page texts
+        start = time.perf_counter()
+        with stage_memory("chunk"):
+            page_texts = [page.page_content for page in pages]
+            batches = make_batches(file_path, page_texts, [page.metadata.get('page', 0) for page in pages],
+                                   batch_size)
+        timings["chunk"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with stage_memory("minhash"):
+            signature = minhash_signature(" ".join(page_texts))
+        timings["minhash"] = time.perf_counter() - start
+    return IngestResult(batches, timings, signature)
+
+
+@lru_cache(maxsize=None)
+def get_pool():
+    """Shared worker pool, started on first use"""
+    workers = pool_size()
+    logging.info(f"Starting ingestion pool with {workers} worker processes")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+@lru_cache(maxsize=None)
+def _pending_slots():
+    return asyncio.Semaphore(MAX_PENDING)
+
+
+async def ingest(file_path, job_id, batch_size=BATCH_SIZE):
+    """Parse and chunk one PDF in the pool without blocking the event loop"""
+    async with _pending_slots():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_pool(), parse_and_chunk, file_path, job_id, batch_size)
+
+
+def shutdown():
+    """Stop the pool if it was started"""
+    if get_pool.cache_info().currsize:
+        get_pool().shutdown(wait=False, cancel_futures=True)
+        get_pool.cache_clear()
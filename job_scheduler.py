@@ -0,0 +1,183 @@
+"""Admission control and fair scheduling for research jobs.
+
+Jobs wait in one queue and are started only while a slot is free:
+
+- Priority classes (``PRIORITIES``) are served in order, so an interactive
+  job always goes ahead of queued bulk jobs. Bulk and standard jobs may not
+  take the last ``reserved`` slots. That keeps a slot free for interactive
+  work even while long jobs hold the rest.
+- Within a class, tenants share slots by weighted fair queuing. Each job gets
+  a virtual finish tag: the later of the scheduler's virtual time and the
+  tenant's previous tag, plus cost / weight. The smallest tag runs first. A
+  tenant submitting a burst therefore queues behind its own earlier jobs,
+  not ahead of everyone else.
+- A tenant never runs more than ``tenant_quota`` jobs at once.
+- ``submit`` raises ``Saturated`` when the queue or the tenant's share of it
+  is full. The API turns that into a 429 with the queue position and a
+  Retry-After estimate.
+
+Limits come from SARA_MAX_JOBS, SARA_TENANT_MAX_JOBS, SARA_MAX_QUEUED,
+SARA_TENANT_MAX_QUEUED and SARA_INTERACTIVE_RESERVED. Weights come from
+SARA_TENANT_WEIGHTS, e.g. ``alice=2,bob=1``; the default weight is 1.
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import Counter
+from typing import Awaitable, Callable, NamedTuple
+
+from pipeline_metrics import JOBS_REJECTED, JOB_WAIT_SECONDS
+
+PRIORITIES = ("interactive", "standard", "bulk")
+DEFAULT_JOB_SECONDS = 60.0
+
+
+def _env_int(name, default):
+    try:
+        return max(0, int(os.getenv(name, default)))
+    except ValueError:
+        return default
+
+
+def tenant_weights():
+    weights = {}
+    for entry in os.getenv("SARA_TENANT_WEIGHTS", "").split(","):
+        tenant, _, value = entry.partition("=")
+        try:
+            if tenant.strip() and float(value) > 0:
+                weights[tenant.strip()] = float(value)
+        except ValueError:
+            logging.warning(f"Ignoring tenant weight {entry!r}")
+    return weights
+
+
+class Saturated(Exception):
+    """The job was not admitted; position is where it would have queued"""
+
+    def __init__(self, reason, position, queued, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.position = position
+        self.queued = queued
+        self.retry_after = retry_after
+
+
+class QueuedJob(NamedTuple):
+    job_id: str
+    tenant: str
+    priority: str
+    finish_tag: float
+    submitted: float
+    run: Callable[[], Awaitable]
+
+
+class JobScheduler:
+    """Weighted-fair, priority-aware job queue with a fixed number of run slots."""
+
+    def __init__(self, max_jobs=None, tenant_quota=None, max_queued=None, tenant_max_queued=None,
+                 reserved=None, weights=None):
+        self.max_jobs = max(1, max_jobs or _env_int("SARA_MAX_JOBS", 4))
+        self.tenant_quota = max(1, tenant_quota or _env_int("SARA_TENANT_MAX_JOBS", 2))
+        self.max_queued = max_queued if max_queued is not None else _env_int("SARA_MAX_QUEUED", 50)
+        self.tenant_max_queued = (tenant_max_queued if tenant_max_queued is not None
+                                  else _env_int("SARA_TENANT_MAX_QUEUED", 20))
+        self.reserved = min(self.max_jobs - 1, reserved if reserved is not None
+                            else _env_int("SARA_INTERACTIVE_RESERVED", 1))
+        self.weights = tenant_weights() if weights is None else weights
+        self.queue = []
+        self.running = {}  # job_id -> (QueuedJob, asyncio.Task)
+        self.virtual_time = 0.0
+        self._last_tag = {}
+        self._started = set()
+        self._job_seconds = DEFAULT_JOB_SECONDS
+
+    def _order(self, job):
+        return PRIORITIES.index(job.priority), job.finish_tag, job.submitted
+
+    def _running_by_tenant(self):
+        return Counter(job.tenant for job, _ in self.running.values())
+
+    def _retry_after(self, position):
+        """Rough seconds until a job at this position would start"""
+        return int(self._job_seconds * (position // self.max_jobs + 1))
+
+    def position(self, job_id):
+        """1-based place in dispatch order, or None if the job is not queued"""
+        for index, job in enumerate(sorted(self.queue, key=self._order)):
+            if job.job_id == job_id:
+                return index + 1
+        return None
+
+    def cancel(self, job_id):
+        """Stop a job: "queued" if it was dropped from the queue, "running" if its task was cancelled, else None"""
+        for job in self.queue:
+            if job.job_id == job_id:
+                self.queue.remove(job)
+                return "queued"
+        if job_id in self.running:
+            task = self.running[job_id][1]
+            task.cancel()
+            if job_id not in self._started:
+                # Cancelled before its first step, so _run's cleanup never executes
+                del self.running[job_id]
+                self._dispatch()
+                return "queued"
+            return "running"
+        return None
+
+    def submit(self, job_id, run, tenant="anonymous", priority="standard", cost=1.0):
+        """Queue ``run()`` (a coroutine factory); returns the queue position, 0 if started at once"""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {priority!r}; expected one of {', '.join(PRIORITIES)}")
+        weight = self.weights.get(tenant, 1.0)
+        finish_tag = max(self.virtual_time, self._last_tag.get(tenant, 0.0)) + max(cost, 0.01) / weight
+        job = QueuedJob(job_id, tenant, priority, finish_tag, time.monotonic(), run)
+        would_be = sum(1 for other in self.queue if self._order(other) < self._order(job)) + 1
+        tenant_queued = sum(1 for other in self.queue if other.tenant == tenant)
+        if len(self.queue) >= self.max_queued or tenant_queued >= self.tenant_max_queued:
+            JOBS_REJECTED.labels(priority).inc()
+            reason = "Job queue is full" if len(self.queue) >= self.max_queued else "Tenant queue share is full"
+            raise Saturated(reason, would_be, len(self.queue), self._retry_after(would_be))
+        self._last_tag[tenant] = finish_tag
+        self.queue.append(job)
+        self._dispatch()
+        return self.position(job_id) or 0
+
+    def _eligible(self, job, running_by_tenant):
+        if running_by_tenant[job.tenant] >= self.tenant_quota:
+            return False
+        limit = self.max_jobs if job.priority == "interactive" else self.max_jobs - self.reserved
+        return len(self.running) < limit
+
+    def _dispatch(self):
+        while self.queue and len(self.running) < self.max_jobs:
+            running_by_tenant = self._running_by_tenant()
+            job = next((job for job in sorted(self.queue, key=self._order)
+                        if self._eligible(job, running_by_tenant)), None)
+            if job is None:
+                return
+            self.queue.remove(job)
+            self.virtual_time = max(self.virtual_time, job.finish_tag)
+            JOB_WAIT_SECONDS.labels(job.priority).observe(time.monotonic() - job.submitted)
+            task = asyncio.create_task(self._run(job))
+            self.running[job.job_id] = (job, task)
+
+    async def _run(self, job):
+        self._started.add(job.job_id)
+        start = time.monotonic()
+        try:
+            await job.run()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Job {job.job_id} failed: {e}")
+        finally:
+            self._job_seconds = 0.8 * self._job_seconds + 0.2 * (time.monotonic() - start)
+            self._started.discard(job.job_id)
+            self.running.pop(job.job_id, None)
+            self._dispatch()
+
+    def stats(self):
+        return {"running": len(self.running), "queued": len(self.queue),
+                "by_priority": dict(Counter(job.priority for job in self.queue))}
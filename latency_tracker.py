@@ -0,0 +1,272 @@
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+LATENCY_FILE = "host_latency.json"
+WINDOW_SIZE = 200   # Samples kept per host and kind
+MIN_SAMPLES = 5     # Below this the caller's default timeout is used
+HEADROOM = 2.0      # Timeout = p95 * HEADROOM
+TIMEOUT_RATE = 0.05  # Above this share of recent operations timing out, the timeout grows
+
+
+def host_of(url):
+    """Normalise a URL (or bare host) to the host key used for latency stats."""
+    netloc = urlparse(url).netloc if "://" in url else url
+    netloc = netloc.lower().split(':')[0]
+    return netloc[4:] if netloc.startswith('www.') else netloc
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def _is_timeout(error):
+    # TimeoutError, selenium's TimeoutException, requests' Timeout/ReadTimeout, ...
+    return isinstance(error, TimeoutError) or "Timeout" in type(error).__name__
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock on ``path``.lock across processes (a no-op where fcntl is missing)"""
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    with open(f"{path}.lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class Measurement:
+    """Handle yielded by ``measure``; set ``timed_out`` when the block gave up without raising."""
+    timed_out = False
+
+
+class LatencyTracker:
+    """Rolling per-host latency histogram that turns observed timings into timeouts.
+
+    Timeouts are counted apart from the latency samples, so a slow host's
+    give-ups do not drag its p95 up to the timeout itself. A window of recent
+    outcomes (None for a completed operation, the timeout in seconds for a
+    give-up) tracks the recent timeout rate instead. While it is above
+    TIMEOUT_RATE the timeout grows past the longest one given up on. ``save`` merges
+    what this process observed into the file under a lock, so processes
+    sharing the file (the searcher and its downloader subprocesses) add to
+    each other's history instead of overwriting it.
+    """
+
+    def __init__(self, path=None, window=WINDOW_SIZE):
+        self.path = path or os.getenv("SARA_LATENCY_FILE", LATENCY_FILE)
+        self.window = window
+        self._samples = {}
+        self._timeouts = {}
+        self._outcomes = {}
+        self._new_samples = {}  # Observed since the last save
+        self._new_timeouts = {}
+        self._new_outcomes = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def _read(self):
+        """{(host, kind): (samples, timeouts, outcomes)} from the file; older files hold bare sample lists"""
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as file:
+                data = json.load(file)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not load latency history from {self.path}: {e}")
+            return {}
+        history = {}
+        for host, kinds in data.items():
+            for kind, entry in kinds.items():
+                if isinstance(entry, list):
+                    entry = {"samples": entry}
+                history[(host, kind)] = (entry.get("samples", []), entry.get("timeouts", 0),
+                                         entry.get("outcomes", []))
+        return history
+
+    def load(self):
+        history = self._read()
+        with self._lock:
+            for key, (samples, timeouts, outcomes) in history.items():
+                self._samples[key] = deque(samples, maxlen=self.window)
+                self._timeouts[key] = timeouts
+                self._outcomes[key] = deque(outcomes, maxlen=self.window)
+
+    def save(self):
+        """Merge this process's new observations into the file"""
+        if not self.path:
+            return
+        with self._lock:
+            new_samples, self._new_samples = self._new_samples, {}
+            new_timeouts, self._new_timeouts = self._new_timeouts, {}
+            new_outcomes, self._new_outcomes = self._new_outcomes, {}
+        if not new_samples and not new_timeouts and not new_outcomes:
+            return
+        tmp_path = f"{self.path}.tmp-{os.getpid()}"
+        try:
+            with _file_lock(self.path):
+                history = self._read()
+                data = {}
+                for key in set(history) | set(new_samples) | set(new_timeouts) | set(new_outcomes):
+                    samples, timeouts, outcomes = history.get(key, ([], 0, []))
+                    samples = (list(samples) + new_samples.get(key, []))[-self.window:]
+                    timeouts += new_timeouts.get(key, 0)
+                    outcomes = (list(outcomes) + new_outcomes.get(key, []))[-self.window:]
+                    data.setdefault(key[0], {})[key[1]] = {
+                        "samples": [round(s, 3) for s in samples], "timeouts": timeouts,
+                        "outcomes": [None if o is None else round(o, 3) for o in outcomes]}
+                    with self._lock:
+                        self._samples[key] = deque(samples, maxlen=self.window)
+                        self._timeouts[key] = timeouts
+                        self._outcomes[key] = deque(outcomes, maxlen=self.window)
+                with open(tmp_path, 'w') as file:
+                    json.dump(data, file)
+                os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning(f"Could not save latency history to {self.path}: {e}")
+
+    def record(self, url, kind, seconds):
+        key = (host_of(url), kind)
+        with self._lock:
+            if key not in self._samples:
+                self._samples[key] = deque(maxlen=self.window)
+            self._samples[key].append(seconds)
+            self._new_samples.setdefault(key, []).append(seconds)
+            self._add_outcome(key, None)
+
+    def record_timeout(self, url, kind, timeout=None):
+        """Count a give-up; ``timeout`` is the limit it hit, in seconds, when known"""
+        key = (host_of(url), kind)
+        with self._lock:
+            self._timeouts[key] = self._timeouts.get(key, 0) + 1
+            self._new_timeouts[key] = self._new_timeouts.get(key, 0) + 1
+            self._add_outcome(key, float(timeout or 0))
+
+    def _add_outcome(self, key, outcome):
+        if key not in self._outcomes:
+            self._outcomes[key] = deque(maxlen=self.window)
+        self._outcomes[key].append(outcome)
+        self._new_outcomes.setdefault(key, []).append(outcome)
+
+    def stats(self, url, kind):
+        """Return (count, p50, p95) of the completed operations for a host and kind."""
+        with self._lock:
+            samples = list(self._samples.get((host_of(url), kind), ()))
+        return len(samples), percentile(samples, 50), percentile(samples, 95)
+
+    def timeouts(self, url, kind):
+        with self._lock:
+            return self._timeouts.get((host_of(url), kind), 0)
+
+    def timeout_rate(self, url, kind):
+        """Share of the recent operations for a host and kind that timed out, or None without any"""
+        with self._lock:
+            outcomes = list(self._outcomes.get((host_of(url), kind), ()))
+        if not outcomes:
+            return None
+        return sum(1 for outcome in outcomes if outcome is not None) / len(outcomes)
+
+    def timeout_for(self, url, kind, default, minimum=None, maximum=None):
+        """Timeout for the next operation of this kind against the URL's host.
+
+        Falls back to ``default`` until enough samples exist, then uses the
+        observed p95 with headroom. While more than TIMEOUT_RATE of the recent
+        operations timed out, the host has slowed past that: the timeout is
+        raised to the longest recent give-up times HEADROOM. The result is
+        clamped to [minimum, maximum].
+        """
+        count, _, p95 = self.stats(url, kind)
+        timeout = default if count < MIN_SAMPLES else p95 * HEADROOM
+        with self._lock:
+            outcomes = list(self._outcomes.get((host_of(url), kind), ()))
+        given_up = [outcome for outcome in outcomes if outcome is not None]
+        if len(outcomes) >= MIN_SAMPLES and len(given_up) > TIMEOUT_RATE * len(outcomes):
+            timeout = max(timeout, *given_up) * HEADROOM
+        if minimum is not None:
+            timeout = max(minimum, timeout)
+        if maximum is not None:
+            timeout = min(maximum, timeout)
+        return timeout
+
+    @contextmanager
+    def measure(self, url, kind, timeout=None):
+        """Time the wrapped block and record it; a block that times out counts as a timeout instead.
+
+        ``timeout`` is the limit the block runs under, recorded with a give-up.
+        """
+        measurement = Measurement()
+        start = time.monotonic()
+        try:
+            yield measurement
+        except Exception as e:
+            if _is_timeout(e):
+                measurement.timed_out = True
+            raise
+        finally:
+            if measurement.timed_out:
+                self.record_timeout(url, kind, timeout)
+            else:
+                self.record(url, kind, time.monotonic() - start)
+
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def get_tracker():
+    """Process-wide tracker, saved back to disk at exit."""
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = LatencyTracker()
+            atexit.register(_tracker.save)
+        return _tracker
+
+
+def timed_get(driver, url, default=60, minimum=10, maximum=180):
+    """driver.get with a page-load timeout learned for the host, recording the load time."""
+    tracker = get_tracker()
+    timeout = tracker.timeout_for(url, "page_load", default, minimum, maximum)
+    driver.set_page_load_timeout(timeout)
+    with tracker.measure(url, "page_load", timeout):
+        driver.get(url)
+
+
+def timed_wait(driver, url, kind, default, condition, minimum=5, maximum=120):
+    """WebDriverWait(...).until(condition) with a timeout learned for the host."""
+    from selenium.webdriver.support.ui import WebDriverWait
+    tracker = get_tracker()
+    timeout = tracker.timeout_for(url, kind, default, minimum, maximum)
+    with tracker.measure(url, kind, timeout):
+        return WebDriverWait(driver, timeout).until(condition)
+
+
+if __name__ == "__main__":
+    tracker = LatencyTracker()
+    hosts = sorted({host for host, _ in tracker._samples})
+    for host in hosts:
+        for (h, kind), samples in sorted(tracker._samples.items()):
+            if h != host:
+                continue
+            count, p50, p95 = tracker.stats(host, kind)
+            if count:
+                rate = tracker.timeout_rate(host, kind) or 0.0
+                print(f"{host:40} {kind:16} n={count:4} p50={p50:7.2f}s p95={p95:7.2f}s "
+                      f"timeouts={tracker.timeouts(host, kind)} recent={rate:.0%}")
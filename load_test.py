@@ -0,0 +1,445 @@
+"""Local load test for the FastAPI app, with latency SLO reports.
+
+Starts ``app.py`` under uvicorn in this process. Every remote dependency is
+replaced by a local stand-in:
+
+- Google Scholar: a fake ``scholarly`` module.
+- The PDF hosts: ``fixture_server``.
+- The OpenAI embedding and chat APIs: an in-process fake.
+- The Pinecone index: an in-memory cosine index.
+
+Each stand-in has its own injected latency. The PDF hosts and the API
+stand-in can also fail a fraction of calls; API failures look like rate
+limits, so the client layer's retries are exercised. ``--stub-parser``
+swaps the PDF parsing worker pool for an in-process reader of the fixture
+PDFs. That keeps the run independent of langchain and isolates API-side
+scaling.
+
+Worker threads replay a weighted mix of /research/, /status, /ask and
+/ask/batch calls against the running server. The report gives throughput,
+p50/p95/p99 latency, error rate and 429 rejections per endpoint. ``--slo``
+turns targets into a pass/fail exit code:
+
+    python3 load_test.py --duration 60 --concurrency 16 --mix research=1,status=6,ask=3,ask_batch=1 \\
+        --api-latency 0.2 --index-latency 0.02 --slo ask:p95=1500,status:p99=100,ask:error_rate=0.01
+"""
+import os
+import re
+import sys
+import html
+import json
+import time
+import zlib
+import types
+import socket
+import random
+import asyncio
+import argparse
+import tempfile
+import threading
+from multiprocessing.pool import ThreadPool
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from fixture_server import FixtureConfig, FixtureServer
+from latency_tracker import percentile
+from research_questions import QUESTIONS
+
+ENDPOINTS = ("research", "status", "ask", "ask_batch")
+DEFAULT_MIX = "research=1,status=6,ask=3,ask_batch=1"
+KEYWORDS = ("shipwreck oil pollution", "ww2 wrecks irish sea", "sunken tankers", "marine salvage",
+            "wreck coordinates survey", "unexploded ordnance wrecks")
+EMBED_DIM = 64
+PAPERS_PER_SEARCH = 30  # Results a stand-in search yields; jobs take num_results of them
+BATCH_QUESTIONS = 10
+
+
+class RateLimitError(Exception):
+    """Named like openai's error so api_clients retries it"""
+    http_status = 429
+
+
+def hashed_embedding(text, dim=EMBED_DIM):
+    """Bag-of-words vector, so reworded questions land close together"""
+    vector = [0.0] * dim
+    for word in re.findall(r"[^\W_]+", text.lower()):
+        vector[zlib.crc32(word.encode("utf-8")) % dim] += 1.0
+    return vector
+
+
+def fake_openai(config):
+    """Stand-in for the pre-1.0 openai module's Embedding and ChatCompletion"""
+    def embed(model, input):
+        if config.delay():
+            raise RateLimitError("stand-in embedding rate limit")
+        return {'data': [{'embedding': hashed_embedding(text)} for text in input],
+                'usage': {'total_tokens': sum(len(text) // 4 + 1 for text in input)}}
+
+    def chat(model, messages):
+        if config.delay():
+            raise RateLimitError("stand-in completion rate limit")
+        question = messages[-1]['content'].rsplit("Question: ", 1)[-1]
+        prompt_tokens = sum(len(message['content']) // 4 for message in messages)
+        return types.SimpleNamespace(
+            choices=[types.SimpleNamespace(message={'content': f"Stand-in answer to: {question}"})],
+            usage=types.SimpleNamespace(total_tokens=prompt_tokens + 40))
+
+    return types.SimpleNamespace(Embedding=types.SimpleNamespace(create=embed),
+                                 ChatCompletion=types.SimpleNamespace(create=chat))
+
+
+class MemoryIndex:
+    """Stand-in for the Pinecone index: upsert, update, fetch and filtered cosine query."""
+
+    def __init__(self, config):
+        self.config = config
+        self.vectors = {}
+        self.lock = threading.Lock()
+        self.pool = ThreadPool(8)  # Like pinecone's pool_threads, for async_req updates
+
+    def upsert(self, vectors):
+        self.config.delay()
+        with self.lock:
+            for vector in vectors:
+                norm = sum(v * v for v in vector['values']) ** 0.5 or 1.0
+                self.vectors[vector['id']] = ([v / norm for v in vector['values']], dict(vector['metadata']))
+
+    def update(self, id, set_metadata, async_req=False):
+        if async_req:
+            return self.pool.apply_async(self.update, (id, set_metadata))
+        self.config.delay()
+        with self.lock:
+            if id in self.vectors:
+                self.vectors[id][1].update(set_metadata)
+
+    def fetch(self, ids):
+        self.config.delay()
+        with self.lock:
+            return {'vectors': {cid: {'id': cid, 'values': list(self.vectors[cid][0]),
+                                      'metadata': dict(self.vectors[cid][1])}
+                                for cid in ids if cid in self.vectors}}
+
+    def _matches(self, vector, top_k, jobs):
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        query = [v / norm for v in vector]
+        with self.lock:
+            scored = [(sum(a * b for a, b in zip(values, query)), chunk, metadata)
+                      for chunk, (values, metadata) in self.vectors.items()
+                      if jobs is None or jobs & set(metadata.get('job_ids', ()))]
+        scored.sort(key=lambda row: row[0], reverse=True)
+        return [{'id': chunk, 'score': score, 'metadata': metadata} for score, chunk, metadata in scored[:top_k]]
+
+    def query(self, vector=None, queries=None, top_k=5, include_metadata=True, filter=None):
+        self.config.delay()
+        jobs = set(filter['job_ids']['$in']) if filter else None
+        if queries is not None:
+            return {'results': [{'matches': self._matches(query, top_k, jobs)} for query in queries]}
+        return {'matches': self._matches(vector, top_k, jobs)}
+
+
+def fake_scholarly(base_url, config):
+    """Stand-in ``scholarly`` module whose results point at fixture-server PDFs"""
+    def search_pubs(keyword):
+        config.delay()
+        slug = re.sub(r"\W+", "-", keyword.lower()).strip("-")
+        for i in range(PAPERS_PER_SEARCH):
+            paper_id = f"{slug}-{i}"
+            yield {'title': f"{keyword} paper {i}", 'author': [f"Author {i}"],
+                   'url_pdf': f"{base_url}/repository.example.edu/pdf/{paper_id}.pdf"}
+
+    module = types.ModuleType("scholarly")
+    module.scholarly = types.SimpleNamespace(search_pubs=search_pubs)
+    return module
+
+
+def stub_ingest(ingestion_pool, minhash_signature):
+    """In-process stand-in for the parsing pool that reads the fixture PDFs' text operators"""
+    text_re = re.compile(r"\((.*?)\) Tj")
+
+    def parse(file_path, batch_size):
+        start = time.perf_counter()
+        with open(file_path, 'rb') as f:
+            pages = [html.unescape(text) for text in text_re.findall(f.read().decode('latin-1'))]
+        parsed = time.perf_counter()
+        batches = ingestion_pool.make_batches(file_path, pages, list(range(len(pages))), batch_size)
+        chunked = time.perf_counter()
+        signature = minhash_signature(" ".join(pages))
+        timings = {"parse": parsed - start, "chunk": chunked - parsed, "minhash": time.perf_counter() - chunked}
+        return ingestion_pool.IngestResult(batches, timings, signature)
+
+    async def ingest(file_path, job_id, batch_size=ingestion_pool.BATCH_SIZE):
+        return await asyncio.to_thread(parse, file_path, batch_size)
+
+    return ingest
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def parse_mix(mix):
+    weights = {}
+    for entry in mix.split(","):
+        name, _, weight = entry.partition("=")
+        if name.strip() not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {name!r} in mix; expected {', '.join(ENDPOINTS)}")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def parse_slo(slo):
+    """'ask:p95=800,ask:error_rate=0.01' -> [(endpoint, metric, limit)]; latency limits are in ms"""
+    targets = []
+    for entry in filter(None, (slo or "").split(",")):
+        match = re.fullmatch(r"\s*(\w+):(p50|p95|p99|error_rate)=([\d.]+)\s*", entry)
+        if not match or match.group(1) not in ENDPOINTS:
+            raise ValueError(f"Bad SLO target {entry!r}; expected e.g. ask:p95=800")
+        targets.append((match.group(1), match.group(2), float(match.group(3))))
+    return targets
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {endpoint: [] for endpoint in ENDPOINTS}
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, seconds, status):
+        with self.lock:
+            self.samples[endpoint].append((seconds, status))
+
+
+class Workload:
+    """Shared state of the replay: known jobs, completed jobs and the recorder."""
+
+    def __init__(self, base_url, weights, tenants, think, seed):
+        self.base_url = base_url
+        self.names = list(weights)
+        self.weights = [weights[name] for name in self.names]
+        self.tenants = tenants
+        self.think = think
+        self.seed = seed
+        self.jobs = []
+        self.completed = []
+        self.lock = threading.Lock()
+        self.recorder = Recorder()
+
+    def _call(self, session, endpoint, method, path, record=True, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = session.request(method, f"{self.base_url}{path}", timeout=60, **kwargs)
+            status = response.status_code
+        except requests.RequestException:
+            response, status = None, 0
+        if record:
+            self.recorder.record(endpoint, time.perf_counter() - start, status)
+        return response if status == 200 else None
+
+    def research(self, session, rng, tenant, record=True):
+        body = {'keyword': rng.choice(KEYWORDS), 'num_results': rng.choice((3, 5, 10, 25))}
+        response = self._call(session, "research", "POST", "/research/", record, json=body,
+                              headers={'X-Tenant-ID': tenant})
+        if response is not None:
+            with self.lock:
+                self.jobs.append(response.json()['job_id'])
+
+    def status(self, session, rng, job_id=None, record=True):
+        with self.lock:
+            job_id = job_id or (rng.choice(self.jobs) if self.jobs else None)
+        if job_id is None:
+            return None
+        response = self._call(session, "status", "GET", f"/research/{job_id}/status", record)
+        state = response.json().get('status') if response is not None else None
+        if state == 'completed':
+            with self.lock:
+                if job_id not in self.completed:
+                    self.completed.append(job_id)
+        return state
+
+    def step(self, session, rng, tenant):
+        endpoint = rng.choices(self.names, self.weights)[0]
+        with self.lock:
+            job_id = rng.choice(self.completed) if self.completed else None
+        if endpoint == "research" or not self.jobs:
+            self.research(session, rng, tenant)
+        elif endpoint == "status" or job_id is None:
+            self.status(session, rng)
+        elif endpoint == "ask":
+            self._call(session, "ask", "POST", f"/ask/{job_id}", json={'question': rng.choice(QUESTIONS)})
+        else:
+            questions = rng.sample(QUESTIONS, min(BATCH_QUESTIONS, len(QUESTIONS)))
+            self._call(session, "ask_batch", "POST", f"/ask/{job_id}/batch", json={'questions': questions})
+
+    def run_worker(self, worker, deadline, requests_left):
+        rng = random.Random(self.seed * 1000 + worker)
+        tenant = f"tenant-{worker % self.tenants}"
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            with self.lock:
+                if requests_left is not None:
+                    if requests_left[0] <= 0:
+                        break
+                    requests_left[0] -= 1
+            self.step(session, rng, tenant)
+            if self.think:
+                time.sleep(rng.uniform(0, 2 * self.think))
+
+    def seed_jobs(self, count, timeout=120.0):
+        """Start jobs outside the measurement and wait for them, so /ask has targets"""
+        session, rng = requests.Session(), random.Random(self.seed)
+        for i in range(count):
+            self.research(session, rng, f"tenant-{i % self.tenants}", record=False)
+        deadline = time.monotonic() + timeout
+        pending = list(self.jobs)
+        while pending and time.monotonic() < deadline:
+            pending = [job for job in pending
+                       if self.status(session, rng, job, record=False) in ('queued', 'processing')]
+            time.sleep(0.2)
+        return len(self.completed)
+
+
+def summarize(recorder, seconds):
+    report = {}
+    for endpoint, samples in recorder.samples.items():
+        if not samples:
+            continue
+        latencies = [latency for latency, _ in samples]
+        rejected = sum(1 for _, status in samples if status == 429)
+        errors = sum(1 for _, status in samples if status != 200 and status != 429)
+        report[endpoint] = {
+            "requests": len(samples),
+            "throughput_rps": round(len(samples) / seconds, 2) if seconds else 0.0,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            "errors": errors,
+            "error_rate": round(errors / len(samples), 4),
+            "rejected_429": rejected,
+        }
+    return report
+
+
+def check_slo(endpoints, targets):
+    results = []
+    for endpoint, metric, limit in targets:
+        row = endpoints.get(endpoint)
+        observed = None if row is None else row[metric if metric == "error_rate" else f"{metric}_ms"]
+        results.append({"target": f"{endpoint}:{metric}<={limit:g}", "observed": observed,
+                        "ok": observed is not None and observed <= limit})
+    return results
+
+
+def run_load_test(duration=30.0, requests_total=None, concurrency=8, mix=DEFAULT_MIX, tenants=4, think=0.0,
+                  seed_jobs=2, pdf_latency=0.05, search_latency=0.2, api_latency=0.1, index_latency=0.01,
+                  jitter=0.0, pdf_error_rate=0.0, api_error_rate=0.0, stub_parser=False, slo=None, seed=0):
+    weights, targets = parse_mix(mix), parse_slo(slo)
+    workdir = tempfile.mkdtemp(prefix="load_test_")
+    # Keep the run's chunk, duplicate, rate and snapshot state away from real state
+    os.environ["SARA_CHUNK_DB"] = os.path.join(workdir, "chunks.db")
+    os.environ["SARA_DUPLICATE_DB"] = os.path.join(workdir, "duplicates.db")
+    os.environ["SARA_SNAPSHOT_DIR"] = os.path.join(workdir, "snapshots")
+    os.environ.pop("SARA_RATE_DB", None)
+    os.environ.pop("SARA_TENANT_KEYS", None)
+    os.environ["SARA_TRUST_TENANT_HEADER"] = "1"  # Clients name their tenant with X-Tenant-ID
+    os.environ.setdefault("OPENAI_API_KEY", "load-test")
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)  # app.py downloads into ./downloads
+
+    import uvicorn
+    import app
+    import ingestion_pool
+    from near_duplicates import minhash_signature
+
+    with FixtureServer(FixtureConfig(latency=pdf_latency, jitter=jitter, error_rate=pdf_error_rate,
+                                     seed=seed)) as fixtures:
+        sys.modules["scholarly"] = fake_scholarly(fixtures.base_url, FixtureConfig(latency=search_latency,
+                                                                                   jitter=jitter, seed=seed))
+        openai_stand_in = fake_openai(FixtureConfig(latency=api_latency, jitter=jitter,
+                                                    error_rate=api_error_rate, seed=seed + 1))
+        index_stand_in = MemoryIndex(FixtureConfig(latency=index_latency, jitter=jitter, seed=seed + 2))
+        app.get_openai = lambda: openai_stand_in
+        app.get_index = lambda: index_stand_in
+        if stub_parser:
+            ingestion_pool.ingest = stub_ingest(ingestion_pool, minhash_signature)
+
+        port = free_port()
+        server = uvicorn.Server(uvicorn.Config(app.app, host="127.0.0.1", port=port, log_level="warning"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        started = time.monotonic()
+        while not server.started and time.monotonic() - started < 15:
+            time.sleep(0.05)
+        try:
+            if not server.started:
+                raise RuntimeError("The app did not start")
+            workload = Workload(f"http://127.0.0.1:{port}", weights, tenants, think, seed)
+            seeded = workload.seed_jobs(seed_jobs)
+            start = time.monotonic()
+            requests_left = [requests_total] if requests_total else None
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                list(pool.map(lambda worker: workload.run_worker(worker, start + duration, requests_left),
+                              range(concurrency)))
+            elapsed = time.monotonic() - start
+            states = {}
+            for job in app.research_jobs.values():
+                states[job['status']] = states.get(job['status'], 0) + 1
+        finally:
+            server.should_exit = True
+            thread.join(timeout=15)
+            os.chdir(previous_cwd)
+
+    endpoints = summarize(workload.recorder, elapsed)
+    return {
+        "seconds": round(elapsed, 2),
+        "concurrency": concurrency,
+        "mix": weights,
+        "seeded_jobs_completed": seeded,
+        "jobs": states,
+        "endpoints": endpoints,
+        "slo": check_slo(endpoints, targets),
+    }
+
+
+def print_report(report):
+    print(f"{report['seconds']}s, {report['concurrency']} clients, mix {report['mix']}, jobs {report['jobs']}")
+    print(f"{'endpoint':10} {'requests':>8} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'errors':>7} {'err %':>7} {'429':>5}")
+    for endpoint, row in report["endpoints"].items():
+        print(f"{endpoint:10} {row['requests']:8} {row['throughput_rps']:8} {row['p50_ms']:9} {row['p95_ms']:9} "
+              f"{row['p99_ms']:9} {row['errors']:7} {row['error_rate'] * 100:7.2f} {row['rejected_429']:5}")
+    for result in report["slo"]:
+        print(f"SLO {result['target']}: observed {result['observed']} -> {'ok' if result['ok'] else 'FAILED'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local load test for the FastAPI endpoints.")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of measured load")
+    parser.add_argument("--requests", type=int, default=None, help="stop after this many requests")
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="endpoint weights, e.g. " + DEFAULT_MIX)
+    parser.add_argument("--tenants", type=int, default=4, help="X-Tenant-ID values the clients rotate through")
+    parser.add_argument("--think", type=float, default=0.0, help="mean seconds between a client's requests")
+    parser.add_argument("--seed-jobs", type=int, default=2, help="jobs completed before measuring")
+    parser.add_argument("--pdf-latency", type=float, default=0.05, help="injected seconds per PDF download")
+    parser.add_argument("--search-latency", type=float, default=0.2, help="injected seconds per Scholar search")
+    parser.add_argument("--api-latency", type=float, default=0.1, help="injected seconds per embedding/completion")
+    parser.add_argument("--index-latency", type=float, default=0.01, help="injected seconds per vector-store call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of random latency on every stand-in")
+    parser.add_argument("--pdf-error-rate", type=float, default=0.0, help="fraction of PDF downloads answered with 503")
+    parser.add_argument("--api-error-rate", type=float, default=0.0, help="fraction of API calls that rate-limit")
+    parser.add_argument("--stub-parser", action="store_true", help="parse fixture PDFs in-process instead of the pool")
+    parser.add_argument("--slo", default=None, help="targets, e.g. ask:p95=800,status:p99=100,ask:error_rate=0.01")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+    report = run_load_test(args.duration, args.requests, args.concurrency, args.mix, args.tenants, args.think,
+                           args.seed_jobs, args.pdf_latency, args.search_latency, args.api_latency,
+                           args.index_latency, args.jitter, args.pdf_error_rate, args.api_error_rate,
+                           args.stub_parser, args.slo, args.seed)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(report, file, indent=2)
+    sys.exit(0 if all(result["ok"] for result in report["slo"]) else 1)
@@ -0,0 +1,232 @@
+"""Deterministic answers for the questions that do not need an LLM.
+
+``extract_local(pages, keywords)`` scans the page texts that the chunker
+works on. It answers the keyword count, the coordinates, the war period, the
+publishing and sinking dates and the DOI link where regular expressions can
+settle them. Each answer carries ``(page, start, end)`` evidence offsets in
+the same coordinates as ``chunker.ChunkSpan``. Pages are scanned whole rather
+than chunk by chunk, so the overlap between chunks is never double counted.
+
+A question is only resolved on positive evidence. For example, no coordinate
+match leaves the coordinate questions to the LLM rather than answering "No".
+``unresolved`` lists what still has to be asked.
+
+    python3 local_extraction.py paper.pdf "ireland shipwrecks"
+"""
+import re
+import sys
+import json
+from collections import Counter
+
+from research_questions import (QUESTIONS, LINK, KEYWORD_MENTIONS, COORDINATES, COORDINATES_MENTIONED,
+                                WAR_PERIOD, PUBLISHING_DATE, SINKING_DATES)
+from url_frontier import DOI_RE
+from extraction_schema import parse_answers
+
+MAX_EVIDENCE = 20
+FRONT_PAGES = 2  # Pages searched for the DOI and the publishing date
+SINKING_WINDOW = 120  # Characters between a sinking verb and its date
+
+_DEGREES = r"[°º˚]"
+_DMS = (rf"\d{{1,3}}(?:\.\d+)?\s*{_DEGREES}\s*"
+        r"(?:\d{1,2}(?:\.\d+)?\s*['′’]\s*)?"
+        r"(?:\d{1,2}(?:\.\d+)?\s*(?:\"|″|”|'')\s*)?")
+_DECIMAL = rf"\d{{1,3}}\.\d{{2,}}\s*{_DEGREES}?\s*"
+COORDINATE_RE = re.compile(
+    rf"(?:{_DMS}|{_DECIMAL})[NS]\b\s*[,;/]?\s*(?:{_DMS}|{_DECIMAL})[EW]\b"
+    r"|\blat(?:itude)?\s*[:=]?\s*-?\d{1,2}\.\d+[^\d\-]{1,20}?lon(?:g(?:itude)?)?\s*[:=]?\s*-?\d{1,3}\.\d+",
+    re.IGNORECASE)
+
+_MONTH = (r"(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|June?|July?|Aug(?:ust)?|"
+          r"Sep(?:t(?:ember)?)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)\.?")
+DATE = (rf"(?:\d{{1,2}}(?:st|nd|rd|th)?\s+{_MONTH},?\s+\d{{4}}"
+        rf"|{_MONTH}\s+\d{{1,2}}(?:st|nd|rd|th)?,?\s+\d{{4}}"
+        rf"|{_MONTH}\s+\d{{4}}"
+        r"|\d{4}-\d{2}-\d{2})")
+DATE_RE = re.compile(rf"\b{DATE}\b", re.IGNORECASE)
+YEAR_RE = re.compile(r"\b(?:18[5-9]\d|19\d\d|20[0-4]\d)\b")
+PUBLISHED_RE = re.compile(
+    rf"\b(?:published(?:\s+online)?|publication\s+date|date\s+of\s+publication|first\s+published)"
+    rf"\s*[:\-]?\s*(?:on\s+)?(?P<date>{DATE})", re.IGNORECASE)
+COPYRIGHT_RE = re.compile(r"(?:©|\(c\)|copyright)\s*(?:©\s*)?(?P<date>(?:19|20)\d\d)\b", re.IGNORECASE)
+SINKING_RE = re.compile(r"\b(?:sank|sunk|sinking|torpedoed|scuttled|foundered|wrecked)\b", re.IGNORECASE)
+VESSEL_RE = re.compile(r"\b(?:ship|vessel|steamer|steamship|tanker|freighter|liner|trawler|schooner|submarine|"
+                       r"U-boat|destroyer|cruiser|battleship|frigate|(?:HMS|SS|RMS|USS|HMT)\b)", re.IGNORECASE)
+
+WWI_RE = re.compile(r"\b(?:World\s+War\s+(?:I|One|1)(?![\w])|WW\s?(?:I|1)(?![\wI])|First\s+World\s+War|Great\s+War)",
+                    re.IGNORECASE)
+WWII_RE = re.compile(r"\b(?:World\s+War\s+(?:II|Two|2)(?![\w])|WW\s?(?:II|2)(?![\w])|Second\s+World\s+War)",
+                     re.IGNORECASE)
+WAR_DOMINANCE = 3  # One war must be mentioned this many times more often than the other
+
+STOPWORDS = {"a", "an", "and", "the", "of", "in", "on", "for", "to", "at", "by", "with", "or"}
+
+
+def keyword_terms(keywords):
+    """Stemmed keyword terms without stopwords"""
+    terms = [t for t in re.findall(r"[^\W_]+", keywords.lower()) if t not in STOPWORDS]
+    return {t[:-1] if len(t) > 3 and t.endswith("s") else t for t in terms}
+
+
+def keyword_pattern(keywords):
+    """Regex matching any keyword term, with a loose plural/suffix match"""
+    stems = sorted(keyword_terms(keywords), key=len, reverse=True)
+    if not stems:
+        return None
+    return re.compile(r"\b(?:" + "|".join(re.escape(s) for s in stems) + r")\w*", re.IGNORECASE)
+
+
+def _evidence(page, match, group=0):
+    return [page, match.start(group), match.end(group)]
+
+
+def _find(pages, pattern, page_numbers=None):
+    for page in (range(len(pages)) if page_numbers is None else page_numbers):
+        for match in pattern.finditer(pages[page]):
+            yield page, match
+
+
+def _answer(answer, evidence):
+    return {"answer": answer, "evidence": evidence[:MAX_EVIDENCE]}
+
+
+def _keyword_mentions(pages, keywords):
+    pattern = keyword_pattern(keywords or "")
+    if pattern is None:
+        return None
+    evidence = [_evidence(page, match) for page, match in _find(pages, pattern)]
+    return _answer(len(evidence), evidence)
+
+
+def _coordinates(pages):
+    found, evidence = [], []
+    for page, match in _find(pages, COORDINATE_RE):
+        text = " ".join(match.group(0).split())
+        if text not in found:
+            found.append(text)
+        evidence.append(_evidence(page, match))
+    return found, evidence
+
+
+def _war_period(pages):
+    counts, evidence = Counter(), {"WWI": [], "WWII": []}
+    for label, pattern in (("WWI", WWI_RE), ("WWII", WWII_RE)):
+        for page, match in _find(pages, pattern):
+            counts[label] += 1
+            evidence[label].append(_evidence(page, match))
+    for label, other in (("WWI", "WWII"), ("WWII", "WWI")):
+        if counts[label] >= 2 and counts[label] >= WAR_DOMINANCE * counts[other]:
+            return _answer(label, evidence[label])
+    return None
+
+
+def _front_pages(pages):
+    count = min(FRONT_PAGES, len(pages))
+    return list(range(count)) + ([len(pages) - 1] if len(pages) > count else [])
+
+
+def _publishing_date(pages):
+    front = _front_pages(pages)
+    for pattern in (PUBLISHED_RE, COPYRIGHT_RE):
+        for page, match in _find(pages, pattern, front):
+            return _answer(" ".join(match.group("date").split()), [_evidence(page, match, "date")])
+    return None
+
+
+def _sinking_dates(pages):
+    """Settled only by a full date near a sinking verb; bare years (citations, other events) go to the LLM"""
+    dates, evidence, full_date = [], [], False
+    for page, match in _find(pages, SINKING_RE):
+        text = pages[page]
+        window_start = max(0, match.start() - SINKING_WINDOW)
+        window_end = min(len(text), match.end() + SINKING_WINDOW)
+        candidates = list(DATE_RE.finditer(text, window_start, window_end))
+        full_date = full_date or bool(candidates)
+        if VESSEL_RE.search(text, window_start, window_end):
+            candidates += YEAR_RE.finditer(text, window_start, window_end)
+        # The date nearest the verb, preferring one that follows it
+        date = min(candidates, key=lambda d: (d.start() - match.end() if d.start() >= match.end()
+                                              else 10 + 3 * (match.start() - d.end())), default=None)
+        if date:
+            value = " ".join(date.group(0).split())
+            if value not in dates:
+                dates.append(value)
+            evidence.append([page, min(match.start(), date.start()), max(match.end(), date.end())])
+    if not full_date:
+        return None
+    return _answer(f"Yes ({', '.join(dates[:MAX_EVIDENCE])})", evidence)
+
+
+def _link(pages):
+    for page, match in _find(pages, DOI_RE, _front_pages(pages)):
+        doi = match.group(1).rstrip('.,;)]')
+        return _answer(f"https://doi.org/{doi}", [[page, match.start(1), match.start(1) + len(doi)]])
+    return None
+
+
+def extract_local(pages, keywords=""):
+    """{question: {"answer", "evidence": [[page, start, end], ...]}} for the questions settled locally"""
+    results = {
+        KEYWORD_MENTIONS: _keyword_mentions(pages, keywords),
+        WAR_PERIOD: _war_period(pages),
+        PUBLISHING_DATE: _publishing_date(pages),
+        SINKING_DATES: _sinking_dates(pages),
+        LINK: _link(pages),
+    }
+    coordinates, evidence = _coordinates(pages)
+    if coordinates:
+        results[COORDINATES] = _answer("; ".join(coordinates), evidence)
+        results[COORDINATES_MENTIONED] = _answer("Yes", evidence)
+    return {question: result for question, result in results.items() if result is not None}
+
+
+def unresolved(local, questions=QUESTIONS):
+    """Questions that still need the LLM, in their original order"""
+    return [question for question in questions if question not in local]
+
+
+def merge_answers(llm_answers, local, questions=QUESTIONS):
+    """One answer dict in question order; local answers win, evidence goes under "Evidence"."""
+    merged = {}
+    for question in questions:
+        if question in local:
+            merged[question] = local[question]["answer"]
+        elif question in (llm_answers or {}):
+            merged[question] = llm_answers[question]
+    for key, value in (llm_answers or {}).items():
+        merged.setdefault(key, value)
+    merged["Evidence"] = json.dumps({question: result["evidence"] for question, result in local.items()})
+    return merged
+
+
+def merge_into_raw(raw, local, questions=QUESTIONS):
+    """The agent's raw answer with the local answers merged in; returned unchanged if nothing in it parses"""
+    if not local:
+        return raw
+    answers = parse_answers(raw, unresolved(local, questions)) if raw.strip() not in ("", "{}") else {}
+    if answers is None:
+        return raw
+    return json.dumps(merge_answers(answers, local, questions), indent=2)
+
+
+def read_pdf_pages(pdf_path, max_pages=None):
+    """Text of each page of a PDF, or of its first max_pages pages"""
+    import PyPDF2
+    with open(pdf_path, 'rb') as file:
+        pages = PyPDF2.PdfReader(file).pages
+        count = len(pages) if max_pages is None else min(max_pages, len(pages))
+        return [pages[i].extract_text() or "" for i in range(count)]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python3 local_extraction.py <pdf> [keywords]")
+        sys.exit(1)
+    pdf_pages = read_pdf_pages(sys.argv[1])
+    local_answers = extract_local(pdf_pages, sys.argv[2] if len(sys.argv) > 2 else "")
+    for question, result in local_answers.items():
+        page, start, end = result["evidence"][0] if result["evidence"] else (0, 0, 0)
+        print(f"{question}\n    {result['answer']}  [p{page + 1} {pdf_pages[page][start:end]!r}]")
+    print("Left for the LLM:")
+    for question in unresolved(local_answers):
+        print(f"    {question}")
@@ -9,6 +9,9 @@ import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import NoSuchElementException
 import re
+from latency_tracker import timed_get
+from url_frontier import get_seen_set, canonicalize_url
+from tracing import start_run, traced, install_log_context
 
 logging.basicConfig(filename='mdpi_downloader.log', level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
@@ -41,7 +44,7 @@ def download_pdf(pdf_url, output_dir):
                 file.write(response.content)
             logging.info(f"Downloaded: {file_path}")
             print(f"Downloaded: {file_path}")
-            return True
+            return file_path
         else:
             logging.error(f"Failed to download PDF from {pdf_url}. Status code: {response.status_code}")
             print(f"Failed to download PDF from {pdf_url}")
@@ -51,15 +54,17 @@ def download_pdf(pdf_url, output_dir):
         print(f"Error downloading PDF from {pdf_url}: {e}")
         return False
 
+@traced("mdpi.article")
 def process_mdpi_url(driver, url, output_dir):
     try:
-        driver.get(url)
+        timed_get(driver, url)
         time.sleep(random.uniform(2, 5))
         try:
             pdf_link = driver.find_element(By.CSS_SELECTOR, "a.UD_ArticlePDF").get_attribute('href')
             print(f"PDF Link: {pdf_link}")
-            success = download_pdf(pdf_link, output_dir)
-            if success:
+            file_path = download_pdf(pdf_link, output_dir)
+            if file_path:
+                get_seen_set().add(url, 'downloaded', file_path)
                 logging.info(f"Successfully downloaded PDF from {url}")
                 return True
             else:
@@ -74,21 +79,19 @@ def process_mdpi_url(driver, url, output_dir):
         print(f"Error processing MDPI URL {url}: {e}")
         return False
 
-def main(output_dir, mdpi_csv):
+def download_mdpi_pdfs(driver, output_dir, mdpi_csv):
     print(f"Output directory: {output_dir}")
     print(f"CSV file: {mdpi_csv}")
 
     os.makedirs(output_dir, exist_ok=True)
 
-    driver = setup_driver()
-    if not driver:
-        print("Failed to set up the browser. Exiting.")
-        return
-
     try:
         with open(mdpi_csv, 'r') as file:
             reader = csv.reader(file)
-            mdpi_urls = [row[0] for row in reader]
+            mdpi_urls = [canonicalize_url(row[0]) for row in reader if row]
+
+        seen = get_seen_set()
+        mdpi_urls = [url for url in dict.fromkeys(mdpi_urls) if seen.state(url) != 'downloaded']
 
         print(f"Found {len(mdpi_urls)} MDPI URLs to process.")
         
@@ -118,6 +121,17 @@ def main(output_dir, mdpi_csv):
     except Exception as e:
         logging.error(f"Error processing MDPI URLs: {e}")
         print(f"Error processing MDPI URLs: {e}")
+
+def main(pairs):
+    """Download every (output_dir, mdpi_csv) pair with a single browser"""
+    driver = setup_driver()
+    if not driver:
+        print("Failed to set up the browser. Exiting.")
+        return
+
+    try:
+        for output_dir, mdpi_csv in pairs:
+            download_mdpi_pdfs(driver, output_dir, mdpi_csv)
     finally:
         if driver:
             driver.quit()
@@ -127,10 +141,10 @@ def main(output_dir, mdpi_csv):
     print("MDPI download process completed.")
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python3 mdpi_downloader.py <output_directory> <mdpi_csv_file>")
+    if len(sys.argv) < 3 or len(sys.argv) % 2 != 1:
+        print("Usage: python3 mdpi_downloader.py <output_directory> <mdpi_csv_file> [<output_directory> <mdpi_csv_file> ...]")
         sys.exit(1)
     
-    output_dir = sys.argv[1]
-    mdpi_csv = sys.argv[2]
-    main(output_dir, mdpi_csv)
\ No newline at end of file
+    start_run()
+    install_log_context()
+    main(list(zip(sys.argv[1::2], sys.argv[2::2])))
\ No newline at end of file
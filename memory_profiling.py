@@ -0,0 +1,237 @@
+"""Per-stage memory accounting: tracemalloc snapshots and peak-RSS sampling.
+
+Off by default. Set SARA_MEMORY_PROFILE=1 to wrap every pipeline stage (see
+``pipeline_metrics.observe_stage``) and write one JSON report per PDF under
+``memory_reports/``. Each report lists every stage's peak traced memory, its
+peak RSS and its top allocation sites.
+
+``python3 memory_profiling.py check --budget-mb 512 big.pdf`` runs the parse,
+chunk and text-extraction stages on real or synthetic large inputs and exits
+non-zero when any stage's peak passes the budget.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import resource
+import threading
+import tracemalloc
+import contextvars
+from contextlib import contextmanager
+
+REPORT_DIR = "memory_reports"
+RSS_INTERVAL = 0.05  # Seconds between RSS samples
+TOP_SITES = 10
+
+_report = contextvars.ContextVar("sara_memory_report", default=None)
+
+# tracemalloc is process-wide and stages overlap (to_thread workers), so
+# tracing is started by the first active stage and stopped by the last one
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_started = False
+
+
+class MemoryBudgetExceeded(Exception):
+    pass
+
+
+def enabled():
+    return os.getenv("SARA_MEMORY_PROFILE", "") not in ("", "0", "false")
+
+
+def budget_mb():
+    value = os.getenv("SARA_MEMORY_BUDGET_MB")
+    try:
+        return float(value) if value else None
+    except ValueError:
+        logging.warning(f"Ignoring SARA_MEMORY_BUDGET_MB={value!r}; no memory budget applied")
+        return None
+
+
+def current_rss():
+    """Resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/statm", 'r') as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is KiB on Linux and bytes on macOS; it is a lifetime peak either way
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _start_tracing():
+    """Register an active stage; returns True when it is the only one"""
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+            _tracing_started = True
+        _tracing_users += 1
+        alone = _tracing_users == 1
+        if alone:
+            tracemalloc.reset_peak()  # Nobody else is measuring, so the shared peak is ours
+        return alone
+
+
+def _stop_tracing():
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_started:
+            tracemalloc.stop()
+            _tracing_started = False
+
+
+class RssSampler:
+    """Background thread that keeps the highest RSS (and traced memory) seen while it runs."""
+
+    def __init__(self, interval=RSS_INTERVAL):
+        self.interval = interval
+        self.peak = current_rss()
+        self.traced_peak = tracemalloc.get_traced_memory()[0]
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sara-rss-sampler", daemon=True)
+
+    def _sample(self):
+        self.peak = max(self.peak, current_rss())
+        self.traced_peak = max(self.traced_peak, tracemalloc.get_traced_memory()[0])
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+@contextmanager
+def stage_memory(stage, force=False, limit_mb=None):
+    """Measure one stage; appends to the active per-PDF report, if any.
+
+    Raises MemoryBudgetExceeded after the stage when its peak (traced or RSS
+    growth) passes ``limit_mb`` or SARA_MEMORY_BUDGET_MB.
+
+    The traced peak is the growth over the traced memory at the start of the
+    stage. A stage running alone uses tracemalloc's exact peak. While stages
+    overlap, the peak is sampled every RSS_INTERVAL and includes what the
+    other stages allocate.
+    """
+    if not (force or enabled()):
+        yield None
+        return
+    alone = _start_tracing()
+    traced_before = tracemalloc.get_traced_memory()[0]
+    before = tracemalloc.take_snapshot()
+    rss_before = current_rss()
+    start = time.perf_counter()
+    record = {"stage": stage}
+    try:
+        with RssSampler() as sampler:
+            yield record
+    finally:
+        exact_peak = tracemalloc.get_traced_memory()[1]
+        after = tracemalloc.take_snapshot()
+        _stop_tracing()
+        traced_peak = max(0, (exact_peak if alone else sampler.traced_peak) - traced_before)
+        record.update({
+            "seconds": round(time.perf_counter() - start, 4),
+            "traced_peak_mb": round(traced_peak / 2**20, 2),
+            "rss_before_mb": round(rss_before / 2**20, 2),
+            "rss_peak_mb": round(sampler.peak / 2**20, 2),
+            "rss_growth_mb": round(max(0, sampler.peak - rss_before) / 2**20, 2),
+            "top_sites": [
+                {"site": str(diff.traceback[0]), "size_mb": round(diff.size_diff / 2**20, 3), "count": diff.count_diff}
+                for diff in after.compare_to(before, 'lineno')[:TOP_SITES] if diff.size_diff > 0
+            ],
+        })
+        report = _report.get()
+        if report is not None:
+            report["stages"].append(record)
+        logging.info(f"Memory for stage {stage}: traced peak {record['traced_peak_mb']} MB, "
+                     f"RSS peak {record['rss_peak_mb']} MB")
+    limit = limit_mb if limit_mb is not None else budget_mb()
+    if limit is not None and max(record["traced_peak_mb"], record["rss_growth_mb"]) > limit:
+        raise MemoryBudgetExceeded(
+            f"Stage {stage} peaked at {max(record['traced_peak_mb'], record['rss_growth_mb'])} MB, budget {limit} MB")
+
+
+@contextmanager
+def memory_report(label, force=False, out_dir=None):
+    """Collect the stages run inside the block into one report for a PDF."""
+    if not (force or enabled()):
+        yield None
+        return
+    report = {"label": label, "started": time.time(), "stages": []}
+    token = _report.set(report)
+    try:
+        yield report
+    finally:
+        _report.reset(token)
+        report["peak_rss_mb"] = max((s["rss_peak_mb"] for s in report["stages"]), default=None)
+        out_dir = out_dir or os.getenv("SARA_MEMORY_REPORT_DIR", REPORT_DIR)
+        try:
+            os.makedirs(out_dir, exist_ok=True)
+            safe_label = "".join(c if c.isalnum() or c in "-_." else "_" for c in label)
+            with open(os.path.join(out_dir, f"{safe_label}.json"), 'w') as file:
+                json.dump(report, file, indent=2)
+        except OSError as e:
+            logging.error(f"Could not write memory report for {label}: {e}")
+
+
+def check_pdf(pdf_path, limit_mb):
+    """Run the ingestion stages on one PDF under the budget; returns the report."""
+    import PyPDF2
+    from langchain.document_loaders import PyPDFLoader
+    from chunker import chunk_pages
+
+    with memory_report(os.path.basename(pdf_path), force=True) as report:
+        with stage_memory("parse", force=True, limit_mb=limit_mb):
+            pages = PyPDFLoader(pdf_path).load()
+        with stage_memory("chunk", force=True, limit_mb=limit_mb):
+            chunk_pages([page.page_content for page in pages], chunk_size=1000, chunk_overlap=200)
+        del pages
+        with stage_memory("extract_text", force=True, limit_mb=limit_mb):
+            with open(pdf_path, 'rb') as file:
+                reader = PyPDF2.PdfReader(file)
+                text = "\n".join(page.extract_text() for page in reader.pages)
+        del text
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory regression check for the ingestion stages.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    check = sub.add_parser("check", help="fail when a stage passes the memory budget")
+    check.add_argument("pdfs", nargs="*", help="PDF files to ingest")
+    check.add_argument("--budget-mb", type=float, default=budget_mb() or 512)
+    check.add_argument("--synthetic-pages", type=int, default=0,
+                       help="also generate and check a synthetic PDF with this many pages")
+    args = parser.parse_args()
+
+    pdfs = list(args.pdfs)
+    if args.synthetic_pages:
+        import tempfile
+        from fixture_server import make_fixture_pdf
+        path = os.path.join(tempfile.mkdtemp(prefix="memcheck_"), f"synthetic-{args.synthetic_pages}p.pdf")
+        with open(path, 'wb') as file:
+            file.write(make_fixture_pdf("Synthetic large report", args.synthetic_pages, args.synthetic_pages * 20))
+        pdfs.append(path)
+
+    failed = False
+    for pdf in pdfs:
+        try:
+            report = check_pdf(pdf, args.budget_mb)
+            print(f"OK   {pdf}: " + ", ".join(f"{s['stage']} {s['traced_peak_mb']} MB" for s in report["stages"]))
+        except MemoryBudgetExceeded as e:
+            failed = True
+            print(f"FAIL {pdf}: {e}")
+    sys.exit(1 if failed else 0)
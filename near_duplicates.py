@@ -0,0 +1,207 @@
+"""MinHash/LSH index of ingested documents for near-duplicate routing.
+
+A publisher PDF, its preprint and a repository copy differ in bytes but
+share almost all of their text. ``minhash_signature`` hashes a document's
+5-word shingles once (one-permutation hashing): the low bits of each hash
+pick one of ``NUM_PERM`` slots and a slot keeps its smallest remaining
+value. Empty slots borrow from the next filled one. The fraction of equal
+signature slots estimates the Jaccard similarity of the two shingle sets.
+Signatures from the older per-slot hashing are dropped when the database
+is opened, since the two cannot be compared.
+
+``NearDuplicateIndex`` keeps each signature in SQLite, split into ``BANDS``
+LSH bands of ``ROWS`` slots. A new document is only compared with documents
+that share at least one band bucket. It counts as a duplicate when the
+estimated similarity reaches SARA_DUPLICATE_THRESHOLD (default 0.8). The
+match names the canonical document and returns what was stored for it (its
+answers or its chunk IDs), so callers can reuse that work instead of
+processing the copy. SARA_DUPLICATE_DB sets the database path.
+
+Each pipeline indexes under its own namespace ("research" for the API,
+"selection" for the batch answerer), since their payloads differ. A match
+only ever comes from the caller's namespace.
+"""
+import os
+import re
+import sys
+import json
+import logging
+import time
+import zlib
+import sqlite3
+import argparse
+import threading
+from array import array
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+NUM_PERM = 128  # A power of two: slots are picked by the hash's low bits
+BANDS, ROWS = 16, 8  # Candidate pairs at about (1/16)^(1/8) = 0.71 similarity
+SHINGLE_WORDS = 5
+DUPLICATE_DB = "near_duplicates.db"
+DEFAULT_THRESHOLD = 0.8
+SIGNATURE_VERSION = 2  # Stored as the database's user_version
+
+_MASK64 = (1 << 64) - 1
+_SLOT_BITS = NUM_PERM.bit_length() - 1
+_ROTATION = 1 << (64 - _SLOT_BITS)  # Offset per slot an empty slot borrows across; keeps values distinct
+_WORD_RE = re.compile(r"[^\W_]+")
+
+
+def threshold():
+    try:
+        return float(os.getenv("SARA_DUPLICATE_THRESHOLD", DEFAULT_THRESHOLD))
+    except ValueError:
+        return DEFAULT_THRESHOLD
+
+
+def shingles(text, size=SHINGLE_WORDS):
+    """CRC32 hashes of the lower-cased word n-grams of a text"""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))} if words else set()
+    return {zlib.crc32(" ".join(words[i:i + size]).encode("utf-8")) for i in range(len(words) - size + 1)}
+
+
+def _mix64(x):
+    """splitmix64 finaliser: spreads a 32-bit shingle hash over 64 bits"""
+    x = (x + 0x9E3779B97F4A7C15) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+
+def minhash_signature(text):
+    """NUM_PERM one-permutation MinHash slots of the text's shingles, or None for a text without words"""
+    hashes = shingles(text)
+    if not hashes:
+        return None
+    slots = [None] * NUM_PERM
+    for shingle in hashes:
+        mixed = _mix64(shingle)
+        slot, value = mixed & (NUM_PERM - 1), mixed >> _SLOT_BITS
+        if slots[slot] is None or value < slots[slot]:
+            slots[slot] = value
+    signature = []
+    for slot in range(NUM_PERM):
+        # Rotation densification: an empty slot takes the next filled slot's value, offset by the distance
+        for distance in range(NUM_PERM):
+            value = slots[(slot + distance) % NUM_PERM]
+            if value is not None:
+                signature.append(value + distance * _ROTATION)
+                break
+    return signature
+
+
+def similarity(first, second):
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(1 for a, b in zip(first, second) if a == b) / len(first)
+
+
+def _bands(signature):
+    return [array("Q", signature[band * ROWS:(band + 1) * ROWS]).tobytes() for band in range(BANDS)]
+
+
+class Match(NamedTuple):
+    doc_id: str  # Canonical document
+    similarity: float
+    payload: Optional[dict]  # What the canonical document's processing stored, if anything
+
+
+class NearDuplicateIndex:
+    """SQLite-backed LSH index of document signatures."""
+
+    def __init__(self, path=None, similarity_threshold=None, namespace="default"):
+        self.path = path or os.getenv("SARA_DUPLICATE_DB", DUPLICATE_DB)
+        self.threshold = threshold() if similarity_threshold is None else similarity_threshold
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS signatures (
+            namespace TEXT, doc_id TEXT, canonical_id TEXT, signature BLOB, payload TEXT, created REAL,
+            PRIMARY KEY (namespace, doc_id))""")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS signature_bands "
+                           "(namespace TEXT, band INTEGER, bucket BLOB, doc_id TEXT)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS signature_bands_by_bucket "
+                           "ON signature_bands (namespace, band, bucket)")
+        (version,) = self._conn.execute("PRAGMA user_version").fetchone()
+        if version < SIGNATURE_VERSION:
+            dropped = self._conn.execute("DELETE FROM signatures").rowcount
+            self._conn.execute("DELETE FROM signature_bands")
+            self._conn.execute(f"PRAGMA user_version = {SIGNATURE_VERSION}")
+            if dropped:
+                logging.warning(f"Dropped {dropped} near-duplicate signatures from an older hashing scheme")
+        self._conn.commit()
+
+    def match(self, signature, exclude=None):
+        """Best canonical document at or above the threshold, or None"""
+        if signature is None:
+            return None
+        with self._lock:
+            candidates = set()
+            for band, bucket in enumerate(_bands(signature)):
+                rows = self._conn.execute("SELECT doc_id FROM signature_bands "
+                                          "WHERE namespace = ? AND band = ? AND bucket = ?",
+                                          (self.namespace, band, bucket)).fetchall()
+                candidates.update(doc_id for (doc_id,) in rows)
+            candidates.discard(exclude)
+            best = None
+            for doc_id in candidates:
+                canonical_id, blob = self._conn.execute(
+                    "SELECT canonical_id, signature FROM signatures WHERE namespace = ? AND doc_id = ?",
+                    (self.namespace, doc_id)).fetchone()
+                score = similarity(signature, array("Q", blob))
+                if score >= self.threshold and (best is None or score > best[1]):
+                    best = (canonical_id or doc_id, score)
+            if best is None:
+                return None
+            row = self._conn.execute("SELECT payload FROM signatures WHERE namespace = ? AND doc_id = ?",
+                                     (self.namespace, best[0])).fetchone()
+        payload = json.loads(row[0]) if row and row[0] else None
+        return Match(best[0], round(best[1], 3), payload)
+
+    def add(self, doc_id, signature, canonical_id=None, payload=None):
+        """Index a document; duplicates are recorded with the canonical document they route to"""
+        if signature is None or canonical_id == doc_id:
+            return  # Nothing to index, or a canonical document seen again
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM signature_bands WHERE namespace = ? AND doc_id = ?",
+                               (self.namespace, doc_id))
+            self._conn.execute("INSERT OR REPLACE INTO signatures "
+                               "(namespace, doc_id, canonical_id, signature, payload, created) VALUES (?, ?, ?, ?, ?, ?)",
+                               (self.namespace, doc_id, canonical_id, array("Q", signature).tobytes(),
+                                None if payload is None else json.dumps(payload), time.time()))
+            self._conn.executemany("INSERT INTO signature_bands (namespace, band, bucket, doc_id) VALUES (?, ?, ?, ?)",
+                                   [(self.namespace, band, bucket, doc_id)
+                                    for band, bucket in enumerate(_bands(signature))])
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+@lru_cache(maxsize=None)
+def get_duplicate_index(namespace="default"):
+    return NearDuplicateIndex(namespace=namespace)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report near-duplicate PDFs in a folder")
+    parser.add_argument("folder")
+    parser.add_argument("--threshold", type=float, default=None)
+    args = parser.parse_args()
+    from local_extraction import read_pdf_pages
+    index = NearDuplicateIndex(":memory:", args.threshold)
+    for name in sorted(os.listdir(args.folder)):
+        if not name.endswith(".pdf"):
+            continue
+        signature = minhash_signature(" ".join(read_pdf_pages(os.path.join(args.folder, name))))
+        match = index.match(signature)
+        index.add(name, signature, match.doc_id if match else None)
+        if match:
+            print(f"{name}: duplicate of {match.doc_id} (similarity {match.similarity})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,12 +5,16 @@ import requests
 import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 import logging
 import re
 import csv
+import shutil
+import argparse
 import subprocess
+from latency_tracker import timed_get, timed_wait
+from url_frontier import get_seen_set, canonicalize_url, paper_key, sciencedirect_pii
+from tracing import start_run, span, traced, child_env, install_log_context
 
 # Set up logging
 logging.basicConfig(filename='pdf_downloader.log', level=logging.INFO,
@@ -44,10 +48,33 @@ def setup_output_directory(keywords):
     os.makedirs(output_dir, exist_ok=True)
     return output_dir
 
+# Paper keys already written to a CSV or downloaded during this run
+queued_this_run = set()
+
+# While a campaign runs: the current keyword's output directory, and the
+# (url, output_dir) pairs whose paper was already handled for another keyword
+campaign_state = {'output_dir': None, 'views': []}
+
+def record_campaign_view(url):
+    if campaign_state['output_dir']:
+        campaign_state['views'].append((url, campaign_state['output_dir']))
+
+def already_handled(url):
+    """True if the paper behind url was queued in this run or resolved/downloaded in any run"""
+    key = paper_key(url)
+    if key in queued_this_run or get_seen_set().is_done(url):
+        logging.info(f"Skipping already handled URL: {url}")
+        print(f"Skipping already handled URL: {url}")
+        record_campaign_view(url)
+        return True
+    queued_this_run.add(key)
+    return False
+
 def is_direct_pdf_link(url):
     return url.lower().endswith('.pdf')
 
 def download_pdf(pdf_link, output_dir):
+    """Path of the downloaded PDF, or None"""
     try:
         response = requests.get(pdf_link, stream=True)
         if response.status_code == 200:
@@ -57,19 +84,23 @@ def download_pdf(pdf_link, output_dir):
                 for data in response.iter_content(1024):
                     pdf_file.write(data)
             logging.info(f"Downloaded PDF: {pdf_path}")
-            return True
+            get_seen_set().add(pdf_link, 'downloaded', pdf_path)
+            return pdf_path
         else:
             logging.warning(f"Failed to download {pdf_link}: Invalid response status {response.status_code}")
-            return False
+            return None
     except Exception as e:
         logging.error(f"Failed to download {pdf_link}: {e}")
-        return False
+        return None
 
+@traced("store.sciencedirect")
 def store_sciencedirect_url(url, csv_file):
-    match = re.search(r'(pii/\w+)', url)
-    if match:
-        article_id = match.group(1)
-        clean_url = f"https://www.sciencedirect.com/science/article/abs/{article_id}"
+    pii = sciencedirect_pii(url)
+    if pii:
+        clean_url = f"https://www.sciencedirect.com/science/article/abs/pii/{pii}"
+        if already_handled(clean_url):
+            return
+        get_seen_set().add(clean_url, 'queued')
         with open(csv_file, 'a', newline='') as file:
             writer = csv.writer(file)
             writer.writerow([clean_url])
@@ -79,17 +110,26 @@ def store_sciencedirect_url(url, csv_file):
         logging.warning(f"Could not extract article identifier from URL: {url}")
         print(f"Warning: Could not extract article identifier from URL: {url}")
 
+@traced("store.mdpi")
 def store_mdpi_url(url, csv_file):
+    url = canonicalize_url(url)
+    if already_handled(url):
+        return
+    get_seen_set().add(url, 'queued')
     with open(csv_file, 'a', newline='') as file:
         writer = csv.writer(file)
         writer.writerow([url])
     logging.info(f"Stored MDPI URL in CSV: {url}")
     print(f"Stored MDPI URL: {url}")
 
+@traced("store.wiley")
 def store_wiley_url(driver, url, csv_file):
+    url = canonicalize_url(url)
+    if already_handled(url):
+        return
     try:
         # Navigate to the URL
-        driver.get(url)
+        timed_get(driver, url)
         random_delay(5, 10)  # Add a delay to allow the page to load
 
         # Extract the PDF link from Wiley page
@@ -99,6 +139,7 @@ def store_wiley_url(driver, url, csv_file):
             with open(csv_file, 'a', newline='') as file:
                 writer = csv.writer(file)
                 writer.writerow([pdf_link])
+            get_seen_set().add(url, 'resolved', pdf_link)
             logging.info(f"Stored Wiley PDF URL in CSV: {pdf_link}")
             print(f"Stored Wiley PDF URL: {pdf_link}")
         else:
@@ -108,10 +149,14 @@ def store_wiley_url(driver, url, csv_file):
         logging.error(f"Failed to extract PDF link from Wiley URL {url}: {e}")
         print(f"Failed to extract PDF link from Wiley URL {url}: {e}")
 
+@traced("store.tandfonline")
 def store_tandfonline_url(driver, url, csv_file):
+    url = canonicalize_url(url)
+    if already_handled(url):
+        return
     try:
         # Navigate to the URL
-        driver.get(url)
+        timed_get(driver, url)
         random_delay(5, 10)  # Allow page to fully load
         
         # Extract the PDF link from Tandfonline page
@@ -121,6 +166,7 @@ def store_tandfonline_url(driver, url, csv_file):
             with open(csv_file, 'a', newline='') as file:
                 writer = csv.writer(file)
                 writer.writerow([pdf_link])
+            get_seen_set().add(url, 'resolved', pdf_link)
             logging.info(f"Stored Tandfonline PDF URL in CSV: {pdf_link}")
             print(f"Stored Tandfonline PDF URL: {pdf_link}")
         else:
@@ -133,7 +179,7 @@ def store_tandfonline_url(driver, url, csv_file):
 def get_heinonline_pdf_href(driver, url):
     try:
         # Navigate to the URL
-        driver.get(url)
+        timed_get(driver, url)
         random_delay(5, 10)  # Add a delay to allow the page to load
 
         # Locate the <a> tag inside the div with class "btn-group" and extract the href
@@ -148,29 +194,40 @@ def get_heinonline_pdf_href(driver, url):
         print(f"Failed to extract PDF href from HeinOnline URL {url}: {e}")
         return None
 
+@traced("store.heinonline")
 def store_heinonline_url(driver, url, csv_file):
+    url = canonicalize_url(url)
+    if already_handled(url):
+        return
     pdf_href = get_heinonline_pdf_href(driver, url)
     if pdf_href:
         with open(csv_file, 'a', newline='') as file:
             writer = csv.writer(file)
             writer.writerow([pdf_href])
+        get_seen_set().add(url, 'resolved', pdf_href)
         logging.info(f"Stored HeinOnline PDF href in CSV: {pdf_href}")
         print(f"Stored HeinOnline PDF href: {pdf_href}")
     else:
         logging.warning(f"Could not extract PDF href from HeinOnline URL: {url}")
         print(f"Warning: Could not extract PDF href from HeinOnline URL: {url}")
 
+@traced("download.direct")
 def process_pdf_link(pdf_link, output_dir):
+    """Download a direct PDF link; returns the local path, or None if skipped or failed"""
+    pdf_link = canonicalize_url(pdf_link)
+    if already_handled(pdf_link):
+        return None
     print(f"Found PDF link: {pdf_link}")
-    success = download_pdf(pdf_link, output_dir)
-    if success:
+    pdf_path = download_pdf(pdf_link, output_dir)
+    if pdf_path:
         print(f"Successfully downloaded: {pdf_link}")
     else:
         print(f"Failed to download: {pdf_link}")
     random_delay(5, 10)
+    return pdf_path
 
 def search_google(driver, keywords, output_dir, sciencedirect_csv, mdpi_csv, heinonline_csv, wiley_csv, tandfonline_csv):
-    driver.get("https://www.google.com/")
+    timed_get(driver, "https://www.google.com/")
     random_delay(10, 20)
     search_bar = driver.find_element(By.NAME, 'q')
     search_bar.send_keys(keywords)
@@ -182,12 +239,12 @@ def search_google(driver, keywords, output_dir, sciencedirect_csv, mdpi_csv, hei
         print(f"Processing page {page + 1}...")
         start = page * 10
         search_url = f"https://www.google.com/search?q={keywords.replace(' ', '+')}+filetype:pdf&start={start}"
-        driver.get(search_url)
+        timed_get(driver, search_url)
         random_delay(10, 20)
-        wait = WebDriverWait(driver, 20)
         pdf_links = []
         try:
-            results = wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, "a")))
+            results = timed_wait(driver, search_url, "element_wait", 20,
+                                 EC.presence_of_all_elements_located((By.CSS_SELECTOR, "a")))
             for result in results:
                 link = result.get_attribute('href')
                 if link:
@@ -210,7 +267,7 @@ def search_google(driver, keywords, output_dir, sciencedirect_csv, mdpi_csv, hei
                 process_pdf_link(pdf_link, output_dir)
 
 def search_google_scholar(driver, keywords, output_dir, sciencedirect_csv, mdpi_csv, heinonline_csv, wiley_csv, tandfonline_csv):
-    driver.get("https://scholar.google.com/")
+    timed_get(driver, "https://scholar.google.com/")
     random_delay(10, 20)
     search_bar = driver.find_element(By.NAME, 'q')
     search_bar.send_keys(keywords)
@@ -223,7 +280,7 @@ def search_google_scholar(driver, keywords, output_dir, sciencedirect_csv, mdpi_
         
         start = page * 10
         search_url = f"https://scholar.google.com/scholar?q={keywords.replace(' ', '+')}&start={start}"
-        driver.get(search_url)
+        timed_get(driver, search_url)
         random_delay(10, 20)
         
         if "captcha" in driver.current_url.lower():
@@ -231,11 +288,11 @@ def search_google_scholar(driver, keywords, output_dir, sciencedirect_csv, mdpi_
             print("CAPTCHA detected. Stopping script to avoid further issues.")
             return
         
-        wait = WebDriverWait(driver, 20)
         article_links = []
         
         try:
-            articles = wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, "h3.gs_rt a")))
+            articles = timed_wait(driver, search_url, "element_wait", 20,
+                                  EC.presence_of_all_elements_located((By.CSS_SELECTOR, "h3.gs_rt a")))
             for article in articles:
                 article_links.append(article.get_attribute('href'))
             
@@ -246,7 +303,12 @@ def search_google_scholar(driver, keywords, output_dir, sciencedirect_csv, mdpi_
                     process_pdf_link(article_link, output_dir)
                     continue
                 
-                driver.get(article_link)
+                if get_seen_set().is_done(article_link):
+                    print(f"Skipping already resolved article: {article_link}")
+                    record_campaign_view(article_link)
+                    continue
+                
+                timed_get(driver, article_link)
                 random_delay(10, 20)
                 
                 if 'sciencedirect.com' in driver.current_url:
@@ -277,7 +339,11 @@ def search_google_scholar(driver, keywords, output_dir, sciencedirect_csv, mdpi_
                         pdf_link = download_links[0].get_attribute('href')
                 
                 if pdf_link:
-                    process_pdf_link(pdf_link, output_dir)
+                    pdf_path = process_pdf_link(pdf_link, output_dir)
+                    if pdf_path:
+                        get_seen_set().add(article_link, 'downloaded', pdf_path)
+                    else:
+                        get_seen_set().add(article_link, 'resolved', pdf_link)
                 else:
                     print(f"No PDF link found for article: {article_link}")
         
@@ -297,6 +363,125 @@ def cleanup_pdf_files(output_dir):
                 logging.info(f"Deleted duplicate file: {filename}")
                 print(f"Deleted duplicate file: {filename}")
 
+# (label, script, CSV file name), in the order the search functions take the CSVs
+DOWNLOADERS = [
+    ("ScienceDirect", "sciencedirect_downloader.py", "sciencedirect_urls.csv"),
+    ("MDPI", "mdpi_downloader.py", "mdpi_urls.csv"),
+    ("HeinOnline", "heinonline_downloader.py", "heinonline_urls.csv"),
+    ("Wiley", "wiely_downloader.py", "wiley_pdf_urls.csv"),
+    ("Tandfonline", "tandfonline_downloader.py", "tandfonline_pdf_urls.csv"),
+]
+CAMPAIGN_DIR = "./campaign"
+
+def run_downloader(label, script, pairs):
+    """Run one downloader script over (output_dir, csv_file) pairs in a single process"""
+    args = [arg for pair in pairs for arg in pair]
+    try:
+        print(f"Starting {label} download process...")
+        with span("downloader", script=script):
+            subprocess.run(["python3", script] + args, check=True, env=child_env())
+        print(f"{label} download process completed.")
+    except subprocess.CalledProcessError as e:
+        logging.error(f"Error running {script}: {e}")
+        print(f"Error running {script}: {e}")
+    except FileNotFoundError:
+        logging.error("python3 command not found. Please ensure Python 3 is installed and in your PATH.")
+        print("python3 command not found. Please ensure Python 3 is installed and in your PATH.")
+
+def run_downloaders(jobs, skip_empty=False):
+    """jobs is a list of (output_dir, csv_files) with csv_files ordered like DOWNLOADERS.
+
+    A missing CSV fails its downloader before the script (and its browser) starts;
+    with skip_empty, missing and empty CSVs are skipped quietly.
+    """
+    for i, (label, script, _) in enumerate(DOWNLOADERS):
+        pairs = [(output_dir, csv_files[i]) for output_dir, csv_files in jobs]
+        if skip_empty:
+            pairs = [(output_dir, csv_file) for output_dir, csv_file in pairs
+                     if os.path.exists(csv_file) and os.path.getsize(csv_file) > 0]
+            if not pairs:
+                print(f"No {label} URLs queued, skipping.")
+                continue
+        missing = [csv_file for _, csv_file in pairs if not os.path.exists(csv_file)]
+        if missing:
+            logging.error(f"Not running {script}: CSV file not found: {', '.join(missing)}")
+            print(f"Not running {script}: CSV file not found: {', '.join(missing)}")
+            continue
+        run_downloader(label, script, pairs)
+
+def read_keywords(keywords_file):
+    """One keyword per line; blank lines and # comments are ignored, repeats dropped"""
+    with open(keywords_file, 'r') as file:
+        lines = [line.strip() for line in file]
+    return list(dict.fromkeys(line for line in lines if line and not line.startswith('#')))
+
+def local_copy(seen, url):
+    """Local file of the paper behind url, following a resolved article to its PDF link, or None"""
+    row = seen.get(url)
+    if row and row[0] == 'resolved' and row[1]:
+        row = seen.get(row[1])
+    if row and row[0] == 'downloaded' and row[1] and os.path.isfile(row[1]):
+        return row[1]
+    return None
+
+def link_campaign_views():
+    """Give each keyword folder a copy of papers it shared with an earlier keyword"""
+    seen = get_seen_set()
+    for url, output_dir in campaign_state['views']:
+        source = local_copy(seen, url)
+        if not source:
+            logging.info(f"No local file to link into {output_dir} for {url}")
+            continue
+        destination = os.path.join(output_dir, os.path.basename(source))
+        if os.path.exists(destination):
+            continue
+        try:
+            os.link(source, destination)
+        except OSError:
+            shutil.copy2(source, destination)
+        logging.info(f"Linked {source} into {output_dir}")
+
+def run_campaign(keywords_file, search_engine):
+    """Search every keyword in keywords_file with one browser, then run each downloader once"""
+    keyword_list = read_keywords(keywords_file)
+    if not keyword_list:
+        print(f"No keywords found in {keywords_file}")
+        return
+    search = search_google if search_engine == 'google' else search_google_scholar
+
+    driver = setup_driver()
+    jobs = []
+    try:
+        for n, keywords in enumerate(keyword_list, 1):
+            logging.info(f"Campaign keyword {n}/{len(keyword_list)}: {keywords}")
+            print(f"Campaign keyword {n}/{len(keyword_list)}: {keywords}")
+            output_dir = setup_output_directory(keywords)
+            csv_dir = os.path.join(CAMPAIGN_DIR, os.path.basename(output_dir))
+            os.makedirs(csv_dir, exist_ok=True)
+            csv_files = [os.path.join(csv_dir, csv_name) for _, _, csv_name in DOWNLOADERS]
+            jobs.append((output_dir, csv_files))
+            campaign_state['output_dir'] = output_dir
+            try:
+                with span("keyword", keyword=keywords):
+                    search(driver, keywords, output_dir, *csv_files)
+            except Exception as e:
+                logging.error(f"Error searching for {keywords}: {e}")
+                print(f"Error searching for {keywords}: {e}")
+    finally:
+        campaign_state['output_dir'] = None
+        driver.quit()
+
+    with span("downloads"):
+        run_downloaders(jobs, skip_empty=True)
+    link_campaign_views()
+    for (output_dir, _), keywords in zip(jobs, keyword_list):
+        cleanup_pdf_files(output_dir)
+        if not any(name.endswith('.pdf') for name in os.listdir(output_dir)):
+            logging.warning(f"No PDFs ended up in {output_dir} for keyword: {keywords}")
+            print(f"Warning: no PDFs ended up in {output_dir} for keyword: {keywords}")
+    logging.info(f"Campaign finished for {len(keyword_list)} keywords")
+    print(f"Campaign finished for {len(keyword_list)} keywords")
+
 def main():
     driver = setup_driver()
     search_engine = choose_search_engine()
@@ -307,16 +492,13 @@ def main():
         return
     keywords = get_keywords()
     output_dir = setup_output_directory(keywords)
-    sciencedirect_csv = "sciencedirect_urls.csv"
-    mdpi_csv = "mdpi_urls.csv"
-    heinonline_csv = "heinonline_urls.csv"
-    wiley_csv = "wiley_pdf_urls.csv"
-    tandfonline_csv = "tandfonline_pdf_urls.csv"
+    csv_files = [csv_name for _, _, csv_name in DOWNLOADERS]
     
-    if search_engine == 'google':
-        search_google(driver, keywords, output_dir, sciencedirect_csv, mdpi_csv, heinonline_csv, wiley_csv, tandfonline_csv)
-    else:
-        search_google_scholar(driver, keywords, output_dir, sciencedirect_csv, mdpi_csv, heinonline_csv, wiley_csv, tandfonline_csv)
+    with span("keyword", keyword=keywords, engine=search_engine):
+        if search_engine == 'google':
+            search_google(driver, keywords, output_dir, *csv_files)
+        else:
+            search_google_scholar(driver, keywords, output_dir, *csv_files)
     
     driver.quit()
     cleanup_pdf_files(output_dir)
@@ -324,60 +506,21 @@ def main():
     print(f"PDFs have been downloaded and cleaned up in: {output_dir}")
     
     # Subprocess calls for other downloading scripts
-    try:
-        print("Starting ScienceDirect download process...")
-        subprocess.run(["python3", "sciencedirect_downloader.py", output_dir, sciencedirect_csv], check=True)
-        print("ScienceDirect download process completed.")
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Error running sciencedirect_downloader.py: {e}")
-        print(f"Error running sciencedirect_downloader.py: {e}")
-    except FileNotFoundError:
-        logging.error("python3 command not found. Please ensure Python 3 is installed and in your PATH.")
-        print("python3 command not found. Please ensure Python 3 is installed and in your PATH.")
-
-    try:
-        print("Starting MDPI download process...")
-        subprocess.run(["python3", "mdpi_downloader.py", output_dir, mdpi_csv], check=True)
-        print("MDPI download process completed.")
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Error running mdpi_downloader.py: {e}")
-        print(f"Error running mdpi_downloader.py: {e}")
-    except FileNotFoundError:
-        logging.error("python3 command not found. Please ensure Python 3 is installed and in your PATH.")
-        print("python3 command not found. Please ensure Python 3 is installed and in your PATH.")
-
-    try:
-        print("Starting HeinOnline download process...")
-        subprocess.run(["python3", "heinonline_downloader.py", output_dir, heinonline_csv], check=True)
-        print("HeinOnline download process completed.")
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Error running heinonline_downloader.py: {e}")
-        print(f"Error running heinonline_downloader.py: {e}")
-    except FileNotFoundError:
-        logging.error("python3 command not found. Please ensure Python 3 is installed and in your PATH.")
-        print("python3 command not found. Please ensure Python 3 is installed and in your PATH.")
-
-    try:
-        print("Starting Wiley download process...")
-        subprocess.run(["python3", "wiley_downloader.py", output_dir, wiley_csv], check=True)
-        print("Wiley download process completed.")
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Error running wiley_downloader.py: {e}")
-        print(f"Error running wiley_downloader.py: {e}")
-    except FileNotFoundError:
-        logging.error("python3 command not found. Please ensure Python 3 is installed and in your PATH.")
-        print("python3 command not found. Please ensure Python 3 is installed and in your PATH.")
-
-    try:
-        print("Starting Tandfonline download process...")
-        subprocess.run(["python3", "tandfonline_downloader.py", output_dir, tandfonline_csv], check=True)
-        print("Tandfonline download process completed.")
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Error running tandfonline_downloader.py: {e}")
-        print(f"Error running tandfonline_downloader.py: {e}")
-    except FileNotFoundError:
-        logging.error("python3 command not found. Please ensure Python 3 is installed and in your PATH.")
-        print("python3 command not found. Please ensure Python 3 is installed and in your PATH.")
+    with span("downloads"):
+        run_downloaders([(output_dir, csv_files)])
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Search for research PDFs and download them.")
+    parser.add_argument("--campaign", metavar="KEYWORDS_FILE",
+                        help="run non-interactively over every keyword in this file (one per line)")
+    parser.add_argument("--engine", choices=["google", "scholar"], default="scholar",
+                        help="search engine for --campaign (default: scholar)")
+    args = parser.parse_args()
+    run_id = start_run()
+    install_log_context()
+    with span("run", mode="campaign" if args.campaign else "interactive"):
+        if args.campaign:
+            run_campaign(args.campaign, args.engine)
+        else:
+            main()
+    print(f"Trace for {run_id} written; see it with: python3 tracing.py report {run_id}")
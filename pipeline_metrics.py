@@ -0,0 +1,74 @@
+import time
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+import profiling
+import memory_profiling
+
+# Stages of a research job and of /ask, in pipeline order
+STAGES = ("search", "download", "parse", "chunk", "embed", "upsert", "query", "llm")
+
+STAGE_SECONDS = Histogram(
+    "sara_stage_seconds",
+    "Wall time spent in each research pipeline stage",
+    ["stage", "host"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+STAGE_ERRORS = Counter(
+    "sara_stage_errors_total",
+    "Exceptions raised inside a pipeline stage",
+    ["stage", "host"],
+)
+DOWNLOAD_BYTES = Counter(
+    "sara_download_bytes_total",
+    "Bytes of PDF downloaded",
+    ["host"],
+)
+JOBS_IN_FLIGHT = Gauge(
+    "sara_jobs_in_flight",
+    "Research jobs currently running",
+)
+QUEUE_DEPTH = Gauge(
+    "sara_queue_depth",
+    "Items waiting in a pipeline queue",
+    ["queue"],
+)
+JOBS_REJECTED = Counter(
+    "sara_jobs_rejected_total",
+    "Research jobs refused by admission control",
+    ["priority"],
+)
+JOB_WAIT_SECONDS = Histogram(
+    "sara_job_wait_seconds",
+    "Time research jobs spend queued before they start",
+    ["priority"],
+    buckets=(0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800),
+)
+ANSWER_CACHE_REQUESTS = Counter(
+    "sara_answer_cache_requests_total",
+    "/ask lookups in the semantic answer cache by result (exact, semantic, miss)",
+    ["result"],
+)
+
+
+@contextmanager
+def observe_stage(stage, host=""):
+    """Time a block as one stage run, counting it as an error if it raises."""
+    start = time.perf_counter()
+    try:
+        with profiling.stage(stage), memory_profiling.stage_memory(stage):
+            yield
+    except Exception:
+        STAGE_ERRORS.labels(stage, host).inc()
+        raise
+    finally:
+        STAGE_SECONDS.labels(stage, host).observe(time.perf_counter() - start)
+
+
+def record_stage(stage, seconds, host=""):
+    """Record a stage run timed elsewhere, e.g. in an ingestion worker process."""
+    STAGE_SECONDS.labels(stage, host).observe(seconds)
+
+
+def metrics_response():
+    """Body and content type for the /metrics endpoint."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,209 @@
+"""Opt-in sampling CPU profiler for research jobs and PDF batches.
+
+A background thread samples the job's stacks every few milliseconds and
+attributes each one to the pipeline stage it was taken in:
+
+- The thread that started the job, when it runs no event loop (the batch
+  scripts), is always sampled.
+- On an event loop (the API), the loop thread is only sampled while the
+  job's own task, or one of its tasks inside a ``stage`` block, is
+  running. Idle time and other requests' coroutines are left out.
+- Other threads (``asyncio.to_thread`` workers) are sampled while they run
+  inside one of the job's ``stage`` blocks, under that stage.
+
+Stages are tracked per thread and per task, so concurrent stages and jobs
+do not overwrite each other.
+
+Work in the ingestion process pool is not sampled; its per-stage times are
+in the metrics (``record_stage``).
+
+Each profiled job writes ``profiles/<job_id>/<stage>.collapsed``
+(flamegraph.pl / speedscope input) and
+``profiles/<job_id>/profile.speedscope.json``.
+
+Profiling is on when the caller asks for it (``/research/?profile=true``,
+``selection_of_pdfs.py --profile``). SARA_PROFILE_SAMPLE_RATE, for example
+0.01, also profiles that fraction of all other jobs.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import threading
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+
+PROFILE_DIR = "profiles"
+SAMPLE_INTERVAL = 0.01  # Seconds between samples
+NO_STAGE = "other"
+
+_active = contextvars.ContextVar("sara_profiler", default=None)
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples the job's threads and tasks and counts collapsed stacks per stage."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL, thread_id=None, loop=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.loop = loop
+        self.threads = {}  # Thread ident -> stack of stage names, for threads inside a stage block
+        self.tasks = {}  # asyncio task -> stack of stage names, for the job's tasks
+        self.samples = {}
+        self.started = None
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def enter(self, name, task=None):
+        """Attribute what the calling thread (or task) runs to a stage until exit()"""
+        with self._lock:
+            stacks, key = (self.threads, threading.get_ident()) if task is None else (self.tasks, task)
+            stacks.setdefault(key, []).append(name)
+
+    def exit(self, task=None):
+        with self._lock:
+            stacks, key = (self.threads, threading.get_ident()) if task is None else (self.tasks, task)
+            names = stacks.get(key)
+            if names:
+                names.pop()
+            if not names:
+                stacks.pop(key, None)
+
+    def _targets(self):
+        """{thread ident: stage} of the stacks to sample now"""
+        with self._lock:
+            targets = {ident: names[-1] for ident, names in self.threads.items()}
+        if self.loop is None:
+            targets.setdefault(self.thread_id, NO_STAGE)
+            return targets
+        targets.pop(self.thread_id, None)
+        task = asyncio.current_task(self.loop)
+        with self._lock:
+            names = self.tasks.get(task) if task is not None else None
+            if names:
+                targets[self.thread_id] = names[-1]
+        return targets
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident, stage_name in self._targets().items():
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                key = ";".join(reversed(stack))
+                self.samples.setdefault(stage_name, Counter())[key] += 1
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sara-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def write(self, out_dir):
+        """Write one collapsed-stack file per stage plus a combined speedscope file."""
+        os.makedirs(out_dir, exist_ok=True)
+        for stage_name, stacks in self.samples.items():
+            with open(os.path.join(out_dir, f"{stage_name}.collapsed"), 'w') as file:
+                for stack, count in stacks.most_common():
+                    file.write(f"{stack} {count}\n")
+
+        frames, frame_index, profiles = [], {}, []
+        for stage_name, stacks in sorted(self.samples.items()):
+            samples, weights = [], []
+            for stack, count in stacks.items():
+                indices = []
+                for label in stack.split(";"):
+                    if label not in frame_index:
+                        frame_index[label] = len(frames)
+                        frames.append({"name": label})
+                    indices.append(frame_index[label])
+                samples.append(indices)
+                weights.append(count * self.interval)
+            profiles.append({"type": "sampled", "name": stage_name, "unit": "seconds",
+                             "startValue": 0, "endValue": sum(weights),
+                             "samples": samples, "weights": weights})
+        with open(os.path.join(out_dir, "profile.speedscope.json"), 'w') as file:
+            json.dump({"$schema": "https://www.speedscope.app/file-format-schema.json",
+                       "name": os.path.basename(out_dir), "exporter": "sara-profiling",
+                       "shared": {"frames": frames}, "profiles": profiles}, file)
+        return out_dir
+
+
+def _current_task():
+    try:
+        return asyncio.current_task()
+    except RuntimeError:
+        return None  # No event loop in this thread
+
+
+def should_profile(requested=False):
+    if requested:
+        return True
+    try:
+        rate = float(os.getenv("SARA_PROFILE_SAMPLE_RATE", "0"))
+    except ValueError:
+        rate = 0.0
+    return rate > 0 and random.random() < rate
+
+
+@contextmanager
+def profile_job(job_id, requested=False, out_dir=None):
+    """Profile the wrapped block when requested or sampled; yields the output dir or None."""
+    if not should_profile(requested):
+        yield None
+        return
+    out_dir = out_dir or os.path.join(os.getenv("SARA_PROFILE_DIR", PROFILE_DIR), job_id)
+    task = _current_task()
+    profiler = SamplingProfiler(loop=task.get_loop() if task else None)
+    token = _active.set(profiler)
+    if task:
+        profiler.enter(NO_STAGE, task)
+    profiler.start()
+    try:
+        yield out_dir
+    finally:
+        profiler.stop()
+        if task:
+            profiler.exit(task)
+        _active.reset(token)
+        try:
+            profiler.write(out_dir)
+            logging.info(f"Wrote CPU profile for {job_id} to {out_dir} ({profiler.elapsed:.1f}s sampled)")
+        except OSError as e:
+            logging.error(f"Could not write CPU profile for {job_id}: {e}")
+
+
+@contextmanager
+def stage(name):
+    """Attribute samples taken inside the block to a pipeline stage."""
+    profiler = _active.get()
+    if profiler is None:
+        yield
+        return
+    task = _current_task()
+    profiler.enter(name, task)
+    try:
+        yield
+    finally:
+        profiler.exit(task)
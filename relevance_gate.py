@@ -0,0 +1,149 @@
+"""Cheap relevance check run before a PDF is handed to the extraction agent.
+
+``score_pdf(pdf_path, keywords)`` reads only the first few pages. It
+combines two signals into one score in [0, 1]:
+
+* keyword density: the share of keyword terms that appear, scaled by their
+  mentions per 1000 words;
+* similarity: the best cosine between the keywords and any chunk of those
+  pages. sentence-transformers is used when it is installed
+  (SARA_RELEVANCE_MODEL, default all-MiniLM-L6-v2). Otherwise hashed word
+  and character n-gram vectors stand in.
+
+PDFs scoring under SARA_RELEVANCE_THRESHOLD (default 0.25) are skipped.
+
+    python3 relevance_gate.py pdf/ireland_shipwrecks "ireland shipwrecks"
+"""
+import os
+import re
+import sys
+import math
+import zlib
+import logging
+from functools import lru_cache
+from typing import NamedTuple
+
+from chunker import chunk_pages
+from local_extraction import keyword_terms, keyword_pattern, read_pdf_pages
+
+GATE_PAGES = 3
+DEFAULT_THRESHOLD = 0.25
+DENSITY_TARGET = 5.0  # Keyword mentions per 1000 words that count as fully on-topic
+DENSITY_WEIGHT = 0.6
+CHUNK_SIZE = 500
+HASH_DIMENSIONS = 1 << 18
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+# Cosine values mapped to 0 and 1 for each similarity backend
+CALIBRATION = {"sentence-transformers": (0.15, 0.55), "hashed": (0.05, 0.45)}
+
+WORD_RE = re.compile(r"[^\W_]+")
+
+
+class Relevance(NamedTuple):
+    score: float
+    density: float
+    similarity: float
+    backend: str
+    relevant: bool
+
+
+def threshold():
+    try:
+        return float(os.getenv("SARA_RELEVANCE_THRESHOLD", DEFAULT_THRESHOLD))
+    except ValueError:
+        return DEFAULT_THRESHOLD
+
+
+def _stem(word):
+    return word[:-1] if len(word) > 3 and word.endswith("s") else word
+
+
+def hashed_vector(text):
+    """Sparse vector of hashed stemmed words and character 4-grams"""
+    vector = {}
+    for word in WORD_RE.findall(text.lower()):
+        word = _stem(word)
+        features = [word] + [word[i:i + 4] for i in range(len(word) - 3)]
+        for feature in features:
+            index = zlib.crc32(feature.encode()) % HASH_DIMENSIONS
+            vector[index] = vector.get(index, 0.0) + 1.0
+    return vector
+
+
+def _cosine(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    dot = sum(value * b.get(index, 0.0) for index, value in a.items())
+    norm = math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values()))
+    return dot / norm if norm else 0.0
+
+
+@lru_cache(maxsize=None)
+def get_model():
+    """sentence-transformers model, or None when the package is not installed"""
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        logging.info("sentence-transformers not installed, using hashed n-gram similarity")
+        return None
+    return SentenceTransformer(os.getenv("SARA_RELEVANCE_MODEL", DEFAULT_MODEL))
+
+
+def similarity(keywords, texts):
+    """(best cosine between keywords and any text, backend name)"""
+    if not texts:
+        return 0.0, "none"
+    model = get_model()
+    if model is None:
+        query = hashed_vector(keywords)
+        return max(_cosine(query, hashed_vector(text)) for text in texts), "hashed"
+    embeddings = model.encode([keywords] + list(texts), normalize_embeddings=True)
+    return max(float(embeddings[0] @ embedding) for embedding in embeddings[1:]), "sentence-transformers"
+
+
+def keyword_density(keywords, pages):
+    """Share of keyword terms present, scaled by mentions per 1000 words; 0 to 1"""
+    terms, pattern = keyword_terms(keywords), keyword_pattern(keywords)
+    words = sum(len(WORD_RE.findall(page)) for page in pages)
+    if pattern is None or not words:
+        return 0.0
+    mentions = [match.group(0).lower() for page in pages for match in pattern.finditer(page)]
+    present = {term for term in terms if any(mention.startswith(term) for mention in mentions)}
+    per_thousand = 1000.0 * len(mentions) / words
+    return (len(present) / len(terms)) * min(1.0, per_thousand / DENSITY_TARGET)
+
+
+def score_pages(pages, keywords, limit=None):
+    """Relevance of already-extracted page texts to the keywords"""
+    limit = threshold() if limit is None else limit
+    pages = pages[:GATE_PAGES]
+    density = keyword_density(keywords, pages)
+    texts = [span.text(pages) for span in chunk_pages(pages, CHUNK_SIZE, 0, "fast")]
+    cosine, backend = similarity(keywords, texts)
+    low, high = CALIBRATION.get(backend, (0.0, 1.0))
+    scaled = min(1.0, max(0.0, (cosine - low) / (high - low)))
+    score = DENSITY_WEIGHT * density + (1 - DENSITY_WEIGHT) * scaled
+    return Relevance(round(score, 3), round(density, 3), round(scaled, 3), backend, score >= limit)
+
+
+def score_pdf(pdf_path, keywords, limit=None):
+    """Relevance of the first GATE_PAGES pages of a PDF to the keywords"""
+    return score_pages(read_pdf_pages(pdf_path, max_pages=GATE_PAGES), keywords, limit)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python3 relevance_gate.py <pdf folder or file> <keywords>")
+        sys.exit(1)
+    target, query = sys.argv[1], sys.argv[2]
+    paths = ([os.path.join(target, f) for f in sorted(os.listdir(target)) if f.endswith('.pdf')]
+             if os.path.isdir(target) else [target])
+    for path in paths:
+        try:
+            result = score_pdf(path, query)
+        except Exception as e:
+            print(f"ERROR {os.path.basename(path)}: {e}")
+            continue
+        verdict = "keep" if result.relevant else "skip"
+        print(f"{verdict} {result.score:.3f} (density {result.density:.2f}, similarity {result.similarity:.2f}, "
+              f"{result.backend}) {os.path.basename(path)}")
@@ -0,0 +1,112 @@
+"""Bounded, queue-connected asyncio stages for research jobs.
+
+Each stage has its own worker tasks and reads from a bounded queue, so a
+slow stage fills its input queue. The stage before it then blocks on put
+and the slowdown spreads back to the source. For example, slow embedding
+stalls fetching instead of letting downloaded PDFs pile up on disk, while
+all stages still work on different papers at once.
+
+A stage function takes one item and returns an iterable of items for the
+next stage, or None to drop it. A list lets one PDF fan out into several
+embedding batches. Errors are logged and counted per stage, and only the
+failing item is dropped.
+
+Worker counts and queue sizes come from ``DEFAULT_WORKERS`` and can be
+overridden with SARA_PIPELINE_WORKERS, e.g. ``fetch=6,embed=3``.
+"""
+import os
+import asyncio
+import logging
+from collections import Counter
+from typing import Awaitable, Callable, Iterable, NamedTuple, Optional
+
+from pipeline_metrics import QUEUE_DEPTH
+
+DEFAULT_WORKERS = {"search": 1, "fetch": 4, "ingest": 2, "dedup": 1, "embed": 2, "upsert": 2}
+DEFAULT_QUEUE_SIZE = 4
+
+_DONE = object()
+
+
+class Stage(NamedTuple):
+    name: str
+    func: Callable[[object], Awaitable[Optional[Iterable]]]
+    workers: int = 1
+    queue_size: int = DEFAULT_QUEUE_SIZE
+
+
+def stage_workers(name):
+    """Worker count for a stage, from SARA_PIPELINE_WORKERS or the defaults"""
+    for entry in os.getenv("SARA_PIPELINE_WORKERS", "").split(","):
+        key, _, value = entry.partition("=")
+        if key.strip() == name and value.strip().isdigit() and int(value) > 0:
+            return int(value)
+    return DEFAULT_WORKERS.get(name, 1)
+
+
+class PipelineStats(NamedTuple):
+    counts: Counter  # "<stage>.processed" / "<stage>.errors"
+    errors: dict  # First error message per stage
+
+
+def make_stage(name, func, queue_size=DEFAULT_QUEUE_SIZE):
+    return Stage(name, func, stage_workers(name), queue_size)
+
+
+async def run_pipeline(stages, items, label="pipeline"):
+    """Push items through the stages; returns PipelineStats"""
+    queues = [asyncio.Queue(maxsize=stage.queue_size) for stage in stages]
+    remaining = [stage.workers for stage in stages]
+    stats = PipelineStats(Counter(), {})
+
+    async def put(index, item):
+        await queues[index].put(item)
+        if item is not _DONE:
+            QUEUE_DEPTH.labels(stages[index].name).inc()
+
+    async def close(index):
+        for _ in range(stages[index].workers):
+            await put(index, _DONE)
+
+    async def feed():
+        for item in items:
+            await put(0, item)
+        await close(0)
+
+    async def worker(index):
+        stage = stages[index]
+        while True:
+            item = await queues[index].get()
+            if item is _DONE:
+                break
+            QUEUE_DEPTH.labels(stage.name).dec()
+            try:
+                outputs = await stage.func(item)
+                stats.counts[f"{stage.name}.processed"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                stats.counts[f"{stage.name}.errors"] += 1
+                stats.errors.setdefault(stage.name, str(e))
+                logging.error(f"[{label}] stage {stage.name} failed: {e}")
+                continue
+            if outputs and index + 1 < len(stages):
+                for output in outputs:
+                    await put(index + 1, output)
+        remaining[index] -= 1
+        if remaining[index] == 0 and index + 1 < len(stages):
+            await close(index + 1)
+
+    tasks = [asyncio.create_task(feed())]
+    tasks += [asyncio.create_task(worker(index)) for index, stage in enumerate(stages) for _ in range(stage.workers)]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Items still queued when a job is cancelled must not linger in the gauge
+        for stage, queue in zip(stages, queues):
+            while not queue.empty():
+                if queue.get_nowait() is not _DONE:
+                    QUEUE_DEPTH.labels(stage.name).dec()
+    return stats
@@ -0,0 +1,42 @@
+"""The questions asked of every PDF, shared by the extraction pipelines."""
+
+AUTHORS = "Who are the authors?"
+TITLE = "What is the title of the page?"
+LINK = "What is the link to the page?"
+KEYWORD_MENTIONS = "How many mentions are relevant to keyword?"
+SHIPWRECK_NAMES = "What is the name of the pollutant shipwreck(s)?"
+COORDINATES = "What are the coordinates of the sites?"
+POLLUTION_TYPE = "What is the type of pollution (oil, chemicals, UXO, corrosion)?"
+WAR_PERIOD = "Which World War period does it belong to (WWI, WWII, Unknown)?"
+PUBLISHING_DATE = "What is the date of publishing of the article?"
+SINKING_DATES = "Are there mentions of sinking dates?"
+COORDINATES_MENTIONED = "Are coordinate locations mentioned (Yes or No)?"
+
+QUESTIONS = [
+    AUTHORS,
+    TITLE,
+    LINK,
+    KEYWORD_MENTIONS,
+    SHIPWRECK_NAMES,
+    COORDINATES,
+    POLLUTION_TYPE,
+    WAR_PERIOD,
+    PUBLISHING_DATE,
+    SINKING_DATES,
+    COORDINATES_MENTIONED,
+]
+
+# Short field names, accepted as aliases when an answer uses them as keys
+FIELDS = {
+    AUTHORS: "authors",
+    TITLE: "title",
+    LINK: "link",
+    KEYWORD_MENTIONS: "keyword_mentions",
+    SHIPWRECK_NAMES: "shipwreck_names",
+    COORDINATES: "coordinates",
+    POLLUTION_TYPE: "pollution_type",
+    WAR_PERIOD: "war_period",
+    PUBLISHING_DATE: "publishing_date",
+    SINKING_DATES: "sinking_dates",
+    COORDINATES_MENTIONED: "coordinates_mentioned",
+}
@@ -0,0 +1,140 @@
+"""Buffered, fixed-schema sink for per-PDF answers.
+
+``ResultsSink`` keeps one CSV writer open for a whole run and buffers rows.
+Every row is written against the same column list, so answers that come back
+with missing or extra keys can no longer shift columns or raise. If an older
+CSV already has a different header, rows are written against that header
+instead, and the new columns are dropped with a warning.
+
+With pyarrow installed, the sink can also write typed Parquet and/or Arrow
+IPC (``formats=("csv", "parquet")``). Each flush appends a new part file to a
+``<name>.parquet/`` or ``<name>.arrow/`` dataset directory, so nothing is
+rewritten. ``load_results`` reads such a dataset back as one table.
+"""
+import os
+import csv
+import time
+import logging
+
+from research_questions import QUESTIONS, KEYWORD_MENTIONS
+
+PDF_NAME = "PDF Name"
+STATUS = "Status"
+EVIDENCE = "Evidence"
+COLUMNS = [PDF_NAME, STATUS] + list(QUESTIONS) + [EVIDENCE]
+INTEGER_COLUMNS = {KEYWORD_MENTIONS}
+FORMATS = ("csv", "parquet", "arrow")
+FLUSH_ROWS = 50
+
+
+def _to_int(value):
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def arrow_schema(columns=COLUMNS):
+    import pyarrow as pa
+    return pa.schema([(column, pa.int64() if column in INTEGER_COLUMNS else pa.string()) for column in columns])
+
+
+class ResultsSink:
+    """Collects answer rows and writes them in batches to CSV and optional columnar files."""
+
+    def __init__(self, csv_path, formats=("csv",), columns=COLUMNS, flush_rows=FLUSH_ROWS):
+        unknown = set(formats) - set(FORMATS)
+        if unknown:
+            raise ValueError(f"Unknown results formats: {', '.join(sorted(unknown))}")
+        self.csv_path = csv_path
+        self.formats = tuple(formats)
+        self.columns = list(columns)
+        self.flush_rows = flush_rows
+        self.rows = []
+        self.written = 0
+        self._csv_file = None
+        self._csv_writer = None
+        self._part = 0
+
+    def _open_csv(self):
+        header = None
+        if os.path.isfile(self.csv_path) and os.path.getsize(self.csv_path) > 0:
+            with open(self.csv_path, 'r', newline='') as existing:
+                header = next(csv.reader(existing), None)
+        if header and header != self.columns:
+            logging.warning(f"{self.csv_path} has a different header; writing rows against it, "
+                            f"dropping {sorted(set(self.columns) - set(header))}")
+        self._csv_file = open(self.csv_path, 'a', newline='')
+        self._csv_writer = csv.DictWriter(self._csv_file, fieldnames=header or self.columns,
+                                          restval="", extrasaction='ignore')
+        if not header:
+            self._csv_writer.writeheader()
+
+    def write(self, pdf_name, answers, status="extracted"):
+        """Queue one row; answers may have missing or extra keys"""
+        row = {column: answers.get(column, "") for column in self.columns}
+        row[PDF_NAME], row[STATUS] = pdf_name, status
+        unexpected = set(answers) - set(self.columns)
+        if unexpected:
+            logging.warning(f"Dropping unexpected answer keys for {pdf_name}: {sorted(unexpected)}")
+        self.rows.append(row)
+        if len(self.rows) >= self.flush_rows:
+            self.flush()
+
+    def _dataset_dir(self, extension):
+        return f"{os.path.splitext(self.csv_path)[0]}.{extension}"
+
+    def _write_columnar(self, rows):
+        import pyarrow as pa
+        schema = arrow_schema(self.columns)
+        data = {column: [(_to_int(row[column]) if column in INTEGER_COLUMNS else
+                          ("" if row[column] is None else str(row[column]))) for row in rows]
+                for column in self.columns}
+        table = pa.Table.from_pydict(data, schema=schema)
+        part = f"part-{int(time.time() * 1000)}-{os.getpid()}-{self._part:05d}"
+        self._part += 1
+        if "parquet" in self.formats:
+            import pyarrow.parquet as pq
+            os.makedirs(self._dataset_dir("parquet"), exist_ok=True)
+            pq.write_table(table, os.path.join(self._dataset_dir("parquet"), f"{part}.parquet"))
+        if "arrow" in self.formats:
+            import pyarrow.feather as feather
+            os.makedirs(self._dataset_dir("arrow"), exist_ok=True)
+            feather.write_feather(table, os.path.join(self._dataset_dir("arrow"), f"{part}.arrow"))
+
+    def flush(self):
+        if not self.rows:
+            return
+        rows, self.rows = self.rows, []
+        if "csv" in self.formats:
+            if self._csv_writer is None:
+                self._open_csv()
+            self._csv_writer.writerows(rows)
+            self._csv_file.flush()
+        if "parquet" in self.formats or "arrow" in self.formats:
+            self._write_columnar(rows)
+        self.written += len(rows)
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            if self._csv_file is not None:
+                self._csv_file.close()
+                self._csv_file, self._csv_writer = None, None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_results(path):
+    """pyarrow Table of a results dataset directory (.parquet/ or .arrow/) or a CSV file"""
+    import pyarrow.dataset as ds
+    if os.path.isdir(path):
+        file_format = "parquet" if path.rstrip("/").endswith(".parquet") else "feather"
+        return ds.dataset(path, format=file_format, schema=arrow_schema()).to_table()
+    import pyarrow.csv as pcsv
+    return pcsv.read_csv(path)
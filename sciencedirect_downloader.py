@@ -3,12 +3,14 @@ import time
 import random
 import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 import logging
 import csv
 import sys
 import re
+from latency_tracker import get_tracker, timed_get, timed_wait
+from url_frontier import get_seen_set, paper_key
+from tracing import start_run, traced, install_log_context
 
 # Set up logging
 logging.basicConfig(filename='sciencedirect_downloader.log', level=logging.INFO,
@@ -28,13 +30,22 @@ def setup_driver(output_dir):
     chrome_options.add_experimental_option("prefs", prefs)
     return uc.Chrome(version_main=128, options=chrome_options) 
 
-def wait_for_download_complete(expected_filename, output_dir, timeout=300):
-    """Wait for the download to complete, checking every 5 seconds"""
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        if os.path.exists(os.path.join(output_dir, expected_filename)):
-            return True
-        time.sleep(5)
+def set_download_directory(driver, output_dir):
+    """Point browser downloads at output_dir without restarting the browser"""
+    driver.execute_cdp_cmd("Page.setDownloadBehavior",
+                           {"behavior": "allow", "downloadPath": os.path.abspath(output_dir)})
+
+def wait_for_download_complete(expected_filename, output_dir, url, default_timeout=300):
+    """Wait for the download to complete, with a timeout learned from past downloads from the host"""
+    tracker = get_tracker()
+    timeout = tracker.timeout_for(url, "download", default_timeout, minimum=30, maximum=900)
+    with tracker.measure(url, "download", timeout) as measurement:
+        start_time = time.time()
+        while time.time() - start_time < timeout:
+            if os.path.exists(os.path.join(output_dir, expected_filename)):
+                return True
+            time.sleep(1)
+        measurement.timed_out = True
     return False
 
 def random_delay(min_seconds, max_seconds):
@@ -44,6 +55,54 @@ def split_urls(url):
     """Split concatenated URLs"""
     return re.findall(r'https?://[^\s]+', url)
 
+@traced("sciencedirect.article")
+def download_article(driver, url, output_dir, seen):
+    """Download one ScienceDirect article through the PDF viewer"""
+    try:
+        timed_get(driver, url)
+
+        # Wait for and click the "View PDF" button
+        view_pdf_button = timed_wait(
+            driver, url, "element_wait", 30,
+            EC.element_to_be_clickable((By.CSS_SELECTOR, "a.link-button-primary[aria-label='View PDF. Opens in a new window.']"))
+        )
+        view_pdf_button.click()
+        print("Clicked View PDF button")
+
+        # Switch to the new tab
+        timed_wait(driver, url, "new_window", 20, EC.number_of_windows_to_be(2))
+        driver.switch_to.window(driver.window_handles[-1])
+
+        # Wait for the download button in the PDF viewer to be clickable
+        download_button = timed_wait(
+            driver, url, "viewer_wait", 30,
+            EC.element_to_be_clickable((By.CSS_SELECTOR, "button[aria-label='Download PDF']"))
+        )
+
+        # Click the download button
+        download_button.click()
+        print("Clicked download button in PDF viewer")
+
+        # Wait for the download to complete
+        expected_filename = f"{url.split('/')[-1]}.pdf"
+        if wait_for_download_complete(expected_filename, output_dir, url):
+            print(f"Download completed successfully: {expected_filename}")
+            seen.add(url, 'downloaded', os.path.join(output_dir, expected_filename))
+        else:
+            print(f"Download timed out or failed for: {expected_filename}")
+
+    except Exception as e:
+        print(f"Error during ScienceDirect PDF download for {url}: {e}")
+
+    finally:
+        # Safely close tabs and switch back
+        try:
+            if len(driver.window_handles) > 1:
+                driver.close()  # Close the current tab (PDF viewer)
+            driver.switch_to.window(driver.window_handles[0])  # Switch back to the main tab
+        except Exception as e:
+            print(f"Error while closing tab or switching: {e}")
+
 def download_sciencedirect_pdfs(driver, output_dir, sciencedirect_csv):
     if not os.path.exists(sciencedirect_csv):
         print("No ScienceDirect URLs found in CSV file.")
@@ -51,54 +110,20 @@ def download_sciencedirect_pdfs(driver, output_dir, sciencedirect_csv):
 
     with open(sciencedirect_csv, 'r') as file:
         reader = csv.reader(file)
-        urls = [url for row in reader for url in split_urls(row[0])]  # Split and flatten URLs
+        urls = [url for row in reader if row for url in split_urls(row[0])]  # Split and flatten URLs
+
+    # Keep one URL per article and drop articles downloaded in an earlier run
+    seen = get_seen_set()
+    unique_urls = {}
+    for url in urls:
+        unique_urls.setdefault(paper_key(url), url)
+    urls = [url for url in unique_urls.values() if seen.state(url) != 'downloaded']
 
     print(f"Found {len(urls)} unique ScienceDirect URLs to process.")
 
     for index, url in enumerate(urls, 1):
-        try:
-            print(f"Processing article {index}/{len(urls)}: {url}")
-            driver.get(url)
-            
-            # Wait for and click the "View PDF" button
-            view_pdf_button = WebDriverWait(driver, 30).until(
-                EC.element_to_be_clickable((By.CSS_SELECTOR, "a.link-button-primary[aria-label='View PDF. Opens in a new window.']"))
-            )
-            view_pdf_button.click()
-            print("Clicked View PDF button")
-            
-            # Switch to the new tab
-            WebDriverWait(driver, 20).until(EC.number_of_windows_to_be(2))
-            driver.switch_to.window(driver.window_handles[-1])
-            
-            # Wait for the download button in the PDF viewer to be clickable
-            download_button = WebDriverWait(driver, 30).until(
-                EC.element_to_be_clickable((By.CSS_SELECTOR, "button[aria-label='Download PDF']"))
-            )
-            
-            # Click the download button
-            download_button.click()
-            print("Clicked download button in PDF viewer")
-            
-            # Wait for the download to complete
-            expected_filename = f"{url.split('/')[-1]}.pdf"
-            if wait_for_download_complete(expected_filename, output_dir):
-                print(f"Download completed successfully: {expected_filename}")
-            else:
-                print(f"Download timed out or failed for: {expected_filename}")
-
-        except Exception as e:
-            print(f"Error during ScienceDirect PDF download for {url}: {e}")
-
-        finally:
-            # Safely close tabs and switch back
-            try:
-                if len(driver.window_handles) > 1:
-                    driver.close()  # Close the current tab (PDF viewer)
-                driver.switch_to.window(driver.window_handles[0])  # Switch back to the main tab
-            except Exception as e:
-                print(f"Error while closing tab or switching: {e}")
-
+        print(f"Processing article {index}/{len(urls)}: {url}")
+        download_article(driver, url, output_dir, seen)
         random_delay(10, 20)
 
     # Clear the CSV file after processing all URLs
@@ -106,24 +131,24 @@ def download_sciencedirect_pdfs(driver, output_dir, sciencedirect_csv):
     print("Cleared ScienceDirect URLs CSV file after processing.")
 
 def main():
-    if len(sys.argv) != 3:
-        print("Usage: python sciencedirect_downloader.py <output_directory> <csv_file>")
+    # Accepts one or more <output_directory> <csv_file> pairs, sharing one browser
+    if len(sys.argv) < 3 or len(sys.argv) % 2 != 1:
+        print("Usage: python sciencedirect_downloader.py <output_directory> <csv_file> [<output_directory> <csv_file> ...]")
         sys.exit(1)
 
-    output_dir = sys.argv[1]
-    sciencedirect_csv = sys.argv[2]
-
-    print(f"Output directory: {output_dir}")
-    print(f"CSV file: {sciencedirect_csv}")
-
-    # Ensure the output directory exists
-    os.makedirs(output_dir, exist_ok=True)
-
-    driver = setup_driver(output_dir)
+    pairs = list(zip(sys.argv[1::2], sys.argv[2::2]))
+    driver = setup_driver(pairs[0][0])
     print("Browser setup complete.")
 
     try:
-        download_sciencedirect_pdfs(driver, output_dir, sciencedirect_csv)
+        for output_dir, sciencedirect_csv in pairs:
+            print(f"Output directory: {output_dir}")
+            print(f"CSV file: {sciencedirect_csv}")
+
+            # Ensure the output directory exists
+            os.makedirs(output_dir, exist_ok=True)
+            set_download_directory(driver, output_dir)
+            download_sciencedirect_pdfs(driver, output_dir, sciencedirect_csv)
     except Exception as e:
         print(f"An error occurred during the download process: {e}")
     finally:
@@ -133,4 +158,6 @@ def main():
     print("ScienceDirect download process completed.")
 
 if __name__ == "__main__":
+    start_run()
+    install_log_context()
     main()
\ No newline at end of file
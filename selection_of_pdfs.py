@@ -1,97 +1,115 @@
 import os
-import csv
-import json
-import time
 import logging
+import argparse
 from get_answers import get_answers
+from profiling import profile_job, stage
+from memory_profiling import memory_report
+from research_questions import QUESTIONS
+from extraction_schema import parse_answers
+from relevance_gate import score_pages
+from results_writer import ResultsSink, EVIDENCE
+from local_extraction import read_pdf_pages
+from near_duplicates import minhash_signature, get_duplicate_index
 
 # Set up logging
 logging.basicConfig(filename='error_log.log', level=logging.DEBUG,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
+DUPLICATE_NAMESPACE = "selection"  # Payloads hold answers and status
+
 def list_pdf_folders(base_dir):
     return [f for f in os.listdir(base_dir) if os.path.isdir(os.path.join(base_dir, f))]
 
 def list_pdf_files(folder_path):
     return [f for f in os.listdir(folder_path) if f.endswith('.pdf')]
 
-def try_parsing_json(answers_string, max_attempts=3):
-    attempts = 0
-    while attempts < max_attempts:
-        try:
-            print(f"Attempt {attempts + 1} to parse JSON...")
-            # Find the start of the JSON content
-            json_start = answers_string.find('{')
-            json_end = answers_string.rfind('}') + 1
-            if json_start != -1 and json_end != -1:
-                json_string = answers_string[json_start:json_end]
-            else:
-                json_string = answers_string
+def process_pdf(pdf_name, output_dir, keywords, sink, profile=False, relevance_threshold=None):
+    job_id = f"{os.path.basename(output_dir)}-{os.path.splitext(pdf_name)[0]}"
+    with profile_job(job_id, requested=profile) as profile_dir, memory_report(job_id):
+        _process_pdf(pdf_name, output_dir, keywords, sink, relevance_threshold)
+    if profile_dir:
+        print(f"CPU profile for {pdf_name} written to {profile_dir}")
 
-            # Remove any markdown code block syntax
-            json_string = json_string.replace('```json', '').replace('```', '').strip()
+def read_pages(pdf_path):
+    """Page texts of a PDF, read once for every check; None when it cannot be read"""
+    try:
+        with stage("read_pdf"):
+            return read_pdf_pages(pdf_path)
+    except Exception as e:
+        logging.error(f"Could not read the text of {pdf_path}: {e}")
+        return None
 
-            # Parse the JSON
-            final_answers = json.loads(json_string)
-            print("Parsed JSON successfully:", final_answers)
-            print("Type of parsed JSON:", type(final_answers))
-            return final_answers
-        except json.JSONDecodeError as e:
-            print("JSONDecodeError:", e)
-            attempts += 1
-            print(f"Attempt {attempts} failed. Retrying...")
-            time.sleep(2)
-    print("Failed to parse JSON after multiple attempts.")
-    return None
+def check_relevance(pdf_path, pages, keywords, relevance_threshold=None):
+    """Skipped-row answers for a PDF under the relevance threshold, or None to extract it"""
+    if pages is None or (relevance_threshold is not None and relevance_threshold <= 0):
+        return None
+    try:
+        with stage("relevance"):
+            relevance = score_pages(pages, keywords, relevance_threshold)
+    except Exception as e:
+        logging.error(f"Relevance check failed for {pdf_path}, extracting anyway: {e}")
+        return None
+    logging.info(f"Relevance of {pdf_path}: {relevance}")
+    if relevance.relevant:
+        return None
+    skip_message = (f"Skipped: not relevant to '{keywords}' (score {relevance.score}, "
+                    f"density {relevance.density}, similarity {relevance.similarity})")
+    return {question: skip_message for question in QUESTIONS}
 
-def process_pdf(pdf_name, output_dir, keywords, csv_file_path):
+def find_duplicate(pdf_path, pages):
+    """(signature, match): the match is an already processed near-duplicate of the PDF, or None"""
+    if pages is None:
+        return None, None
+    try:
+        with stage("minhash"):
+            signature = minhash_signature(" ".join(pages))
+        return signature, get_duplicate_index(DUPLICATE_NAMESPACE).match(signature, exclude=pdf_path)
+    except Exception as e:
+        logging.error(f"Near-duplicate check failed for {pdf_path}: {e}")
+        return None, None
+
+def _process_pdf(pdf_name, output_dir, keywords, sink, relevance_threshold=None):
     selected_pdf_path = os.path.join(output_dir, pdf_name)
     if not os.path.exists(selected_pdf_path):
         print(f"Selected PDF does not exist at path: {selected_pdf_path}")
         return
-    answers = get_answers(selected_pdf_path, keywords)
-    print(f"Raw answers string for {pdf_name}:", answers)
-    if answers and "Agent stopped" not in answers:
-        final_answers = try_parsing_json(answers)
-        print(f"Parsed JSON answers for {pdf_name}:", final_answers)
+    pages = read_pages(selected_pdf_path)
+    # Another copy of the same paper (publisher PDF, preprint, ...) already processed: reuse its answers
+    signature, duplicate = find_duplicate(selected_pdf_path, pages)
+    if duplicate is not None and isinstance((duplicate.payload or {}).get('answers'), dict):
+        print(f"{pdf_name} is a near-duplicate of {duplicate.doc_id} (similarity {duplicate.similarity}); reusing its answers")
+        get_duplicate_index(DUPLICATE_NAMESPACE).add(selected_pdf_path, signature, canonical_id=duplicate.doc_id)
+        with stage("write_results"):
+            sink.write(pdf_name, duplicate.payload['answers'], "duplicate")
+        return
+    final_answers, status = check_relevance(selected_pdf_path, pages, keywords, relevance_threshold), "skipped"
+    if final_answers:
+        print(f"Skipping {pdf_name}: {final_answers[QUESTIONS[0]]}")
     else:
-        logging.error("The number of iterations has been reached; please consider increasing the limit if needed for this PDF.")
-        fallback_answers = {}
-        questions = [
-            "Who are the authors?",
-            "What is the title of the page?",
-            "What is the link to the page?",
-            "How many mentions are relevant to keyword?",
-            "What is the name of the pollutant shipwreck(s)?",
-            "What are the coordinates of the sites?",
-            "What is the type of pollution (oil, chemicals, UXO, corrosion)?",
-            "Which World War period does it belong to (WWI, WWII, Unknown)?",
-            "What is the date of publishing of the article?",
-            "Are there mentions of sinking dates?",
-            "Are coordinate locations mentioned (Yes or No)?"
-        ]
-        fallback_message = "The operation exceeded its iteration or time limit. Consider increasing the limit."
-        for question in questions:
-            fallback_answers[question] = fallback_message
-        final_answers = [fallback_answers]
-    if isinstance(final_answers, dict):
-        final_answers = [final_answers]
-    if isinstance(final_answers, list) and final_answers:
-        for answer in final_answers:
-            answer['PDF Name'] = pdf_name
-        file_exists = os.path.isfile(csv_file_path)
-        with open(csv_file_path, mode='a', newline='') as csv_file:
-            fieldnames = ['PDF Name'] + list(final_answers[0].keys())
-            writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
-            if not file_exists or os.stat(csv_file_path).st_size == 0:
-                writer.writeheader()
-            for answer in final_answers:
-                writer.writerow(answer)
-        print(f"Saved answers for {pdf_name} to {csv_file_path}")
+        with stage("agent"):
+            answers = get_answers(selected_pdf_path, keywords, pages)
+        print(f"Raw answers string for {pdf_name}:", answers)
+        if answers and "Agent stopped" not in answers:
+            with stage("parse_json"):
+                final_answers, status = parse_answers(answers, QUESTIONS, extra_keys=(EVIDENCE,)), "extracted"
+            print(f"Parsed JSON answers for {pdf_name}:", final_answers)
+        else:
+            logging.error("The number of iterations has been reached; please consider increasing the limit if needed for this PDF.")
+            fallback_answers = {}
+            fallback_message = "The operation exceeded its iteration or time limit. Consider increasing the limit."
+            for question in QUESTIONS:
+                fallback_answers[question] = fallback_message
+            final_answers, status = fallback_answers, "failed"
+    if final_answers:
+        with stage("write_results"):
+            sink.write(pdf_name, final_answers, status)
+        if status != "failed":
+            get_duplicate_index(DUPLICATE_NAMESPACE).add(selected_pdf_path, signature, payload={'answers': final_answers, 'status': status})
+        print(f"Queued answers for {pdf_name} for {sink.csv_path}")
     else:
         print(f"No valid answers to save for {pdf_name}.")
 
-def main():
+def main(profile=False, relevance_threshold=None, formats=("csv",)):
     base_dir = "/home/chethan/Desktop/Fianl_code/pdf"
     
     # List available folders
@@ -119,6 +137,12 @@ def main():
     csv_file_name = f'{selected_folder}.csv'
     csv_file_path = os.path.join('/home/chethan/Desktop/Fianl_code', csv_file_name)
     
+    # One sink for the whole session; rows are buffered and flushed in batches
+    with ResultsSink(csv_file_path, formats) as sink:
+        select_and_process(output_dir, keywords, sink, profile, relevance_threshold)
+    print(f"Saved {sink.written} rows to {csv_file_path}")
+
+def select_and_process(output_dir, keywords, sink, profile=False, relevance_threshold=None):
     # List PDFs in the selected folder
     pdf_list = list_pdf_files(output_dir)
     print('Available PDFs:')
@@ -132,21 +156,30 @@ def main():
             break
         elif choice == 'all':
             for pdf in pdf_list:
-                process_pdf(pdf, output_dir, keywords, csv_file_path)
+                process_pdf(pdf, output_dir, keywords, sink, profile, relevance_threshold)
             break
         else:
             try:
                 pdf_index = int(choice) - 1
                 if 0 <= pdf_index < len(pdf_list):
-                    process_pdf(pdf_list[pdf_index], output_dir, keywords, csv_file_path)
+                    process_pdf(pdf_list[pdf_index], output_dir, keywords, sink, profile, relevance_threshold)
                 else:
                     print("Invalid choice. Please try again.")
             except ValueError:
                 print("Please enter a valid number, 'all', or 'q'.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract answers from downloaded PDFs into a CSV.")
+    parser.add_argument("--profile", action="store_true",
+                        help="write a CPU profile per processed PDF under ./profiles")
+    parser.add_argument("--relevance-threshold", type=float, default=None,
+                        help="skip PDFs scoring under this relevance (default SARA_RELEVANCE_THRESHOLD or 0.25; 0 disables)")
+    parser.add_argument("--results-format", action="append", choices=("csv", "parquet", "arrow"),
+                        help="output format; repeat for several (default csv; parquet/arrow need pyarrow)")
+    args = parser.parse_args()
     try:
-        main()
+        main(profile=args.profile, relevance_threshold=args.relevance_threshold,
+             formats=tuple(args.results_format or ("csv",)))
     except Exception as e:
         logging.exception("An unexpected error occurred:")
         print(f"An unexpected error occurred: {e}")
@@ -1,49 +1,77 @@
-import undetected_chromedriver as uc
-from selenium.webdriver.common.by import By
+import csv
+import os
+import sys
 import time
 import requests
-
-# List of Tandfonline URLs
-tandfonline_urls = [
-    "https://www.tandfonline.com/doi/full/10.1080/09064710.2024.2396972?src=exp-la",
-    "https://www.tandfonline.com/doi/full/10.1080/09064710.2024.2396973?src=exp-la",
-    "https://www.tandfonline.com/doi/full/10.1080/09064710.2024.2392525?src=exp-la"
-]
+import undetected_chromedriver as uc
+from selenium.webdriver.common.by import By
+from url_frontier import get_seen_set, canonicalize_url
+from tracing import start_run, span
 
 # Function to download PDF
 def download_pdf(pdf_url, file_name):
-    response = requests.get(pdf_url)
+    response = requests.get(pdf_url, timeout=120)
     if response.status_code == 200:
         with open(file_name, 'wb') as file:
             file.write(response.content)
         print(f"Downloaded: {file_name}")
+        return True
     else:
         print(f"Failed to download PDF from {pdf_url}")
+        return False
 
-# Set up Chrome options
-options = uc.ChromeOptions()
-# options.add_argument('--headless')  # Uncomment if you want to run in headless mode
-driver = uc.Chrome(options=options)
+def is_pdf_link(url):
+    """The searcher queues resolved /doi/pdf/ links; anything else is an article page"""
+    return "/doi/pdf/" in url or url.split('?')[0].endswith('.pdf')
 
-# Loop through Tandfonline URLs and download PDFs
-for url in tandfonline_urls:
+def download_article(driver, url, output_dir):
+    """Download one queued Tandfonline URL (PDF link or article page) into output_dir"""
+    seen = get_seen_set()
+    if seen.state(url) == 'downloaded':
+        print(f"Skipping already downloaded article: {url}")
+        return
     try:
-        driver.get(url)
-        time.sleep(2)  # wait for the page to load
-        
-        if "tandfonline.com" in driver.current_url:
+        pdf_link = url
+        if not is_pdf_link(url):
+            driver.get(url)
+            time.sleep(2)  # wait for the page to load
+            if "tandfonline.com" not in driver.current_url:
+                print(f"No Tandfonline content found at {url}")
+                return
             # Find the PDF link on the page
             pdf_link = driver.find_element(By.CSS_SELECTOR, "a.showpdf").get_attribute('href')
             print(f"PDF Link: {pdf_link}")
-            
-            # Generate file name for PDF
-            pdf_name = f"{url.split('/')[-1].split('?')[0]}.pdf"
-            
-            # Download the PDF
-            download_pdf(pdf_link, pdf_name)
-        else:
-            print(f"No Tandfonline content found at {url}")
+
+        # Generate file name for PDF
+        pdf_name = os.path.join(output_dir, f"{url.split('/')[-1].split('?')[0]}.pdf")
+
+        # Download the PDF
+        with span("tandfonline.download", url=url):
+            downloaded = download_pdf(pdf_link, pdf_name)
+        if downloaded:
+            seen.add(url, 'downloaded', pdf_name)
     except Exception as e:
         print(f"Error processing {url}: {e}")
 
-driver.quit()
+def main(pairs):
+    """Download every (output_dir, csv_file) pair with a single browser"""
+    # Set up Chrome options
+    options = uc.ChromeOptions()
+    # options.add_argument('--headless')  # Uncomment if you want to run in headless mode
+    driver = uc.Chrome(options=options)
+    try:
+        for output_dir, csv_file in pairs:
+            os.makedirs(output_dir, exist_ok=True)
+            with open(csv_file, newline='') as file:
+                urls = [row[0] for row in csv.reader(file) if row]
+            for url in dict.fromkeys(canonicalize_url(u) for u in urls):
+                download_article(driver, url, output_dir)
+    finally:
+        driver.quit()
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or len(sys.argv) % 2 != 1:
+        print("Usage: python tandfonline_downloader.py <output_directory> <csv_file> [<output_directory> <csv_file> ...]")
+        sys.exit(1)
+    start_run()
+    main(list(zip(sys.argv[1::2], sys.argv[2::2])))
@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from chunk_index import MAX_JOB_IDS, ChunkIndex, chunk_id
+
+
+@pytest.fixture
+def index(tmp_path):
+    chunks = ChunkIndex(str(tmp_path / "chunks.db"))
+    yield chunks
+    chunks.close()
+
+
+def test_unmirrored_lists_chunks_older_jobs_fell_out_of(index):
+    shared, own = chunk_id("shared chunk"), chunk_id("own chunk")
+    index.register("job-0", [shared, own])
+    for i in range(1, MAX_JOB_IDS + 5):
+        index.register(f"job-{i}", [shared])
+
+    assert "job-0" not in index.members([shared], MAX_JOB_IDS)[shared]
+    assert index.unmirrored("job-0") == [shared]
+    assert index.unmirrored(f"job-{MAX_JOB_IDS + 4}") == []
+
+
+def test_query_finds_chunks_past_the_metadata_cap(tmp_path, monkeypatch):
+    pytest.importorskip("fastapi")
+    pytest.importorskip("dotenv")
+    pytest.importorskip("requests")
+    monkeypatch.setenv("SARA_CHUNK_DB", str(tmp_path / "chunks.db"))
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    import app
+    import load_test
+    from fixture_server import FixtureConfig
+
+    memory = load_test.MemoryIndex(FixtureConfig(latency=0))
+    monkeypatch.setattr(app, "get_index", lambda: memory)
+    monkeypatch.setattr(app, "get_chunk_index", lambda: chunks)
+    chunks = ChunkIndex(os.environ["SARA_CHUNK_DB"])
+    text = "wreck of the tanker off the irish coast"
+    batch = {'filename': "paper.pdf", 'texts': [text], 'pages': [0],
+             'embeddings': [load_test.hashed_embedding(text)]}
+    batch['ids'] = [chunk_id(text)]
+    for i in range(MAX_JOB_IDS + 5):
+        chunks.register(f"job-{i}", batch['ids'])
+    app.upsert_batch(batch, "job-0")
+
+    matches = app.query_chunks([load_test.hashed_embedding("tanker wreck")], "job-0")[0]
+    assert [match['id'] for match in matches] == batch['ids']
+    chunks.close()
@@ -0,0 +1,46 @@
+from latency_tracker import HEADROOM, LatencyTracker
+
+URL = "https://slow.example.org/article/1"
+
+
+def test_timeout_follows_p95_of_completed_operations(tmp_path):
+    tracker = LatencyTracker(str(tmp_path / "latency.json"))
+    for _ in range(20):
+        tracker.record(URL, "page_load", 2.0)
+
+    assert tracker.timeout_for(URL, "page_load", 60) == 2.0 * HEADROOM
+
+
+def test_timeout_grows_while_a_slowed_host_keeps_timing_out(tmp_path):
+    tracker = LatencyTracker(str(tmp_path / "latency.json"))
+    for _ in range(20):
+        tracker.record(URL, "page_load", 2.0)
+
+    # The host now needs 30s per page; every load gives up at the current timeout
+    timeouts = []
+    for _ in range(5):
+        timeout = tracker.timeout_for(URL, "page_load", 60, maximum=120)
+        timeouts.append(timeout)
+        with tracker.measure(URL, "page_load", timeout) as measurement:
+            measurement.timed_out = 30.0 > timeout
+
+    # It grows once more than TIMEOUT_RATE of the recent loads timed out, until loads fit
+    assert timeouts == [4.0, 4.0, 8.0, 16.0, 32.0]
+    assert tracker.timeouts(URL, "page_load") == 4
+    # Once loads complete again the timeout stops growing
+    with tracker.measure(URL, "page_load", timeouts[-1]):
+        pass
+    assert tracker.timeout_for(URL, "page_load", 60, maximum=120) == timeouts[-1]
+
+
+def test_outcomes_survive_a_save(tmp_path):
+    path = str(tmp_path / "latency.json")
+    tracker = LatencyTracker(path)
+    for _ in range(10):
+        tracker.record(URL, "download", 1.0)
+        tracker.record_timeout(URL, "download", 5.0)
+    tracker.save()
+
+    reloaded = LatencyTracker(path)
+    assert reloaded.timeout_rate(URL, "download") == 0.5
+    assert reloaded.timeout_for(URL, "download", 60) == 5.0 * HEADROOM
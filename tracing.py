@@ -0,0 +1,213 @@
+"""Span tracing shared by the searcher and the downloader subprocesses.
+
+A run ID and the current span ID travel to child processes through the
+SARA_RUN_ID and SARA_PARENT_SPAN environment variables (see ``child_env``).
+Every process appends its finished spans as JSON lines to
+``traces/<run_id>.jsonl``. ``python3 tracing.py report [run_id]`` rolls a run
+up into per-span totals and the critical path.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import inspect
+import logging
+import functools
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+TRACE_DIR = "traces"
+URL_ARGS = ("url", "pdf_link", "pdf_url")
+_local = threading.local()
+_write_lock = threading.Lock()
+
+
+def _new_id():
+    return uuid.uuid4().hex[:16]
+
+
+def run_id():
+    return os.environ.get("SARA_RUN_ID")
+
+
+def start_run():
+    """Start a run in this process unless one was inherited from a parent."""
+    if not run_id():
+        os.environ["SARA_RUN_ID"] = f"run-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{_new_id()[:6]}"
+    return run_id()
+
+
+def current_span_id():
+    stack = getattr(_local, 'stack', None)
+    if stack:
+        return stack[-1]
+    return os.environ.get("SARA_PARENT_SPAN")
+
+
+def child_env():
+    """Environment for a subprocess so its spans nest under the current span."""
+    env = os.environ.copy()
+    env["SARA_RUN_ID"] = start_run()
+    parent = current_span_id()
+    if parent:
+        env["SARA_PARENT_SPAN"] = parent
+    return env
+
+
+def trace_path(for_run_id=None):
+    trace_dir = os.getenv("SARA_TRACE_DIR", TRACE_DIR)
+    return os.path.join(trace_dir, f"{for_run_id or run_id()}.jsonl")
+
+
+def _write(record):
+    path = trace_path(record["run_id"])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    line = json.dumps(record, default=str) + "\n"
+    with _write_lock:
+        # One small O_APPEND write per span keeps lines whole across processes
+        with open(path, 'a') as file:
+            file.write(line)
+
+
+@contextmanager
+def span(name, **attrs):
+    """Record the wrapped block as a span; does nothing outside a run."""
+    if not run_id():
+        yield None
+        return
+    span_id = _new_id()
+    parent_id = current_span_id()
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.append(span_id)
+    start = time.time()
+    status, error = "ok", None
+    try:
+        yield span_id
+    except BaseException as e:
+        status, error = "error", f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        stack.pop()
+        end = time.time()
+        try:
+            _write({"run_id": run_id(), "span_id": span_id, "parent_id": parent_id, "name": name,
+                    "pid": os.getpid(), "start": start, "end": end, "duration": end - start,
+                    "status": status, "error": error, "attrs": attrs})
+        except OSError as e:
+            logging.warning(f"Could not write trace span {name}: {e}")
+
+
+def traced(name):
+    """Decorator form of ``span``; records the call's url-like argument."""
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind_partial(*args, **kwargs).arguments
+            url = next((bound[arg] for arg in URL_ARGS if isinstance(bound.get(arg), str)), None)
+            with span(name, url=url):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class _TraceContextFilter(logging.Filter):
+    def filter(self, record):
+        if run_id() and not getattr(record, '_traced', False):
+            record.msg = f"[{run_id()} span={current_span_id() or '-'}] {record.msg}"
+            record._traced = True
+        return True
+
+
+def install_log_context():
+    """Prefix every log line from this process with the run ID and current span."""
+    for handler in logging.getLogger().handlers:
+        if not any(isinstance(f, _TraceContextFilter) for f in handler.filters):
+            handler.addFilter(_TraceContextFilter())
+
+
+def load_spans(for_run_id):
+    with open(trace_path(for_run_id), 'r') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def critical_path(spans):
+    """Chain of spans that determined the run's wall time, root first.
+
+    Walks back from each span's end, picking the child that finished last and
+    then the child that finished last before that one started.
+    """
+    by_id = {s["span_id"]: s for s in spans}
+    children = {}
+    for s in spans:
+        children.setdefault(s["parent_id"], []).append(s)
+    roots = [s for s in spans if s["parent_id"] not in by_id]
+    if not roots:
+        return []
+
+    def walk(node):
+        path = [node]
+        horizon = node["end"]
+        blocking = []
+        for child in sorted(children.get(node["span_id"], []), key=lambda c: c["end"], reverse=True):
+            if child["end"] <= horizon + 1e-6:
+                blocking.append(child)
+                horizon = child["start"]
+        for child in reversed(blocking):
+            path.extend(walk(child))
+        return path
+
+    return walk(max(roots, key=lambda s: s["duration"]))
+
+
+def report(for_run_id):
+    spans = load_spans(for_run_id)
+    if not spans:
+        print(f"No spans recorded for {for_run_id}")
+        return
+    start = min(s["start"] for s in spans)
+    end = max(s["end"] for s in spans)
+    print(f"Run {for_run_id}: {len(spans)} spans, {end - start:.1f}s wall")
+
+    totals = {}
+    for s in spans:
+        row = totals.setdefault(s["name"], [0, 0.0, 0])
+        row[0] += 1
+        row[1] += s["duration"]
+        row[2] += s["status"] != "ok"
+    print(f"\n{'span':36} {'count':>6} {'total s':>10} {'mean s':>8} {'errors':>6}")
+    for name, (count, total, errors) in sorted(totals.items(), key=lambda item: -item[1][1]):
+        print(f"{name:36} {count:6} {total:10.1f} {total / count:8.2f} {errors:6}")
+
+    by_id = {s["span_id"]: s for s in spans}
+    print("\nCritical path:")
+    for s in critical_path(spans):
+        depth, parent = 0, s["parent_id"]
+        while parent in by_id:
+            depth, parent = depth + 1, by_id[parent]["parent_id"]
+        label = s["attrs"].get("url") or s["attrs"].get("keyword") or s["attrs"].get("script") or ""
+        print(f"{'  ' * depth}{s['name']} {s['duration']:.1f}s {label}")
+
+
+def latest_run_id():
+    trace_dir = os.getenv("SARA_TRACE_DIR", TRACE_DIR)
+    runs = [f for f in os.listdir(trace_dir) if f.endswith('.jsonl')]
+    if not runs:
+        return None
+    return max(runs, key=lambda f: os.path.getmtime(os.path.join(trace_dir, f)))[:-len('.jsonl')]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "report":
+        print("Usage: python3 tracing.py report [run_id]")
+        sys.exit(1)
+    target = sys.argv[2] if len(sys.argv) > 2 else latest_run_id()
+    if not target:
+        print("No traces found.")
+        sys.exit(1)
+    report(target)
@@ -0,0 +1,242 @@
+import os
+import re
+import math
+import time
+import atexit
+import sqlite3
+import hashlib
+import logging
+import threading
+from urllib.parse import urlparse, urlunparse, unquote_plus, urlencode
+
+SEEN_DB = "crawl_seen.db"
+BLOOM_CAPACITY = 1_000_000
+BLOOM_ERROR_RATE = 0.001
+SYNC_INTERVAL = 2.0  # Seconds between pulls of rows written by other processes
+
+# Pure tracking parameters: dropped from the URL that is fetched
+TRACKING_PARAMS = {'fbclid', 'gclid', '_ga'}
+TRACKING_PREFIXES = ('utm_', 'mc_')
+# Parameters that do not change which paper a URL names, but that some
+# publishers need to serve it; dropped only from the dedup key
+KEY_IGNORED_PARAMS = {
+    'src', 'ref', 'referrer', 'via', 'source', 'casa_token', 'sessionid', 'sid', 'rskey',
+    'cookieset', 'role', 'journalcode', 'download', 'needaccess', 'redirectedfrom',
+}
+KEY_IGNORED_PREFIXES = ('trk', 'ga_')
+
+DOI_RE = re.compile(r'(10\.\d{4,9}/[^\s?#&"<>]+)', re.IGNORECASE)
+PII_RE = re.compile(r'pii/(\w+)', re.IGNORECASE)
+MDPI_RE = re.compile(r'mdpi\.com/(\d{4}-\d{3}[\dX]/\d+/\d+/\d+)', re.IGNORECASE)
+DOI_SUFFIXES = ('/pdf', '/epdf', '/full', '/abstract', '/pdfdirect')
+
+# Later states win; resolved and downloaded URLs are never visited again
+STATE_RANK = {'queued': 0, 'resolved': 1, 'downloaded': 2}
+DONE_STATES = ('resolved', 'downloaded')
+
+
+def extract_doi(url):
+    """Return the DOI embedded in a URL, or None."""
+    match = DOI_RE.search(url)
+    if not match:
+        return None
+    doi = match.group(1).rstrip('/.')
+    for suffix in DOI_SUFFIXES:
+        if doi.lower().endswith(suffix):
+            doi = doi[:-len(suffix)]
+    return doi.lower()
+
+
+def sciencedirect_pii(url):
+    match = PII_RE.search(url)
+    return match.group(1).upper() if match else None
+
+
+def _param_name(name):
+    # Encoded pairs such as "?via%3Dihub" decode to a single key "via=ihub"
+    return name.split('=')[0].lower()
+
+
+def _is_tracking_param(name):
+    name = _param_name(name)
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def _is_key_ignored_param(name):
+    name = _param_name(name)
+    return _is_tracking_param(name) or name in KEY_IGNORED_PARAMS or name.startswith(KEY_IGNORED_PREFIXES)
+
+
+def canonicalize_url(url, drop=_is_tracking_param):
+    """Visit-able canonical form: lowercase host, no fragment, no tracking params."""
+    url = url.strip()
+    parsed = urlparse(url)
+    if not parsed.scheme or not parsed.netloc:
+        return url
+    query = []
+    for part in filter(None, parsed.query.split('&')):
+        if '=' in part:
+            name, _, value = (unquote_plus(text) for text in part.partition('='))
+            if not drop(name):
+                query.append(((name, value), urlencode([(name, value)])))
+        elif not drop(unquote_plus(part)):
+            # A bare flag like via%3Dihub is kept as written; re-encoding would add '='
+            query.append(((unquote_plus(part), ''), part))
+    path = parsed.path or '/'
+    if len(path) > 1:
+        path = path.rstrip('/')
+    return urlunparse((parsed.scheme.lower(), parsed.netloc.lower(), path,
+                       parsed.params, '&'.join(text for _, text in sorted(query)), ''))
+
+
+def paper_key(url):
+    """Identity of the document behind a URL, shared by every URL that points at it."""
+    pii = sciencedirect_pii(url) if 'sciencedirect.com' in url.lower() else None
+    if pii:
+        return f"pii:{pii}"
+    match = MDPI_RE.search(url)
+    if match:
+        return f"mdpi:{match.group(1).lower()}"
+    doi = extract_doi(url)
+    if doi:
+        return f"doi:{doi}"
+    parsed = urlparse(canonicalize_url(url, drop=_is_key_ignored_param))
+    host = parsed.netloc[4:] if parsed.netloc.startswith('www.') else parsed.netloc
+    return f"url:{host}{parsed.path}" + (f"?{parsed.query}" if parsed.query else '')
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over a bytearray, using double hashing."""
+
+    def __init__(self, capacity=BLOOM_CAPACITY, error_rate=BLOOM_ERROR_RATE):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class SeenSet:
+    """Persistent seen-set: a Bloom filter in front of an exact SQLite table.
+
+    Keys are ``paper_key`` values, so every URL variant of a paper shares one row.
+    The Bloom bits are saved next to the database and rebuilt when they fall out
+    of step with it.
+    """
+
+    def __init__(self, path=None, capacity=BLOOM_CAPACITY, error_rate=BLOOM_ERROR_RATE):
+        self.path = path or os.getenv("SARA_SEEN_DB", SEEN_DB)
+        self.bloom_path = f"{self.path}.bloom"
+        self.bloom = BloomFilter(capacity, error_rate)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS seen (
+            key TEXT PRIMARY KEY, url TEXT, state TEXT, target TEXT, updated REAL)""")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+        self._max_rowid = 0
+        self._last_sync = 0.0
+        self._load_bloom()
+
+    def _row_count(self):
+        return self._conn.execute("SELECT COUNT(*) FROM seen").fetchone()[0]
+
+    def _load_bloom(self):
+        saved = self._conn.execute("SELECT value FROM meta WHERE name = 'bloom_rows'").fetchone()
+        if saved and os.path.exists(self.bloom_path) and int(saved[0]) == self._row_count():
+            with open(self.bloom_path, 'rb') as file:
+                bits = file.read()
+            if len(bits) == len(self.bloom.bits):
+                self.bloom.bits = bytearray(bits)
+                self._max_rowid = self._conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM seen").fetchone()[0]
+                return
+        logging.info(f"Rebuilding seen-set Bloom filter from {self.path}")
+        self._sync()
+
+    def _sync(self):
+        rows = self._conn.execute("SELECT rowid, key FROM seen WHERE rowid > ?", (self._max_rowid,)).fetchall()
+        for rowid, key in rows:
+            self.bloom.add(key)
+            self._max_rowid = max(self._max_rowid, rowid)
+        self._last_sync = time.monotonic()
+
+    def get(self, url):
+        """Return (state, target) for the paper behind ``url``, or None if never seen."""
+        key = paper_key(url)
+        with self._lock:
+            if time.monotonic() - self._last_sync > SYNC_INTERVAL:
+                self._sync()
+            if key not in self.bloom:
+                return None
+            row = self._conn.execute("SELECT state, target FROM seen WHERE key = ?", (key,)).fetchone()
+        return row
+
+    def state(self, url):
+        row = self.get(url)
+        return row[0] if row else None
+
+    def is_done(self, url):
+        return self.state(url) in DONE_STATES
+
+    def add(self, url, state, target=None):
+        """Record ``url``; a state never moves backwards (downloaded stays downloaded)."""
+        key = paper_key(url)
+        with self._lock:
+            current = self._conn.execute("SELECT state FROM seen WHERE key = ?", (key,)).fetchone()
+            if current and STATE_RANK.get(current[0], 0) > STATE_RANK[state]:
+                return
+            self._conn.execute(
+                """INSERT INTO seen (key, url, state, target, updated) VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT(key) DO UPDATE SET state = excluded.state,
+                   target = COALESCE(excluded.target, seen.target), updated = excluded.updated""",
+                (key, canonicalize_url(url), state, target, time.time()))
+            self._conn.commit()
+            self.bloom.add(key)
+
+    def save(self):
+        with self._lock:
+            self._sync()
+            tmp_path = f"{self.bloom_path}.tmp"
+            with open(tmp_path, 'wb') as file:
+                file.write(self.bloom.bits)
+            os.replace(tmp_path, self.bloom_path)
+            self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('bloom_rows', ?)",
+                               (str(self._row_count()),))
+            self._conn.commit()
+
+    def close(self):
+        try:
+            self.save()
+        finally:
+            self._conn.close()
+
+
+_seen = None
+_seen_lock = threading.Lock()
+
+
+def get_seen_set():
+    """Process-wide seen-set, saved and closed at exit."""
+    global _seen
+    with _seen_lock:
+        if _seen is None:
+            _seen = SeenSet()
+            atexit.register(_seen.close)
+        return _seen
+
+
+if __name__ == "__main__":
+    import sys
+    for arg in sys.argv[1:]:
+        print(f"{arg}\n  canonical: {canonicalize_url(arg)}\n  key:       {paper_key(arg)}")
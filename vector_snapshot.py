@@ -0,0 +1,285 @@
+"""Memory-mapped snapshot files for embedded chunks.
+
+A snapshot is a single file. It starts with a fixed 256-byte header: magic,
+format version, dimension, count, a section table, a CRC32 of the body and
+a CRC32 of the header itself. The sections follow, each aligned to 64
+bytes:
+
+    vectors       float32[count][dim], unit length
+    id_offsets    uint64[count + 1] into id_blob
+    id_blob       UTF-8 chunk IDs
+    text_offsets  uint64[count + 1] into text_blob
+    text_blob     UTF-8 chunk texts
+    spans         uint32[count][4]: source, page, start, end (chunk offsets in the source)
+    meta          JSON: sources list plus caller metadata
+
+``Snapshot`` maps the file read-only and checks only the header, so opening
+one costs a few milliseconds whatever the corpus size. Vectors and texts are
+read straight from the page cache when used. ``verify()`` checks the body
+CRC when that is worth a full read.
+
+``write_snapshot`` writes to a temporary file in the same directory, fsyncs
+it and ``os.replace``-s it over the target. Readers see either the old or
+the new snapshot, never half of one. ``LiveSnapshot`` stats the path on use
+and reopens it after a swap; an old mapping stays valid until it is closed.
+Searching uses numpy when it is installed and plain Python otherwise.
+"""
+import os
+import sys
+import json
+import mmap
+import time
+import zlib
+import heapq
+import struct
+import argparse
+import threading
+
+MAGIC = b"SARAVEC1"
+FORMAT_VERSION = 1
+HEADER_SIZE = 256
+ALIGN = 64
+SECTIONS = ("vectors", "id_offsets", "id_blob", "text_offsets", "text_blob", "spans", "meta")
+_HEADER = struct.Struct("<8sIIQ" + "QQ" * len(SECTIONS) + "I")  # ...body crc; header crc follows
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _unit(vector):
+    norm = sum(value * value for value in vector) ** 0.5
+    return [value / norm for value in vector] if norm else [float(value) for value in vector]
+
+
+def _pad(length):
+    return (-length) % ALIGN
+
+
+def _blob(items):
+    offsets, parts, position = [0], [], 0
+    for item in items:
+        encoded = item.encode("utf-8")
+        parts.append(encoded)
+        position += len(encoded)
+        offsets.append(position)
+    return struct.pack(f"<{len(offsets)}Q", *offsets), b"".join(parts)
+
+
+def write_snapshot(path, ids, vectors, texts, spans=None, sources=(), meta=None):
+    """Write a snapshot atomically; spans are (source, page, start, end) per chunk"""
+    count = len(ids)
+    if not (len(vectors) == len(texts) == count) or (spans is not None and len(spans) != count):
+        raise ValueError("ids, vectors, texts and spans must have the same length")
+    dim = len(vectors[0]) if count else 0
+    vector_bytes = bytearray()
+    for vector in vectors:
+        if len(vector) != dim:
+            raise ValueError(f"Expected {dim}-dimensional vectors, got {len(vector)}")
+        vector_bytes += struct.pack(f"<{dim}f", *_unit(vector))
+    id_offsets, id_blob = _blob(ids)
+    text_offsets, text_blob = _blob(texts)
+    span_bytes = b"".join(struct.pack("<4I", *span) for span in (spans or [(0, 0, 0, 0)] * count))
+    meta_bytes = json.dumps({"sources": list(sources), **(meta or {})}).encode("utf-8")
+
+    table, body, position, crc = [], [], HEADER_SIZE, 0
+    for section in (bytes(vector_bytes), id_offsets, id_blob, text_offsets, text_blob, span_bytes, meta_bytes):
+        table += [position, len(section)]
+        padded = section + b"\0" * _pad(len(section))
+        body.append(padded)
+        crc = zlib.crc32(padded, crc)
+        position += len(padded)
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, dim, count, *table, crc)
+    header += struct.pack("<I", zlib.crc32(header))
+    header += b"\0" * (HEADER_SIZE - len(header))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temporary = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        with open(temporary, "wb") as f:
+            f.write(header)
+            for part in body:
+                f.write(part)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+    if hasattr(os, "O_DIRECTORY"):
+        descriptor = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+    return path
+
+
+class Snapshot:
+    """Read-only, memory-mapped view of one snapshot file."""
+
+    def __init__(self, path, verify=False):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self.stat = os.fstat(self._file.fileno())
+            if self.stat.st_size < HEADER_SIZE:
+                raise SnapshotError(f"{path} is too short to be a snapshot")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._read_header()
+            if verify:
+                self.verify()
+        except Exception:
+            self.close()
+            raise
+        self._ids = None
+
+    def _read_header(self):
+        fields = _HEADER.unpack_from(self._map, 0)
+        magic, version, self.dim, self.count = fields[:4]
+        if magic != MAGIC:
+            raise SnapshotError(f"{self.path} is not a vector snapshot")
+        if version != FORMAT_VERSION:
+            raise SnapshotError(f"{self.path} has snapshot format {version}, expected {FORMAT_VERSION}")
+        (header_crc,) = struct.unpack_from("<I", self._map, _HEADER.size)
+        if zlib.crc32(self._map[:_HEADER.size]) != header_crc:
+            raise SnapshotError(f"{self.path} has a corrupt header")
+        table = fields[4:-1]
+        self.body_crc = fields[-1]
+        self.sections = {name: (table[2 * i], table[2 * i + 1]) for i, name in enumerate(SECTIONS)}
+        end = max(offset + length + _pad(length) for offset, length in self.sections.values())
+        if end > len(self._map):
+            raise SnapshotError(f"{self.path} is truncated")
+        vectors = self._section("vectors")
+        self.vectors = vectors.cast("f")  # Zero-copy view; index i*dim .. (i+1)*dim
+        self.id_offsets = self._section("id_offsets").cast("Q")
+        self.text_offsets = self._section("text_offsets").cast("Q")
+        self.spans = self._section("spans").cast("I")
+        self.meta = json.loads(bytes(self._section("meta")) or b"{}")
+        self.sources = self.meta.get("sources", [])
+
+    def _section(self, name):
+        offset, length = self.sections[name]
+        return memoryview(self._map)[offset:offset + length]
+
+    def verify(self):
+        """Check the body CRC (reads the whole file)"""
+        crc, position, end = 0, HEADER_SIZE, len(self._map)
+        while position < end:
+            crc = zlib.crc32(self._map[position:min(end, position + (1 << 24))], crc)
+            position += 1 << 24
+        if crc != self.body_crc:
+            raise SnapshotError(f"{self.path} failed its checksum")
+
+    def __len__(self):
+        return self.count
+
+    def _string(self, blob, offsets, index):
+        offset = self.sections[blob][0]
+        return self._map[offset + offsets[index]:offset + offsets[index + 1]].decode("utf-8")
+
+    def id(self, index):
+        return self._string("id_blob", self.id_offsets, index)
+
+    def text(self, index):
+        return self._string("text_blob", self.text_offsets, index)
+
+    def span(self, index):
+        """(source, page, start, end) of a chunk, with the source name resolved"""
+        source, page, start, end = self.spans[4 * index:4 * index + 4]
+        return (self.sources[source] if source < len(self.sources) else source), page, start, end
+
+    def vector(self, index):
+        return self.vectors[index * self.dim:(index + 1) * self.dim].tolist()
+
+    def index_of(self, chunk_id):
+        if self._ids is None:
+            self._ids = {self.id(i): i for i in range(self.count)}
+        return self._ids.get(chunk_id)
+
+    def search(self, query, top_k=5):
+        """[(index, cosine score)] of the nearest chunks, best first"""
+        if not self.count:
+            return []
+        query = _unit(query)
+        if len(query) != self.dim:
+            raise ValueError(f"Query has {len(query)} dimensions, snapshot has {self.dim}")
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+        if np is not None:
+            matrix = np.frombuffer(self._map, dtype="<f4", count=self.count * self.dim,
+                                   offset=self.sections["vectors"][0]).reshape(self.count, self.dim)
+            scores = matrix @ np.asarray(query, dtype="<f4")
+            top = np.argsort(-scores)[:top_k]
+            return [(int(i), float(scores[i])) for i in top]
+        dim, vectors = self.dim, self.vectors
+        scores = ((sum(a * b for a, b in zip(vectors[i * dim:(i + 1) * dim], query)), i) for i in range(self.count))
+        return [(i, score) for score, i in heapq.nlargest(top_k, scores)]
+
+    def close(self):
+        for name in ("vectors", "id_offsets", "text_offsets", "spans"):
+            view = self.__dict__.pop(name, None)
+            if view is not None:
+                view.release()
+        if getattr(self, "_map", None) is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # A caller still holds a view; the mapping goes when it does
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class LiveSnapshot:
+    """Snapshot at a path that follows atomic swaps of that path."""
+
+    def __init__(self, path):
+        self.path = path
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        """The snapshot now at the path (reopened after a swap), or None if there is none"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            old = self._snapshot
+            if old is None or (old.stat.st_ino, old.stat.st_mtime_ns) != (stat.st_ino, stat.st_mtime_ns):
+                self._snapshot = Snapshot(self.path)
+                # The old mapping is left to the garbage collector; searches in flight may still use it
+        return self._snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect vector snapshot files")
+    parser.add_argument("command", choices=["info", "verify"])
+    parser.add_argument("path")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    try:
+        snapshot = Snapshot(args.path, verify=args.command == "verify")
+    except SnapshotError as e:
+        print(e)
+        return 1
+    with snapshot:
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{args.path}: {snapshot.count} chunks x {snapshot.dim} dims, "
+              f"{len(snapshot.sources)} sources, opened in {elapsed:.2f} ms")
+        if args.command == "verify":
+            print("Checksum OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
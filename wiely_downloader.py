@@ -4,6 +4,9 @@ import time
 import os
 import sys
 from selenium.webdriver.common.by import By
+from latency_tracker import get_tracker, timed_get
+from url_frontier import get_seen_set
+from tracing import start_run, traced
 
 def setup_driver(output_dir):
     chrome_options = uc.ChromeOptions()
@@ -16,32 +19,67 @@ def setup_driver(output_dir):
     chrome_options.add_experimental_option("prefs", prefs)
     return uc.Chrome(options=chrome_options)
 
-def download_pdf(driver, pdf_url):
+def set_download_directory(driver, output_dir):
+    """Point browser downloads at output_dir without restarting the browser"""
+    driver.execute_cdp_cmd("Page.setDownloadBehavior",
+                           {"behavior": "allow", "downloadPath": os.path.abspath(output_dir)})
+
+def wait_for_new_pdf(output_dir, before, url, default_timeout=60):
+    """Path of a finished, non-empty PDF that appeared in output_dir since ``before`` was listed, or None"""
+    tracker = get_tracker()
+    timeout = tracker.timeout_for(url, "download", default_timeout, minimum=30, maximum=900)
+    with tracker.measure(url, "download", timeout) as measurement:
+        start_time = time.time()
+        while time.time() - start_time < timeout:
+            for name in sorted(set(os.listdir(output_dir)) - before):
+                path = os.path.join(output_dir, name)
+                # Chrome writes to <name>.crdownload and renames it when the download completes
+                if name.endswith('.pdf') and os.path.isfile(path) and os.path.getsize(path) > 0:
+                    return path
+            time.sleep(1)
+        measurement.timed_out = True
+    return None
+
+@traced("wiley.download")
+def download_pdf(driver, pdf_url, output_dir):
+    if get_seen_set().state(pdf_url) == 'downloaded':
+        print(f"Skipping already downloaded PDF: {pdf_url}")
+        return
     try:
-        driver.get(pdf_url)
+        timed_get(driver, pdf_url)
         time.sleep(5)
         download_button = driver.find_element(By.CSS_SELECTOR, 'a.navbar-download')
+        before = set(os.listdir(output_dir))
         download_button.click()
         print(f"PDF download initiated for {pdf_url}")
-        time.sleep(30)
+        pdf_path = wait_for_new_pdf(output_dir, before, pdf_url)
+        if pdf_path:
+            get_seen_set().add(pdf_url, 'downloaded', pdf_path)
+        else:
+            print(f"Download timed out or failed for {pdf_url}")
     except Exception as e:
         print(f"Error processing {pdf_url}: {e}")
 
-def main(output_dir, csv_file):
-    driver = setup_driver(output_dir)
+def main(pairs):
+    """Download every (output_dir, csv_file) pair with a single browser"""
+    driver = setup_driver(pairs[0][0])
     try:
-        with open(csv_file, newline='') as file:
-            reader = csv.reader(file)
-            for row in reader:
-                pdf_url = row[0]
-                download_pdf(driver, pdf_url)
+        for output_dir, csv_file in pairs:
+            os.makedirs(output_dir, exist_ok=True)
+            set_download_directory(driver, output_dir)
+            with open(csv_file, newline='') as file:
+                reader = csv.reader(file)
+                for row in reader:
+                    if not row:
+                        continue
+                    pdf_url = row[0]
+                    download_pdf(driver, pdf_url, output_dir)
     finally:
         driver.quit()
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python wiley_downloader.py <output_directory> <csv_file>")
+    if len(sys.argv) < 3 or len(sys.argv) % 2 != 1:
+        print("Usage: python wiely_downloader.py <output_directory> <csv_file> [<output_directory> <csv_file> ...]")
         sys.exit(1)
-    output_dir = sys.argv[1]
-    csv_file = sys.argv[2]
-    main(output_dir, csv_file)
\ No newline at end of file
+    start_run()
+    main(list(zip(sys.argv[1::2], sys.argv[2::2])))
\ No newline at end of file